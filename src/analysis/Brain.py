@@ -20,6 +20,7 @@ class PhysicsBrain:
         self.Ki = Ki # Class内, Ki等于__init__中传入的值，在main.py中实例化时被设置为0.01，这个值是一个较小的积分增益，主要用于消除系统的稳态误差，防止系统长时间偏离目标位置。
         self.Kd = Kd # Class内, Kd等于__init__中传入的值，在main.py中实例化时被设置为0.1，这个值是一个适中的微分增益，用于提供足够的阻尼，防止系统过度振荡，同时保持良好的响应速度。
         self.target_x = target_x
+        self.config_target = None # 最近一份参数快照里的 TARGET_X（apply_params 据此判断目标是否被修改）
         
         # 2. 物理学参数 (可供未来实验拟合更新)
         self.voltage_threshold = Critical_V # 克服氧化层静摩擦的临界电压 (V)
@@ -34,10 +35,28 @@ class PhysicsBrain:
         self.integral_error = 0.0
         self.last_error = 0.0  # 核心：防止目标切换时的微分尖峰
 
-    def think(self, current_pos, dt):
+    def apply_params(self, params):
+        """
+        换入一份参数快照（来自 ConfigService 的只读映射）。
+        必须在两次 think() 之间、由调用 think() 的同一线程调用，保证一个 tick 内参数不会新旧混杂。
+        """
+        self.Kp = params.get("Kp", self.Kp)
+        self.Ki = params.get("Ki", self.Ki)
+        self.Kd = params.get("Kd", self.Kd)
+        self.voltage_threshold = params.get("Critical_V", self.voltage_threshold)
+        # 目标只在快照里的 TARGET_X 本身变化时才换入：修改其他参数不会把 [t] 键切换过的目标拉回配置值，
+        # 也不会每次都清空积分器
+        target_x = params.get("TARGET_X")
+        if target_x is not None and target_x != self.config_target:
+            self.config_target = target_x
+            if target_x != self.target_x:
+                self.update_target(target_x)
+
+    def think(self, current_pos, dt, velocity=None):
         """
         核心物理演算中枢
-        输入: 物理坐标 current_pos [x], 时间步长 dt (秒)
+        输入: 物理坐标 current_pos [x], 时间步长 dt (秒),
+              可选的 velocity: 状态估计器给出的 x 方向速度 (px/s)
         输出: 理想控制电压 V_ideal (伏特)
         """
         if current_pos is None or dt <= 1e-5:
@@ -54,7 +73,11 @@ class PhysicsBrain:
         self.integral_error = np.clip(self.integral_error, -50, 50) 
         i_term = self.Ki * self.integral_error
         
-        d_term = self.Kd * (error - self.last_error) / dt
+        # 目标静止时 d(error)/dt = -速度：有估计器时直接用滤波后的速度，避免对像素噪声做差分
+        if velocity is not None:
+            d_term = -self.Kd * velocity
+        else:
+            d_term = self.Kd * (error - self.last_error) / dt
         
         F_ideal = p_term + i_term + d_term
         
@@ -0,0 +1,450 @@
+"""
+--- autotune.py v1.0 ---
+目的：
+仪表盘上的 Kp / Ki / Kd 一直是在液滴运行时手动拖滑动条整定的，每换一批电解液就要重来一遍。
+这里把整定交给批量仿真器，真实装置只用来做一次短暂的继电反馈确认：
+
+1. 代价函数（每个场景一次阶跃响应，各项都归一化到 0~1 左右）：
+   - ITAE：∫ t·|e| dt ÷ (阶跃幅度 · duration² / 2)，液滴从不移动时为 1；
+   - 超调：越过目标的最大幅度 ÷ 阶跃幅度；
+   - 电压代价：执行器实际输出（截断后）的均方电压 ÷ max_voltage²，惩罚饱和与到达后的噪声抖动；
+   cost = 加权和（COST_WEIGHTS），一组增益的代价取全部场景的平均；
+2. 场景：复用 monte_carlo.SPREAD 的参数散布，种子固定，所有候选面对同一批场景（公共随机数）；
+   给定录制的追踪历史 / 耗时汇总时，用实测的视觉周期、追踪噪声与端到端延迟代替散布里的默认值；
+3. 搜索：对数增益空间中的交叉熵法（CEM）——每一代按高斯分布抽样 population 组增益，
+   取代价最低的 elite 比例更新分布的均值与标准差；范围与仪表盘滑动条一致（GAIN_BOUNDS）；
+4. 并行：每 chunk 组候选 × 全部场景拼成一次向量化 simulate()，各块分发到进程池；
+   分块方式与进程数无关，结果只取决于种子；
+5. 验证：全部评估过的候选按三位小数取整去重，代价最低的若干组在另一批（更多的）场景上重新评估后排序，
+   避免挑中只对搜索用的那批场景“过拟合”的增益；
+6. 继电反馈确认（Åström–Hägglund，可选）：在“力”空间里做 ±force 的继电控制（电压按 PhysicsBrain
+   同样的 √ 反演与死区补偿给出），由持续振荡的幅值 a 与周期 Tu 得到临界比例增益 Ku = 4·force / (π·a)
+   （单位与 Kp 相同），即对象频率响应上相位 -180° 的一点 P(jωu) = -1/Ku，ωu = 2π/Tu；
+   每组增益计算该频率上开环 L = C·P 到临界点 -1 的距离 |1 - C(jωu)/Ku|（C 为 PID 的频率响应），
+   小于 MIN_RELAY_DISTANCE（该频率上灵敏度超过 2）的排到表尾。
+   sense / actuate 是回调：同一段代码既能对仿真器做（预期值），也能对真实装置做（--relay-port）；
+7. 输出：排序后的增益表写入 config.json 的 gain_table 键（原子写入，其余键保留），
+   --apply 同时把第一名设为当前 Kp / Ki / Kd；仪表盘可以从表中选一组载入。
+
+命令行：
+    python -m src.analysis.autotune --generations 8 --population 32 --workers 4
+    python -m src.analysis.autotune --history data/track_history_20250101_120000.npy --apply
+    python -m src.analysis.autotune --relay-port COM3 --camera 0
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.analysis.Brain import Critical_V, K_FACTOR
+from src.analysis.batch_brain import BatchPhysicsBrain
+from src.analysis.monte_carlo import PLANT_KEYS, SPREAD, sample, step_metrics
+from src.analysis.simulator import PHYSICS_DT, VISION_DT, DropletPlant, simulate
+from src.engine.config_service import CONFIG_PATH, write_config_atomic
+
+GAINS = ("Kp", "Ki", "Kd")
+# 搜索范围（对数空间），与仪表盘滑动条的范围一致；下限取正数，取整后 Ki 可以为 0.001 量级
+GAIN_BOUNDS = {"Kp": (0.02, 5.0), "Ki": (1e-3, 1.0), "Kd": (0.01, 2.0)}
+COST_WEIGHTS = {"itae": 1.0, "overshoot": 1.0, "effort": 0.2}
+TABLE_SIZE = 5         # 写入 config.json 的增益组数
+MIN_RELAY_DISTANCE = 0.5 # 继电反馈确认：ωu 处开环到临界点 -1 的最小距离
+
+# 继电反馈实验的结果：ku 临界比例增益（与 Kp 同单位），tu 振荡周期 (s)，amplitude 误差振幅，cycles 用于估计的周期数
+RelayResult = namedtuple("RelayResult", ["ku", "tu", "amplitude", "cycles"])
+
+
+def step_cost(result, x0, target, weights=None, vision_dt=VISION_DT):
+    """一次阶跃响应的逐场景代价，返回 {cost, itae, overshoot, effort, settled: (N,) 数组}"""
+    weights = COST_WEIGHTS if weights is None else weights
+    amp = max(abs(target - x0), 1e-9)
+    duration = len(result.t) * vision_dt
+    error = np.abs(target - result.position)
+    itae = (result.t[:, None] * error).sum(axis=0) * vision_dt / (amp * duration * duration / 2.0)
+    applied = np.clip(result.voltage, -result.plant.max_voltage, result.plant.max_voltage)
+    effort = np.mean(applied * applied, axis=0) / (result.plant.max_voltage ** 2)
+    metrics = step_metrics(result, x0, target, vision_dt=vision_dt)
+    overshoot = metrics["overshoot"] / 100.0
+    cost = weights["itae"] * itae + weights["overshoot"] * overshoot + weights["effort"] * effort
+    return {"cost": cost, "itae": itae, "overshoot": overshoot, "effort": effort,
+            "settled": np.isfinite(metrics["settling_time"])}
+
+
+def evaluate_chunk(task):
+    """
+    一块候选增益在全部场景上的代价（进程池的工作函数，只接收可序列化的 dict）。
+    task: gains [[Kp, Ki, Kd], ...]、spread、scenarios、seed、duration、x0、target、weights、vision_dt、physics_dt。
+    返回 {指标: 每组增益的场景平均}，cost 另附 p90（cost_p90），settled 为进入 ±5% 误差带的场景比例。
+    """
+    gains = np.asarray(task["gains"], dtype=np.float64)
+    p, n = len(gains), task["scenarios"]
+    s = sample(task["spread"], n, task["seed"])
+    # 第 i 组增益对应第 i*n ~ (i+1)*n 颗液滴，每组都面对同一批场景
+    kp, ki, kd = (np.repeat(gains[:, j], n) for j in range(3))
+    brain = BatchPhysicsBrain(p * n, Kp=kp, Ki=ki, Kd=kd, target_x=task["target"],
+                              voltage_threshold=Critical_V, k_factor=K_FACTOR) # 控制器只知道名义值
+    plant = DropletPlant(p * n, x0=task["x0"], **{k: np.tile(s[k], p) for k in PLANT_KEYS if k in s})
+    result = simulate(brain, plant, task["duration"], task["vision_dt"], task["physics_dt"],
+                      latency=np.tile(s["latency"], p) if "latency" in s else 0.0,
+                      noise=np.tile(s["noise"], p) if "noise" in s else 0.0, seed=task["seed"] + 1)
+    per = {k: v.reshape(p, n) for k, v in step_cost(result, task["x0"], task["target"], task["weights"],
+                                                    task["vision_dt"]).items()}
+    out = {k: per[k].mean(axis=1).tolist() for k in per}
+    out["cost_p90"] = np.percentile(per["cost"], 90, axis=1).tolist()
+    return out
+
+
+class CandidateEvaluator:
+    """把任意多组候选按 chunk 分块，交给进程池（或当前进程）评估；with 语句结束时关闭进程池"""
+
+    def __init__(self, spread=None, scenarios=32, seed=0, duration=8.0, x0=0.0, target=100.0, weights=None,
+                 vision_dt=VISION_DT, physics_dt=PHYSICS_DT, workers=None, chunk=8):
+        spread = SPREAD if spread is None else spread
+        self.settings = {"spread": {k: list(v) if isinstance(v, tuple) else v for k, v in spread.items()},
+                         "scenarios": int(scenarios), "seed": int(seed), "duration": float(duration),
+                         "x0": float(x0), "target": float(target), "weights": dict(COST_WEIGHTS, **(weights or {})),
+                         "vision_dt": float(vision_dt), "physics_dt": float(physics_dt)}
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk = max(int(chunk), 1)
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __call__(self, gains, **overrides):
+        """gains (P, 3) -> {指标: (P,) 数组}；overrides 可以替换 settings 中的项（例如验证用的 seed / scenarios）"""
+        gains = np.asarray(gains, dtype=np.float64).reshape(-1, 3)
+        settings = dict(self.settings, **overrides)
+        tasks = [dict(settings, gains=gains[i:i + self.chunk].tolist()) for i in range(0, len(gains), self.chunk)]
+        if self.workers <= 1 or len(tasks) <= 1:
+            parts = [evaluate_chunk(t) for t in tasks]
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            parts = list(self._pool.map(evaluate_chunk, tasks))
+        return {k: np.concatenate([part[k] for part in parts]) for k in parts[0]}
+
+
+def optimize(evaluator, population=32, generations=8, elite=0.25, seed=0, init=None, validate=None,
+             table_size=TABLE_SIZE, progress=None):
+    """
+    对数增益空间中的交叉熵搜索。evaluator 为 CandidateEvaluator；init 为可选的起始增益 (Kp, Ki, Kd)
+    （例如 config.json 中当前的增益，作为第一代的一个候选）。validate 为验证场景数（默认搜索场景数的 4 倍）。
+    progress(generation, best_gains, best_cost): 可选的进度回调。返回排序后的增益表（dict 列表）。
+    """
+    rng = np.random.default_rng(seed)
+    lo = np.log([GAIN_BOUNDS[g][0] for g in GAINS])
+    hi = np.log([GAIN_BOUNDS[g][1] for g in GAINS])
+    mean = (lo + hi) / 2.0 if init is None else np.clip(np.log(np.maximum(init, np.exp(lo))), lo, hi)
+    std = (hi - lo) / 4.0
+    n_elite = max(int(round(population * elite)), 2)
+
+    seen_gains, seen_cost = [], []
+    for g in range(generations):
+        z = np.clip(rng.normal(mean, std, (population, 3)), lo, hi)
+        if g == 0 and init is not None:
+            z[0] = mean
+        gains = np.exp(z)
+        cost = evaluator(gains)["cost"]
+        order = np.argsort(cost)
+        best = z[order[:n_elite]]
+        # 平滑更新：标准差不低于范围的 2%，避免过早收敛到一点
+        mean = best.mean(axis=0)
+        std = np.maximum(0.7 * best.std(axis=0) + 0.3 * std, (hi - lo) * 0.02)
+        seen_gains.append(gains)
+        seen_cost.append(cost)
+        if progress is not None:
+            progress(g + 1, gains[order[0]], float(cost[order[0]]))
+
+    # 验证：取整去重后代价最低的若干组，在另一批场景上重新评估
+    gains = np.round(np.concatenate(seen_gains), 3)
+    cost = np.concatenate(seen_cost)
+    _, first = np.unique(gains, axis=0, return_index=True)
+    shortlist = first[np.argsort(cost[first])][:table_size * 3]
+    scenarios = validate or evaluator.settings["scenarios"] * 4
+    stats = evaluator(gains[shortlist], seed=evaluator.settings["seed"] + 1000, scenarios=scenarios)
+    order = np.argsort(stats["cost"])[:table_size]
+    table = []
+    for i in order:
+        row = {name: float(gains[shortlist[i]][j]) for j, name in enumerate(GAINS)}
+        row.update({k: round(float(stats[k][i]), 4) for k in ("cost", "cost_p90", "itae", "overshoot", "effort", "settled")})
+        table.append(row)
+    return table
+
+
+def relay_feedback(sense, actuate, target, force=4.0, hysteresis=0.5, duration=40.0, settle_switches=2,
+                   voltage_threshold=Critical_V, k_factor=K_FACTOR, max_missing=30):
+    """
+    继电反馈实验：误差 e = target - x 超过 +hysteresis 时输出 +force，低于 -hysteresis 时输出 -force，
+    力按 PhysicsBrain 的反演换算为电压。sense() -> (t, x) 或 None（本周期没有测量，输出保持），
+    actuate(voltage) 下发电压。实验结束时下发 0V。
+    丢弃前 settle_switches 次切换（起振过程），振荡不足两个整周期、或连续 max_missing 次没有测量时返回 None。
+    """
+    u = 0.0
+    t_start = None
+    missing = 0
+    times, errors, switches = [], [], []
+    try:
+        while True:
+            m = sense()
+            missing = 0 if m is not None else missing + 1
+            if missing > max_missing:
+                return None
+            if m is not None:
+                t, x = m
+                t_start = t if t_start is None else t_start
+                if t - t_start > duration:
+                    break
+                e = target - x
+                times.append(t)
+                errors.append(e)
+                new = force if e > hysteresis else -force if e < -hysteresis else (u or force)
+                if u and new != u:
+                    switches.append(len(times) - 1)
+                u = new
+            v = np.sign(u) * (np.sqrt(k_factor * abs(u)) + voltage_threshold) if u else 0.0
+            actuate(float(v))
+    finally:
+        actuate(0.0)
+
+    switches = switches[settle_switches:]
+    if len(switches) < 5: # 两个整周期 = 4 个半周期
+        return None
+    times, errors = np.asarray(times), np.asarray(errors)
+    half = np.diff(times[switches])
+    window = errors[switches[0]:switches[-1] + 1]
+    amplitude = float(window.max() - window.min()) / 2.0
+    tu = 2.0 * float(np.median(half))
+    ku = 4.0 * force / (np.pi * max(amplitude, 1e-9))
+    return RelayResult(float(ku), tu, amplitude, len(half) / 2.0)
+
+
+def first_measurement(sense, max_missing=30):
+    """实验开始前的第一次测量 (t, x)；与 relay_feedback 一样，连续 max_missing 次没有测量时放弃并返回 None"""
+    for _ in range(max_missing + 1):
+        m = sense()
+        if m is not None:
+            return m
+    return None
+
+
+def simulated_rig(plant=None, vision_dt=VISION_DT, physics_dt=PHYSICS_DT):
+    """单颗仿真液滴的 (sense, actuate)：每次 actuate 推进一个控制周期；默认名义对象参数"""
+    plant = DropletPlant(1) if plant is None else plant
+    clock = [0.0]
+    substeps = max(int(round(vision_dt / physics_dt)), 1)
+
+    def sense():
+        return clock[0], float(plant.pos[0])
+
+    def actuate(voltage):
+        plant.advance(np.array([voltage]), substeps, physics_dt)
+        clock[0] += vision_dt
+
+    return sense, actuate
+
+
+def open_rig(port, camera_index=0, min_confidence=0.6, frames=8):
+    """
+    真实装置的 (sense, actuate, close)：摄像头 + 自动捕获 + 串口执行器，与 main 的初始化流程相同。
+    自动捕获失败时抛出 RuntimeError（继电实验不弹出框选窗口）。
+    """
+    from src.control.actuator import HardwareController, SerialTransmitter
+    from src.drivers.camera import open_camera
+    from src.drivers.frame_grabber import LatestFrameGrabber
+    from src.main import FPS, FRAME_SIZE, MAX_V
+    from src.vision.tracker import GalinstanTracker
+
+    cap, _ = open_camera(size=FRAME_SIZE, fps=FPS, index=camera_index)
+    if cap is None:
+        raise RuntimeError("摄像头唤醒失败")
+    for _ in range(5): cap.read() # 规避曝光震荡
+    grabber = LatestFrameGrabber(cap, size=FRAME_SIZE).start()
+    transmitter = None
+    try:
+        packets = [grabber.wait(timeout=2.0)]
+        while packets[-1] is not None and len(packets) < frames:
+            packets.append(grabber.wait(last_id=packets[-1].frame_id, timeout=1.0))
+        packets = [p for p in packets if p is not None]
+        tracker = GalinstanTracker(buffer_sec=2, fps=FPS)
+        locked, _ = tracker.auto_calibrate([p.frame for p in packets], min_confidence, manual_fallback=False) \
+            if packets else (False, 0.0)
+        if not locked:
+            raise RuntimeError("未能自动捕获液滴")
+        transmitter = SerialTransmitter(port=port, baudrate=115200)
+        actuator = HardwareController(max_voltage=MAX_V)
+    except Exception:
+        grabber.stop()
+        cap.release()
+        raise
+
+    last = [packets[-1].frame_id]
+
+    def sense():
+        packet = grabber.wait(last_id=last[0], timeout=1.0)
+        if packet is None:
+            return None
+        last[0] = packet.frame_id
+        pos = tracker.process_frame(packet.frame, timestamp=packet.timestamp)
+        return None if pos is None else (packet.timestamp, float(pos[0]))
+
+    def actuate(voltage):
+        transmitter.send_command(actuator.generate_instruction(voltage))
+
+    def close():
+        grabber.stop()
+        cap.release()
+        transmitter.close()
+
+    return sense, actuate, close
+
+
+def confirm(table, relay, min_distance=MIN_RELAY_DISTANCE):
+    """按继电实验测得的 (Ku, Tu) 给每组增益记录 ωu 处到临界点的距离；距离不足的排到表尾（组内保持代价顺序）"""
+    w = 2.0 * np.pi / relay.tu
+    for row in table:
+        c = row["Kp"] + 1j * (row["Kd"] * w - row["Ki"] / w)
+        row["relay_distance"] = round(float(abs(1.0 - c / relay.ku)), 3)
+        row["relay_ok"] = row["relay_distance"] >= min_distance
+    table.sort(key=lambda row: not row["relay_ok"])
+    return table
+
+
+def profile_from_logs(history_path=None, latency_path=None):
+    """
+    从录制的日志估计仿真设置：追踪历史 (.npy，见 vision/history.py) -> 视觉周期与追踪噪声 σ，
+    耗时汇总 (latency_summary_*.json) -> 端到端延迟（各阶段 p50 之和）。返回可用于覆盖的 dict。
+    """
+    out = {}
+    if history_path:
+        h = np.load(history_path)
+        ok = ~h["lost"] & np.isfinite(h["x"])
+        # 相邻两帧都锁定、且帧序号连续的样本
+        pair = ok[1:] & ok[:-1] & (np.diff(h["seq"]) == 1)
+        if pair.sum() >= 2:
+            out["vision_dt"] = float(np.median(np.diff(h["t"])[pair]))
+        # 二阶差分：慢速运动几乎抵消，白噪声的方差放大 6 倍；用 MAD 抵抗偶发的跳变
+        triple = pair[1:] & pair[:-1]
+        if triple.sum() >= 10:
+            d2 = (h["x"][2:] - 2.0 * h["x"][1:-1] + h["x"][:-2])[triple]
+            out["noise"] = float(1.4826 * np.median(np.abs(d2 - np.median(d2))) / np.sqrt(6.0))
+    if latency_path:
+        with open(latency_path) as f:
+            summary = json.load(f)
+        out["latency"] = sum(summary[s]["p50_ms"] for s in ("capture", "track", "control", "encode", "serial")
+                             if s in summary and summary[s].get("count")) / 1000.0
+    return out
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PhysicsBrain 的 PID 自动整定（批量仿真器 + 进程池 + 可选继电反馈确认）")
+    parser.add_argument("--generations", type=int, default=8, help="交叉熵搜索的代数")
+    parser.add_argument("--population", type=int, default=32, help="每代的候选增益组数")
+    parser.add_argument("--scenarios", type=int, default=32, help="搜索时每组增益的场景数（验证时用 4 倍）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--duration", type=float, default=8.0, help="每次阶跃响应的时长 (s)")
+    parser.add_argument("--step", type=float, default=100.0, help="阶跃幅度（液滴从 0 出发）")
+    parser.add_argument("--weights", help="覆盖代价权重，例如 itae=1,overshoot=2,effort=0.1")
+    parser.add_argument("--history", help="录制的追踪历史 (.npy)：用实测的视觉周期与追踪噪声")
+    parser.add_argument("--latency-log", help="耗时汇总 (latency_summary_*.json)：用实测的端到端延迟")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--relay", choices=["none", "sim", "rig"], default=None,
+                        help="继电反馈确认：sim 对名义仿真液滴，rig 对真实装置（给定 --relay-port 时默认 rig）")
+    parser.add_argument("--relay-port", help="真实装置的串口，例如 COM3")
+    parser.add_argument("--camera", type=int, default=0, help="真实装置的摄像头编号")
+    parser.add_argument("--relay-force", type=float, default=4.0, help="继电输出的力幅值（需超过静摩擦阈值）")
+    parser.add_argument("--relay-seconds", type=float, default=40.0, help="继电实验时长 (s)；名义液滴的振荡周期约 4~6s")
+    parser.add_argument("--config", default=CONFIG_PATH, help="增益表写入的配置文件；传空字符串只打印不写入")
+    parser.add_argument("--apply", action="store_true", help="同时把第一名设为当前 Kp / Ki / Kd")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cfg = {}
+    if args.config and os.path.exists(args.config):
+        with open(args.config, "r") as f:
+            cfg = json.load(f)
+
+    spread = dict(SPREAD)
+    profile = profile_from_logs(args.history, args.latency_log)
+    for key in ("noise", "latency"):
+        if key in profile:
+            spread[key] = profile[key]
+    vision_dt = profile.get("vision_dt", VISION_DT)
+    if profile:
+        print("📼 日志实测: " + ", ".join(f"{k}={v:.4g}" for k, v in profile.items()))
+    weights = {k: float(v) for k, v in (item.split("=") for item in args.weights.split(","))} if args.weights else None
+    init = [cfg[g] for g in GAINS] if all(g in cfg for g in GAINS) else None
+
+    def progress(generation, gains, cost):
+        print(f"🧬 第 {generation}/{args.generations} 代 | 最优 Kp={gains[0]:.3g} Ki={gains[1]:.3g} Kd={gains[2]:.3g} | 代价 {cost:.4f}")
+
+    t0 = time.perf_counter()
+    with CandidateEvaluator(spread, args.scenarios, args.seed, args.duration, target=args.step, weights=weights,
+                            vision_dt=vision_dt, workers=args.workers) as evaluator:
+        table = optimize(evaluator, args.population, args.generations, seed=args.seed, init=init, progress=progress)
+    print(f"⏱️ 搜索 + 验证耗时 {time.perf_counter() - t0:.1f}s")
+
+    mode = args.relay or ("rig" if args.relay_port else "none")
+    if mode != "none":
+        if mode == "rig":
+            if not args.relay_port:
+                print("❌ --relay rig 需要 --relay-port")
+                return 1
+            try:
+                sense, actuate, close = open_rig(args.relay_port, args.camera)
+            except Exception as e:
+                print(f"❌ 真实装置初始化失败: {e}")
+                return 1
+            try:
+                # 以实验开始时的位置为目标，液滴在原地附近振荡
+                first = first_measurement(sense)
+                if first is None:
+                    actuate(0.0)
+                    print("❌ 实验开始前一直没有追踪到液滴，放弃继电实验")
+                    return 1
+                relay = relay_feedback(sense, actuate, first[1], args.relay_force, duration=args.relay_seconds)
+            finally:
+                close()
+        else:
+            sense, actuate = simulated_rig(vision_dt=vision_dt)
+            relay = relay_feedback(sense, actuate, 20.0, args.relay_force, duration=args.relay_seconds)
+        if relay is None:
+            print("⚠️ 继电实验没有形成持续振荡（力幅值是否低于静摩擦？），跳过确认")
+        else:
+            print(f"🔁 继电反馈 ({mode}): Ku={relay.ku:.3g} Tu={relay.tu:.2f}s 振幅 {relay.amplitude:.2f} ({relay.cycles:.1f} 周期)")
+            confirm(table, relay)
+
+    print(f"\n{'Kp':>6} {'Ki':>6} {'Kd':>6} | {'代价':>6} {'p90':>6} | {'ITAE':>6} {'超调':>6} {'电压':>6} | {'入带率':>6}"
+          + (" | 临界距离" if table and "relay_distance" in table[0] else ""))
+    for row in table:
+        line = (f"{row['Kp']:>6.3g} {row['Ki']:>6.3g} {row['Kd']:>6.3g} | {row['cost']:>6.3f} {row['cost_p90']:>6.3f} | "
+                f"{row['itae']:>6.3f} {row['overshoot']:>6.1%} {row['effort']:>6.3f} | {row['settled']:>6.1%}")
+        if "relay_distance" in row:
+            line += f" | {row['relay_distance']:.2f}{'' if row['relay_ok'] else ' ⚠️'}"
+        print(line)
+
+    if args.config and table:
+        cfg["gain_table"] = table
+        if args.apply:
+            cfg.update({g: table[0][g] for g in GAINS})
+        write_config_atomic(args.config, cfg)
+        print(f"💾 增益表已写入 {args.config}" + ("，当前增益已切换为第一名" if args.apply else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
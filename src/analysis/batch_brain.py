@@ -0,0 +1,110 @@
+"""
+--- batch_brain.py v1.0 ---
+目的：
+PhysicsBrain.think() 每次只推进一个控制器，而且全是 Python 标量运算（标量上的 np.clip / np.sqrt 反而更慢）。
+调参、蒙特卡洛研究要把成千上万组增益各跑一遍闭环，逐个实例化、逐个调用的代价全花在解释器上。
+BatchPhysicsBrain 把 N 个控制器的增益、积分器与上一次误差存成 (N,) 数组：
+1. 一次 think() 用 N 个状态推进 N 个控制器，返回 N 个电压，每一步都是整列的 numpy 运算；
+2. 控制律与 PhysicsBrain 逐项一致：PID（积分限幅 ±50、可选的估计速度微分项）、
+   |F| < 1e-4 判定到达、sgn(F)·(√(k|F|) + V_threshold) 的死区补偿与平方根反演；
+3. “没有测量”用 NaN 表示（对应标量版本的 current_pos=None），dt <= 1e-5 同样输出 0V，
+   这两种情况下该控制器的状态保持不变——与标量版本提前返回的行为相同；
+4. 每个参数都可以是标量（所有控制器共用）或 (N,) 数组（逐个控制器不同）。
+from_brains() / brain(i) 在标量与批量之间互相转换，离线调参的结果可以直接交给 main 使用。
+"""
+
+import numpy as np
+
+from src.analysis.Brain import Critical_V, K_FACTOR, PhysicsBrain
+
+INTEGRAL_LIMIT = 50.0 # 与 PhysicsBrain.think 的积分抗饱和上限一致
+ARRIVED_FORCE = 1e-4  # |F| 小于它直接判定为到达目标
+
+
+class BatchPhysicsBrain:
+    def __init__(self, n=None, Kp=1.0, Ki=0.0, Kd=0.0, target_x=0.0, voltage_threshold=Critical_V, k_factor=K_FACTOR):
+        """n 省略时由数组参数的长度推断"""
+        params = {"Kp": Kp, "Ki": Ki, "Kd": Kd, "target_x": target_x,
+                  "voltage_threshold": voltage_threshold, "k_factor": k_factor}
+        if n is None:
+            sizes = {np.size(v) for v in params.values() if np.ndim(v) > 0}
+            if len(sizes) != 1:
+                raise ValueError("无法从参数推断控制器个数，请指定 n")
+            n = sizes.pop()
+        self.n = int(n)
+        for name, value in params.items():
+            setattr(self, name, self._column(value, name))
+
+        # 状态寄存器
+        self.integral_error = np.zeros(self.n)
+        self.last_error = np.zeros(self.n)
+
+    def _column(self, value, name="value"):
+        value = np.asarray(value, dtype=np.float64)
+        if value.ndim > 1 or (value.ndim == 1 and len(value) != self.n):
+            raise ValueError(f"{name} 的形状 {value.shape} 与控制器个数 {self.n} 不符")
+        return np.array(np.broadcast_to(value, (self.n,)))
+
+    def __len__(self):
+        return self.n
+
+    @classmethod
+    def from_brains(cls, brains):
+        """把若干个 PhysicsBrain（连同其积分器状态）合并成一个批量控制器"""
+        batch = cls(len(brains),
+                    Kp=[b.Kp for b in brains], Ki=[b.Ki for b in brains], Kd=[b.Kd for b in brains],
+                    target_x=[b.target_x for b in brains],
+                    voltage_threshold=[b.voltage_threshold for b in brains],
+                    k_factor=[b.k_factor for b in brains])
+        batch.integral_error[:] = [b.integral_error for b in brains]
+        batch.last_error[:] = [b.last_error for b in brains]
+        return batch
+
+    def brain(self, i):
+        """第 i 个控制器的标量副本（增益与状态）"""
+        b = PhysicsBrain(Kp=float(self.Kp[i]), Ki=float(self.Ki[i]), Kd=float(self.Kd[i]), target_x=float(self.target_x[i]))
+        b.voltage_threshold = float(self.voltage_threshold[i])
+        b.k_factor = float(self.k_factor[i])
+        b.integral_error = float(self.integral_error[i])
+        b.last_error = float(self.last_error[i])
+        return b
+
+    def reset(self):
+        self.integral_error[:] = 0.0
+        self.last_error[:] = 0.0
+
+    def update_target(self, new_target_x, mask=None):
+        """切换目标并清空状态寄存器；mask 为布尔或下标数组时只作用于选中的控制器"""
+        idx = slice(None) if mask is None else mask
+        self.target_x[idx] = np.broadcast_to(np.asarray(new_target_x, dtype=np.float64), self.target_x[idx].shape)
+        self.integral_error[idx] = 0.0
+        self.last_error[idx] = 0.0
+
+    def think(self, current_x, dt, velocity=None):
+        """
+        输入: current_x (N,) 各控制器对应液滴的 x 坐标（NaN 表示本步没有测量），
+              dt 标量或 (N,) 时间步长 (秒)，可选的 velocity (N,) 估计速度
+        输出: (N,) 理想控制电压
+        """
+        x = np.broadcast_to(np.asarray(current_x, dtype=np.float64), (self.n,))
+        dt = np.broadcast_to(np.asarray(dt, dtype=np.float64), (self.n,))
+        active = np.isfinite(x) & (dt > 1e-5)
+
+        # --- 步骤 A: PID ---
+        error = self.target_x - x
+        integral = np.clip(self.integral_error + error * dt, -INTEGRAL_LIMIT, INTEGRAL_LIMIT)
+        force = self.Kp * error + self.Ki * integral
+        if velocity is not None:
+            force -= self.Kd * np.broadcast_to(np.asarray(velocity, dtype=np.float64), (self.n,))
+        else:
+            force += self.Kd * (error - self.last_error) / np.where(active, dt, 1.0)
+
+        # 状态更新：没有测量或 dt 过小的控制器保持原状
+        np.copyto(self.integral_error, integral, where=active)
+        np.copyto(self.last_error, error, where=active)
+
+        # --- 步骤 B: 物理反演 (Force -> Voltage) ---
+        magnitude = np.abs(force)
+        voltage = np.sign(force) * (np.sqrt(self.k_factor * magnitude) + self.voltage_threshold)
+        voltage[~active | ~(magnitude >= ARRIVED_FORCE)] = 0.0
+        return voltage
@@ -0,0 +1,141 @@
+"""
+--- estimator.py v1.0 ---
+目的：
+把追踪器给出的原始质心（整数像素、带抖动、每帧都有延迟）融合成平滑的 位置 / 速度 / 加速度 状态，
+并按采集时刻外推到“此刻”，让控制律作用在液滴现在所在的位置，而不是一帧之前的位置。
+
+1. 时间轴一律使用采集时刻（FramePacket.timestamp，time.perf_counter 时钟），dt 由相邻测量的时间戳给出，
+   丢帧、抖动都自动计入；
+2. 两种滤波器，接口相同：
+   - KalmanFilter：匀加速模型 + 白噪声 jerk，按实际 dt 构造 F / Q，增益随协方差自适应；
+   - AlphaBetaGammaFilter：固定增益 (α, β, γ)，γ=0 即 α-β 滤波，计算量最小、行为最容易预期；
+   两个轴共享同一个时间序列与噪声模型，因此状态写成 3x2 矩阵（列为 x / y），协方差只需一份 3x3；
+3. 延迟补偿：predict(t) 把状态从最近一次测量外推到任意时刻 t（通常是 think() 执行的此刻再加上执行器延迟）；
+4. 短时丢失：没有新测量时继续外推，超过 max_dropout 秒才放弃（返回 None，控制回路输出 0V）；
+   外推超过 accel_horizon 后不再叠加加速度项，避免二次项在长时间外推中发散；
+5. 新息门限：单次残差超过 gate 像素（例如失锁后在别处重新捕获）视为跳变，直接以该测量重新初始化。
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# 滤波输出：timestamp 为状态对应的时刻；pos / vel / acc 为 (x, y) 元组，单位 px、px/s、px/s²
+State = namedtuple("State", ["timestamp", "pos", "vel", "acc"])
+
+
+class _Estimator:
+    """两种滤波器共用的外推、丢失与门限逻辑；子类实现 _correct(dt, z, predicted)"""
+
+    def __init__(self, max_dropout=0.3, accel_horizon=0.1, gate=80.0):
+        self.max_dropout = max_dropout
+        self.accel_horizon = accel_horizon
+        self.gate = gate
+        self.reset()
+
+    def reset(self):
+        self.t = None            # 最近一次测量的采集时刻
+        self.X = np.zeros((3, 2)) # 行：位置 / 速度 / 加速度；列：x / y
+        self.updates = 0
+        self.resets = 0
+
+    @staticmethod
+    def transition(dt):
+        return np.array([[1.0, dt, 0.5 * dt * dt],
+                         [0.0, 1.0, dt],
+                         [0.0, 0.0, 1.0]])
+
+    def _initialize(self, t, z):
+        self.X[:] = 0.0
+        self.X[0] = z
+        self.t = t
+
+    def update(self, t, pos):
+        """融合一次测量；同一时刻（或更早）的测量只接收一次，定频模式下重复传入同一测量是安全的"""
+        if pos is None or (self.t is not None and t <= self.t):
+            return
+        z = np.array(pos[:2], dtype=np.float64)
+        self.updates += 1
+        if self.t is None or t - self.t > self.max_dropout:
+            self._initialize(t, z)
+            return
+        dt = t - self.t
+        predicted = self.transition(dt) @ self.X
+        if np.hypot(*(z - predicted[0])) > self.gate:
+            self.resets += 1
+            self._initialize(t, z)
+            return
+        self._correct(dt, z, predicted)
+        self.t = t
+
+    def predict(self, t):
+        """把状态外推到时刻 t；从未测量过或丢失超过 max_dropout 时返回 None"""
+        if self.t is None:
+            return None
+        h = t - self.t
+        if h > self.max_dropout:
+            return None
+        h = max(h, 0.0)
+        ha = min(h, self.accel_horizon)
+        p, v, a = self.X
+        pos = p + v * h + 0.5 * a * ha * ha
+        vel = v + a * ha
+        return State(t, (float(pos[0]), float(pos[1])), (float(vel[0]), float(vel[1])), (float(a[0]), float(a[1])))
+
+    def step(self, t_meas, pos, t_now):
+        """update(t_meas, pos) 后 predict(t_now)：控制回路每个 tick 调用一次"""
+        self.update(t_meas, pos)
+        return self.predict(t_now)
+
+
+class KalmanFilter(_Estimator):
+    def __init__(self, jerk_noise=1e6, measurement_noise=1.0, **kwargs):
+        self.q = jerk_noise        # 白噪声 jerk 的谱密度 (px²/s⁵)
+        self.r = measurement_noise # 测量噪声方差 (px²)
+        super().__init__(**kwargs)
+
+    def reset(self):
+        super().reset()
+        self.P = np.eye(3)
+
+    def _initialize(self, t, z):
+        super()._initialize(t, z)
+        # 位置不确定度取测量噪声；速度 / 加速度未知，给大方差让前几次测量迅速主导
+        self.P = np.diag([self.r, 1e6, 1e8])
+
+    def _correct(self, dt, z, predicted):
+        F = self.transition(dt)
+        d2, d3 = dt * dt, dt * dt * dt
+        Q = self.q * np.array([[d3 * d2 / 20, d2 * d2 / 8, d3 / 6],
+                               [d2 * d2 / 8, d3 / 3, d2 / 2],
+                               [d3 / 6, d2 / 2, dt]])
+        P = F @ self.P @ F.T + Q
+        # H = [1, 0, 0]：只观测位置，S 是标量，增益是 P 的第一列
+        K = P[:, 0] / (P[0, 0] + self.r)
+        self.X = predicted + np.outer(K, z - predicted[0])
+        self.P = P - np.outer(K, P[0])
+
+
+class AlphaBetaGammaFilter(_Estimator):
+    def __init__(self, alpha=0.6, beta=0.3, gamma=0.05, **kwargs):
+        self.alpha, self.beta, self.gamma = alpha, beta, gamma
+        super().__init__(**kwargs)
+
+    def _correct(self, dt, z, predicted):
+        r = z - predicted[0]
+        self.X = predicted
+        self.X[0] += self.alpha * r
+        self.X[1] += self.beta / dt * r
+        self.X[2] += 2.0 * self.gamma / (dt * dt) * r
+
+
+ESTIMATORS = {"kalman": KalmanFilter, "abg": AlphaBetaGammaFilter}
+
+
+def create_estimator(kind="kalman", **kwargs):
+    """kind 为 "none" 时返回 None（控制律直接使用原始测量）"""
+    if kind == "none":
+        return None
+    if kind not in ESTIMATORS:
+        raise ValueError(f"未知的状态估计器 {kind!r}，可选: none, {', '.join(ESTIMATORS)}")
+    return ESTIMATORS[kind](**kwargs)
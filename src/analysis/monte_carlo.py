@@ -0,0 +1,249 @@
+"""
+--- monte_carlo.py v1.0 ---
+目的：
+test_20_brain.py 只验证了一组名义参数下的阶跃响应，而氧化层让摩擦每次实验都不一样，
+k_factor、Critical_V 随电解液批次漂移，视觉延迟和追踪噪声也随后端与负载变化。
+这里在批量仿真器上评估“一组增益在整个参数散布下的表现”：
+
+1. 场景：按 SPREAD 登记表抽样 scenarios 个对象参数组合（摩擦 / k_factor / Critical_V / 延迟 / 噪声），
+   种子固定，所有增益组面对同一批场景（公共随机数），比较只反映增益的差别；
+2. 指标（每个场景一次阶跃响应）：
+   - 调节时间：误差最后一次离开 ±settle_band × 阶跃幅度（默认 5%）的时刻，结束时仍在带外则为 inf；
+   - 超调：越过目标的最大幅度，相对阶跃幅度的百分比；
+   - 稳态误差：最后 tail 比例时长内平均位置与目标之差的绝对值；
+   - 饱和时间：控制器输出超过执行器上限的总时长；
+   每组增益汇总为各指标的 p50 / p90 / max 与进入误差带的场景比例；
+3. 并行：一组增益的全部场景是一次向量化 simulate()；不同增益组分发到进程池；
+4. 缓存：每组增益的结果以“增益 + 散布 + 场景数 + 种子 + 仿真设置 + 模型版本”的哈希为键，
+   完成一组就追加一行到 JSON Lines 文件 —— 中断后重跑只计算新的点，改了散布或仿真设置自动失效。
+
+命令行：
+    python -m src.analysis.monte_carlo --kp 0.4,0.8,1.6 --ki 0,0.05 --kd 0.1,0.2,0.4 --workers 4
+    python -m src.analysis.monte_carlo --spread static_threshold=uniform:0.2:1.0 --scenarios 500
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from src.analysis.Brain import Critical_V, K_FACTOR
+from src.analysis.batch_brain import BatchPhysicsBrain
+from src.analysis.simulator import VISION_DT, PHYSICS_DT, DropletPlant, simulate
+
+MODEL_VERSION = 1 # 对象模型或指标定义改变时加 1，旧缓存随之失效
+CACHE_PATH = "data/monte_carlo_cache.jsonl"
+
+# 参数散布登记表：参数 -> 分布
+#   ("uniform", 下限, 上限) / ("normal", 均值, 标准差)（截断到 >= 0）/ ("lognormal", 中位数, 对数标准差) / 常数
+SPREAD = {
+    "viscous": ("uniform", 0.15, 0.6),          # 粘性摩擦系数
+    "coulomb": ("uniform", 0.05, 0.2),          # 滑动摩擦力
+    "static_threshold": ("uniform", 0.3, 0.9),  # 接触线钉扎阈值（氧化层）
+    "k_factor": ("lognormal", K_FACTOR, 0.2),
+    "critical_v": ("normal", Critical_V, 0.15),
+    "latency": ("uniform", 0.02, 0.1),          # 视觉延迟 (s)
+    "noise": ("uniform", 0.0, 1.0),             # 追踪噪声 σ (px)
+}
+PLANT_KEYS = ("viscous", "coulomb", "static_threshold", "k_factor", "critical_v")
+
+METRICS = ("settling_time", "overshoot", "steady_state_error", "saturation_time")
+
+
+def sample(spread, n, seed):
+    """按散布抽样 n 个场景，返回 {参数: (n,) 数组}；同一 (spread, n, seed) 结果相同"""
+    rng = np.random.default_rng(seed)
+    out = {}
+    for name in sorted(spread):
+        dist = spread[name]
+        if not isinstance(dist, (tuple, list)):
+            out[name] = np.full(n, float(dist))
+        elif dist[0] == "uniform":
+            out[name] = rng.uniform(dist[1], dist[2], n)
+        elif dist[0] == "normal":
+            out[name] = np.maximum(rng.normal(dist[1], dist[2], n), 0.0)
+        elif dist[0] == "lognormal":
+            out[name] = dist[1] * np.exp(rng.normal(0.0, dist[2], n))
+        else:
+            raise ValueError(f"{name}: 未知分布 {dist[0]!r}")
+    return out
+
+
+def step_metrics(result, x0, target, settle_band=0.05, tail=0.1, vision_dt=VISION_DT):
+    """一次阶跃响应的逐场景指标，返回 {指标: (N,) 数组}"""
+    x = result.position
+    step = target - x0
+    amp = np.maximum(np.abs(step), 1e-9)
+    error = target - x
+    outside = np.abs(error) > settle_band * amp
+    # 最后一个误差带之外的控制步；从未离开误差带时为 -1
+    last = np.where(outside.any(axis=0), len(x) - 1 - np.argmax(outside[::-1], axis=0), -1)
+    settling = np.where(outside[-1], np.inf, (last + 1) * vision_dt)
+    overshoot = np.maximum(np.max(-error * np.sign(step), axis=0), 0.0) / amp * 100.0
+    n_tail = max(int(len(x) * tail), 1)
+    sse = np.abs(x[-n_tail:].mean(axis=0) - target)
+    saturation = result.saturated.sum(axis=0) * vision_dt
+    return {"settling_time": settling, "overshoot": overshoot, "steady_state_error": sse, "saturation_time": saturation}
+
+
+def summarize(metrics):
+    """逐场景指标 -> 每个指标的 p50 / p90 / max，以及进入误差带的场景比例"""
+    out = {"settled_fraction": float(np.isfinite(metrics["settling_time"]).mean())}
+    for name in METRICS:
+        v = metrics[name]
+        # 不插值的分位数：调节时间里的 inf（未进入误差带）不会把结果变成 nan
+        out[name] = {"p50": float(np.percentile(v, 50, method="higher")),
+                     "p90": float(np.percentile(v, 90, method="higher")), "max": float(np.max(v))}
+    return out
+
+
+def task_key(task):
+    """缓存键：任务的全部输入（含模型版本）规整成 JSON 后取 SHA-1"""
+    blob = json.dumps(dict(task, version=MODEL_VERSION), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(blob.encode()).hexdigest()[:16]
+
+
+def evaluate(task):
+    """
+    一组增益在全部场景上的评估（进程池的工作函数，只接收可序列化的 dict）。
+    task: gains (Kp, Ki, Kd)、spread、scenarios、seed、duration、x0、target、settle_band、vision_dt、physics_dt。
+    """
+    n = task["scenarios"]
+    s = sample(task["spread"], n, task["seed"])
+    kp, ki, kd = task["gains"]
+    brain = BatchPhysicsBrain(n, Kp=kp, Ki=ki, Kd=kd, target_x=task["target"],
+                              voltage_threshold=Critical_V, k_factor=K_FACTOR) # 控制器只知道名义值
+    plant = DropletPlant(n, x0=task["x0"], **{k: s[k] for k in PLANT_KEYS if k in s})
+    result = simulate(brain, plant, task["duration"], task["vision_dt"], task["physics_dt"],
+                      latency=s.get("latency", 0.0), noise=s.get("noise", 0.0), seed=task["seed"] + 1)
+    metrics = step_metrics(result, task["x0"], task["target"], task["settle_band"], vision_dt=task["vision_dt"])
+    return dict(summarize(metrics), gains=list(task["gains"]))
+
+
+def load_cache(path):
+    cache = {}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue # 上次中断时写了半行
+                cache[entry["key"]] = entry["result"]
+    return cache
+
+
+def run(gain_sets, spread=None, scenarios=200, seed=0, duration=8.0, x0=0.0, target=100.0, settle_band=0.05,
+        vision_dt=VISION_DT, physics_dt=PHYSICS_DT, workers=None, cache_path=CACHE_PATH, progress=None):
+    """
+    评估若干组增益 [(Kp, Ki, Kd), ...]，返回与之一一对应的结果列表。
+    workers: 进程数（默认 CPU 核数，1 表示在当前进程中顺序计算）；cache_path=None 时不读写缓存。
+    progress(done, total, cached): 可选的进度回调。
+    """
+    spread = SPREAD if spread is None else spread
+    tasks = [{"gains": [float(g) for g in gains], "spread": {k: list(v) if isinstance(v, tuple) else v for k, v in spread.items()},
+              "scenarios": int(scenarios), "seed": int(seed), "duration": float(duration), "x0": float(x0),
+              "target": float(target), "settle_band": float(settle_band),
+              "vision_dt": float(vision_dt), "physics_dt": float(physics_dt)}
+             for gains in gain_sets]
+    keys = [task_key(t) for t in tasks]
+    cache = load_cache(cache_path)
+    todo = {k: t for k, t in zip(keys, tasks) if k not in cache}
+    cached = len(keys) - len(todo)
+
+    log = None
+    if cache_path and todo:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        log = open(cache_path, "a")
+
+    def record(key, result):
+        cache[key] = result
+        if log is not None:
+            log.write(json.dumps({"key": key, "result": result}) + "\n")
+            log.flush() # 每完成一组就落盘：中断后重跑从这里继续
+        if progress is not None:
+            progress(cached + done[0], len(keys), cached)
+
+    done = [0]
+    try:
+        workers = workers or os.cpu_count() or 1
+        if workers <= 1 or len(todo) <= 1:
+            for key, task in todo.items():
+                done[0] += 1
+                record(key, evaluate(task))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(evaluate, task): key for key, task in todo.items()}
+                for future in as_completed(futures):
+                    done[0] += 1
+                    record(futures[future], future.result())
+    finally:
+        if log is not None:
+            log.close()
+    return [cache[k] for k in keys]
+
+
+def rank(results):
+    """按鲁棒性排序：进入误差带的场景比例高者优先，其次 p90 调节时间、p90 超调"""
+    return sorted(results, key=lambda r: (-r["settled_fraction"], r["settling_time"]["p90"], r["overshoot"]["p90"]))
+
+
+def parse_spread(items):
+    """命令行的 名称=分布:参数1:参数2 或 名称=常数"""
+    spread = dict(SPREAD)
+    for item in items or []:
+        name, _, spec = item.partition("=")
+        parts = spec.split(":")
+        spread[name] = float(parts[0]) if len(parts) == 1 else (parts[0], *(float(p) for p in parts[1:]))
+    return spread
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="控制律鲁棒性的蒙特卡洛评估（批量仿真器 + 进程池 + 结果缓存）")
+    parser.add_argument("--kp", default="0.4,0.8,1.6", help="逗号分隔的 Kp 候选")
+    parser.add_argument("--ki", default="0.0,0.05", help="逗号分隔的 Ki 候选")
+    parser.add_argument("--kd", default="0.1,0.2,0.4", help="逗号分隔的 Kd 候选")
+    parser.add_argument("--scenarios", type=int, default=200, help="每组增益的场景数")
+    parser.add_argument("--seed", type=int, default=0, help="场景抽样的随机种子")
+    parser.add_argument("--duration", type=float, default=8.0, help="每次阶跃响应的时长 (s)；名义液滴走完 100px 约需 5s")
+    parser.add_argument("--step", type=float, default=100.0, help="阶跃幅度（液滴从 0 出发）")
+    parser.add_argument("--band", type=float, default=0.05, help="调节时间的误差带（相对阶跃幅度）")
+    parser.add_argument("--spread", action="append", help="覆盖散布，例如 latency=uniform:0.02:0.15 或 noise=0.5，可重复")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--cache", default=CACHE_PATH, help="结果缓存 (JSON Lines)；传空字符串关闭缓存")
+    parser.add_argument("--output", help="把排序后的完整结果写入 JSON 文件")
+    parser.add_argument("--top", type=int, default=10, help="终端显示前几名")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    grid = [[float(v) for v in s.split(",")] for s in (args.kp, args.ki, args.kd)]
+    gain_sets = list(itertools.product(*grid))
+
+    def progress(done, total, cached):
+        print(f"\r🎲 {done}/{total} 组增益（缓存命中 {cached}）", end="", flush=True)
+
+    results = run(gain_sets, parse_spread(args.spread), args.scenarios, args.seed, args.duration,
+                  target=args.step, settle_band=args.band, workers=args.workers, cache_path=args.cache or None, progress=progress)
+    ranked = rank(results)
+    print(f"\n\n{'Kp':>6} {'Ki':>6} {'Kd':>6} | {'入带率':>6} | {'调节 p50/p90 (s)':>16} | {'超调 p90 (%)':>11} | "
+          f"{'稳态误差 p90':>11} | {'饱和 p90 (s)':>11}")
+    for r in ranked[:args.top]:
+        kp, ki, kd = r["gains"]
+        st = r["settling_time"]
+        print(f"{kp:>6.3g} {ki:>6.3g} {kd:>6.3g} | {r['settled_fraction']:>6.1%} | {st['p50']:>7.2f} / {st['p90']:>6.2f} | "
+              f"{r['overshoot']['p90']:>11.1f} | {r['steady_state_error']['p90']:>11.2f} | {r['saturation_time']['p90']:>11.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(ranked, f, indent=2)
+        print(f"💾 完整结果 -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
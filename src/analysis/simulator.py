@@ -0,0 +1,156 @@
+"""
+--- simulator.py v1.0 ---
+目的：
+项目里唯一的被控对象模型原本写在 tests/test_20_brain.py 里：单颗液滴、纯 Python 双重循环。
+这里把它提升为可复用的批量仿真器，让控制律先在仿真器上迭代，而不是直接拿真实的 Galinstan 试错。
+
+1. 对象模型（与 test_20_brain 的虚拟液滴逐项一致）：
+   - 电毛细驱动力 F = sgn(V)·(|V| - critical_v)² / k_factor，|V| 不超过 critical_v 时为 0；
+     电压先按 max_voltage 截断（执行器饱和）；
+   - 静止（|v| < 1e-4）时受接触线钉扎：|F| 不超过 static_threshold 时合力为 0，否则扣除 static_threshold；
+   - 运动时合力 = F - viscous·v - sgn(v)·coulomb（粘性 + 滑动摩擦），a = 合力 / mass，半隐式欧拉积分；
+   所有物理参数都是 (N,) 数组：一次仿真 N 颗参数各不相同的液滴；
+2. 时间尺度：物理子步 physics_dt（默认 1ms），控制器每 vision_dt（默认 50ms）运行一次，
+   两次之间电压零阶保持；
+3. 测量：控制器看到的是 latency 秒之前的位置（按物理子步保存的位置历史取出，逐液滴可不同），
+   再叠加 σ = noise 的高斯噪声；
+4. 控制器是 BatchPhysicsBrain：每个控制步一次 think() 推进全部 N 个控制器；
+   单个 CPU 上 N=1000 时每秒墙钟时间可仿真数万个闭环秒。
+
+命令行（吞吐量自检）：
+    python -m src.analysis.simulator --droplets 1000 --seconds 3
+"""
+
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from src.analysis.Brain import Critical_V, K_FACTOR
+from src.analysis.batch_brain import BatchPhysicsBrain
+
+PHYSICS_DT = 0.001 # 物理子步 (s)
+VISION_DT = 0.05   # 控制 / 视觉周期 (s)
+MAX_VOLTAGE = 5.0  # 执行器饱和电压 (V)
+REST_SPEED = 1e-4  # 低于它视为静止，受静摩擦支配
+
+# 闭环仿真的记录（按控制步采样）：t (T,)；其余为 (T, N)
+# position 为控制步开始时的真实位置，measured 为控制器看到的测量，voltage 为控制器输出（截断前）
+SimResult = namedtuple("SimResult", ["t", "position", "measured", "voltage", "saturated", "plant"])
+
+
+class DropletPlant:
+    def __init__(self, n=None, mass=1.0, viscous=0.3, coulomb=0.1, static_threshold=0.5,
+                 critical_v=Critical_V, k_factor=K_FACTOR, max_voltage=MAX_VOLTAGE, x0=0.0):
+        """各参数可以是标量或 (N,) 数组；n 省略时由数组参数的长度推断"""
+        params = {"mass": mass, "viscous": viscous, "coulomb": coulomb, "static_threshold": static_threshold,
+                  "critical_v": critical_v, "k_factor": k_factor, "max_voltage": max_voltage}
+        if n is None:
+            sizes = {np.size(v) for v in list(params.values()) + [x0] if np.ndim(v) > 0}
+            if len(sizes) != 1:
+                raise ValueError("无法从参数推断液滴个数，请指定 n")
+            n = sizes.pop()
+        self.n = int(n)
+        for name, value in params.items():
+            setattr(self, name, self._column(value, name))
+        self.pos = self._column(x0, "x0")
+        self.vel = np.zeros(self.n)
+
+    def _column(self, value, name="value"):
+        value = np.asarray(value, dtype=np.float64)
+        if value.ndim > 1 or (value.ndim == 1 and len(value) != self.n):
+            raise ValueError(f"{name} 的形状 {value.shape} 与液滴个数 {self.n} 不符")
+        return np.array(np.broadcast_to(value, (self.n,)))
+
+    def __len__(self):
+        return self.n
+
+    def force(self, voltage):
+        """电压 (N,) -> 电毛细驱动力 (N,)；电压先按 max_voltage 截断"""
+        v = np.clip(voltage, -self.max_voltage, self.max_voltage)
+        active = np.maximum(np.abs(v) - self.critical_v, 0.0)
+        return np.sign(v) * active * active / self.k_factor
+
+    def advance(self, voltage, steps, dt=PHYSICS_DT, history=None, start=0):
+        """
+        电压零阶保持，推进 steps 个物理子步。
+        history: 可选的 (H, N) 位置环形缓冲区，第 start + s 个子步的位置写入第 (start + s) % H 行。
+        """
+        f = self.force(voltage)
+        # 静止时的合力只取决于 F，在整个控制周期内不变
+        pinned = np.where(np.abs(f) > self.static_threshold, f - np.sign(f) * self.static_threshold, 0.0)
+        inv_mass = 1.0 / self.mass
+        for s in range(steps):
+            net = f - self.viscous * self.vel - np.sign(self.vel) * self.coulomb
+            np.copyto(net, pinned, where=np.abs(self.vel) < REST_SPEED)
+            self.vel += net * inv_mass * dt
+            self.pos += self.vel * dt
+            if history is not None:
+                history[(start + s + 1) % len(history)] = self.pos
+
+
+def simulate(brain, plant, duration, vision_dt=VISION_DT, physics_dt=PHYSICS_DT, latency=0.0, noise=0.0, seed=None):
+    """
+    闭环仿真：brain 为 BatchPhysicsBrain，plant 为 DropletPlant，二者个数相同（原地推进两者的状态）。
+    latency / noise 可以是标量或 (N,) 数组（秒 / 与位置同单位）。返回 SimResult。
+    """
+    n = len(plant)
+    if len(brain) != n:
+        raise ValueError(f"控制器个数 {len(brain)} 与液滴个数 {n} 不符")
+    rng = np.random.default_rng(seed)
+    substeps = max(int(round(vision_dt / physics_dt)), 1)
+    steps = int(round(duration / vision_dt))
+
+    delay = np.round(np.broadcast_to(np.asarray(latency, dtype=np.float64), (n,)) / physics_dt).astype(np.intp)
+    noise = np.broadcast_to(np.asarray(noise, dtype=np.float64), (n,))
+    history = np.empty((int(delay.max()) + 1, n))
+    history[:] = plant.pos # 仿真开始之前液滴一直在初始位置
+    cols = np.arange(n)
+
+    t = np.arange(steps) * vision_dt
+    position = np.empty((steps, n))
+    measured = np.empty((steps, n))
+    voltage = np.empty((steps, n))
+    for k in range(steps):
+        s = k * substeps
+        position[k] = plant.pos
+        measured[k] = history[(s - delay) % len(history), cols]
+        if noise.any():
+            measured[k] += rng.normal(0.0, 1.0, n) * noise
+        voltage[k] = brain.think(measured[k], vision_dt)
+        plant.advance(voltage[k], substeps, physics_dt, history, s)
+    saturated = np.abs(voltage) > plant.max_voltage
+    return SimResult(t, position, measured, voltage, saturated, plant)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量液滴闭环仿真：吞吐量自检")
+    parser.add_argument("--droplets", type=int, default=1000, help="并行仿真的液滴数")
+    parser.add_argument("--seconds", type=float, default=3.0, help="每颗液滴的闭环时长 (s)")
+    parser.add_argument("--target", type=float, default=100.0, help="阶跃目标位置（液滴从 0 出发）")
+    parser.add_argument("--latency", type=float, default=0.03, help="视觉延迟 (s)")
+    parser.add_argument("--noise", type=float, default=0.5, help="测量噪声 σ")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    n = args.droplets
+    rng = np.random.default_rng(0)
+    # 名义增益（与 test_20_brain 一致）+ 摩擦随液滴散布
+    brain = BatchPhysicsBrain(n, Kp=0.8, Ki=0.05, Kd=0.2, target_x=args.target)
+    plant = DropletPlant(n, viscous=rng.uniform(0.2, 0.4, n), static_threshold=rng.uniform(0.3, 0.7, n))
+    t0 = time.perf_counter()
+    result = simulate(brain, plant, args.seconds, latency=args.latency, noise=args.noise, seed=1)
+    wall = time.perf_counter() - t0
+    final = result.position[-1]
+    print(f"🧪 {n} 颗液滴 × {args.seconds:.1f}s 闭环 | 墙钟 {wall:.2f}s | "
+          f"{n * args.seconds / wall:,.0f} 闭环秒/秒")
+    print(f"   终点误差 |x - target| p50 {np.median(np.abs(final - args.target)):.2f} / "
+          f"max {np.max(np.abs(final - args.target)):.2f} | 饱和步数占比 {result.saturated.mean():.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -37,14 +37,21 @@ class HardwareController: # 物理层：负责将指令映射为串口电信号
         self.max_voltage = max_voltage
         self.pwm_res = pwm_res
         
-    def generate_instruction(self, ideal_voltage): 
-        # ideal_voltage 是从 Brain 模块输出的理想控制电压，HardwareController 的任务是将这个电压值转换为适合 Arduino 接收的串口指令格式。
+    def map_voltage(self, ideal_voltage):
         """
-        将理想物理量映射为数字指令 
+        将理想电压映射为 (direction, pwm_val) 二元组，供指令编码与遥测共用
         """
         clamped_v = max(-self.max_voltage, min(self.max_voltage, ideal_voltage)) # clamped_v 是将 ideal_voltage 限制在 -max_voltage 和 max_voltage 之间的值，确保输出电压不会超过系统的物理限制。
         pwm_val = int(abs(clamped_v) / self.max_voltage * self.pwm_res)
         direction = 1 if ideal_voltage > 0 else 0
+        return direction, pwm_val
+
+    def generate_instruction(self, ideal_voltage): 
+        # ideal_voltage 是从 Brain 模块输出的理想控制电压，HardwareController 的任务是将这个电压值转换为适合 Arduino 接收的串口指令格式。
+        """
+        将理想物理量映射为数字指令 
+        """
+        direction, pwm_val = self.map_voltage(ideal_voltage)
         
         return f"DIR:{direction},PWM:{pwm_val}\n"
         # 返回值是一个字符串，格式为 "DIR:{direction},PWM:{pwm_val}\n"，其中 direction 表示控制信号的方向（正向或反向），pwm_val 表示根据 ideal_voltage 计算出的 PWM 信号值，表示为一个整数，范围从 0 到 pwm_res，表示输出电压相对于 max_voltage 的比例。
@@ -55,7 +62,8 @@ class SerialTransmitter: # 物理链路：负责与 Arduino 建立串口通信
     """
     物理层：负责将指令映射为串口电信号 
     """
-    def __init__(self, port=PORT, baudrate=115200):
+    def __init__(self, port=PORT, baudrate=115200, reset_delay=2.0):
+        # reset_delay: 打开串口会触发 Arduino 复位，等待 bootloader 结束再发指令；接模拟器时可设为 0
         self.ser = None # ser 属性将用于存储串口连接对象，确保在类的其他方法中可以访问和管理这个连接。
         try:
             # 尝试建立物理链路
@@ -65,7 +73,7 @@ class SerialTransmitter: # 物理链路：负责与 Arduino 建立串口通信
             # serial.Serial() 方法用于创建一个新的串口连接对象，如果指定的端口不存在或被占用，将抛出 serial.SerialException 异常。
             # 详情可以搜索关键词 "pyserial Serial class" 来了解更多关于 pyserial 库中 Serial 类的用法和异常处理。
 
-            time.sleep(2) 
+            time.sleep(reset_delay) 
 
             print(f"✅ 物理链路建立成功: {port}")
 
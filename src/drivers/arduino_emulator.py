@@ -0,0 +1,81 @@
+"""
+--- arduino_emulator.py v1.0 ---
+目的：
+没有 Arduino 时的替身。在伪终端 (pty) 上模拟 sketch_apr3a.ino 固件：
+上位机用 pyserial 打开 emulator.port（与真实串口完全同一条代码路径），
+模拟器逐行解析 "DIR:x,PWM:y\\n" 指令，记录每条指令到达的时刻，并按固件格式回传 "Direction:..,PWM_Voltage:..\\n"。
+
+仅支持 POSIX（Linux / macOS）；Windows 上没有 pty，需要 com0com 之类的虚拟串口对。
+"""
+
+import os
+import re
+import select
+import threading
+import time
+from collections import namedtuple
+
+# 收到的一条指令：timestamp 为字节到达模拟器的时刻（time.perf_counter 时钟）
+Command = namedtuple("Command", ["timestamp", "direction", "pwm"])
+
+COMMAND_RE = re.compile(rb"DIR:(-?\d+),PWM:(-?\d+)")
+
+
+class ArduinoEmulator:
+    def __init__(self, echo=True):
+        self.echo = echo
+        self.port = None
+        self.commands = []
+        self.malformed = 0
+
+        self._master = None
+        self._slave = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        import pty
+        import tty
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave) # 关闭行规程：不回显、不做换行转换，与真实 USB 串口一致
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="arduino-emulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        buf = b""
+        while self._running:
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                break
+            stamp = time.perf_counter()
+            buf += data
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                self._handle(line, stamp)
+
+    def _handle(self, line, stamp):
+        m = COMMAND_RE.search(line)
+        if m is None:
+            self.malformed += 1
+            return
+        # 与固件一致：PWM 约束到 0~255
+        direction, pwm = int(m.group(1)), min(max(int(m.group(2)), 0), 255)
+        self.commands.append(Command(stamp, direction, pwm))
+        if self.echo:
+            os.write(self._master, f"Direction:{direction * 300},PWM_Voltage:{pwm}\r\n".encode())
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
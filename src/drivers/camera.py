@@ -0,0 +1,165 @@
+"""
+--- camera.py v1.0 ---
+目的：
+摄像头驱动层：启动时一次性协商好分辨率、帧率与像素格式，让驱动直接交付处理尺寸的画面，
+采集线程不再需要对每一帧做 cv2.resize。
+
+功能：
+1. 并行探测：用线程池同时打开多个设备索引（每个设备的打开 + 首帧往往要几百毫秒），
+   总耗时从“逐个相加”变为“取最慢的一个”。
+2. 格式协商：依次尝试 MJPG / YUYV，向驱动请求目标宽高与 FPS，并以实际读到的首帧尺寸为准，
+   驱动“答应了但没做到”的情况不会被误判为成功。
+3. 档案缓存：选中的设备档案 (索引, 后端, 宽高, FPS, FOURCC) 写入 data/camera_profile.json，
+   下次启动直接按档案打开，跳过整个探测过程；档案失效（设备拔掉 / 尺寸不符）时自动回退到重新探测。
+"""
+
+import json
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from src.engine.config_service import BASE_DIR, write_config_atomic
+
+PROFILE_PATH = os.path.join(BASE_DIR, "data", "camera_profile.json")
+PIXEL_FORMATS = ("MJPG", "YUYV") # 按优先级排列：MJPG 在 USB2 带宽下能跑满高帧率
+
+# 设备档案：width/height 为实际读到的首帧尺寸，fourcc 为协商成功的像素格式（驱动不支持时为空串）
+CameraProfile = namedtuple("CameraProfile", ["index", "backend", "width", "height", "fps", "fourcc"])
+
+
+def default_backend():
+    # 使用 DSHOW 后端在 Windows 上更稳定
+    return cv2.CAP_DSHOW if sys.platform.startswith("win") else cv2.CAP_ANY
+
+
+def decode_fourcc(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00 ")
+
+
+def configure(cap, size, fps, fourcc):
+    """向驱动请求像素格式、分辨率与帧率。FOURCC 必须最先设置，部分驱动会据此重置可选分辨率"""
+    if fourcc:
+        cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if size is not None:
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+    if fps:
+        cap.set(cv2.CAP_PROP_FPS, fps)
+
+
+def negotiate(cap, index, backend, size=None, fps=None, formats=PIXEL_FORMATS):
+    """
+    在一个已打开的设备上协商格式，返回 CameraProfile（设备读不出帧时返回 None）。
+    优先返回首帧尺寸与 size 完全一致的格式；都不一致时返回最后一次读到的实际尺寸，由采集线程兜底缩放。
+    """
+    fallback = None
+    for fourcc in formats:
+        configure(cap, size, fps, fourcc)
+        ret, frame = cap.read()
+        if not ret or frame is None:
+            continue
+        profile = CameraProfile(
+            index, backend, frame.shape[1], frame.shape[0],
+            float(cap.get(cv2.CAP_PROP_FPS) or 0.0), decode_fourcc(cap.get(cv2.CAP_PROP_FOURCC)),
+        )
+        if size is None or (profile.width, profile.height) == tuple(size):
+            return profile
+        fallback = profile
+    return fallback
+
+
+def _probe(index, backend, size, fps, opener):
+    cap = opener(index, backend)
+    if not cap.isOpened():
+        cap.release()
+        return None, None
+    profile = negotiate(cap, index, backend, size, fps)
+    if profile is None:
+        cap.release()
+        return None, None
+    return profile, cap
+
+
+def probe_devices(indices=range(5), size=None, fps=None, backend=None, opener=cv2.VideoCapture, keep_open=False):
+    """
+    并行探测一组设备索引，返回按索引排序的 [(CameraProfile, cap)]。
+    keep_open=False 时探测完立即释放所有句柄，cap 位置为 None。
+    """
+    backend = default_backend() if backend is None else backend
+    indices = list(indices)
+    if not indices:
+        return []
+    with ThreadPoolExecutor(max_workers=len(indices), thread_name_prefix="camera-probe") as pool:
+        results = list(pool.map(lambda i: _probe(i, backend, size, fps, opener), indices))
+
+    found = []
+    for profile, cap in results:
+        if profile is None:
+            continue
+        if not keep_open:
+            cap.release()
+            cap = None
+        found.append((profile, cap))
+    return found
+
+
+def load_profile(path=PROFILE_PATH):
+    try:
+        with open(path, "r") as f:
+            return CameraProfile(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def save_profile(profile, path=PROFILE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    write_config_atomic(path, profile._asdict())
+
+
+def open_cached(profile, size=None, opener=cv2.VideoCapture):
+    """按档案直接打开设备；档案与当前需求不符或设备已失效时返回 None"""
+    if size is not None and (profile.width, profile.height) != tuple(size):
+        return None
+    cap = opener(profile.index, profile.backend)
+    if not cap.isOpened():
+        cap.release()
+        return None
+    configure(cap, (profile.width, profile.height), profile.fps, profile.fourcc)
+    ret, frame = cap.read()
+    if not ret or frame is None or (frame.shape[1], frame.shape[0]) != (profile.width, profile.height):
+        cap.release()
+        return None
+    return cap
+
+
+def open_camera(size=None, fps=None, index=None, max_devices=5, profile_path=PROFILE_PATH,
+                use_cache=True, backend=None, opener=cv2.VideoCapture):
+    """
+    打开摄像头并协商到目标尺寸，返回 (cap, CameraProfile)；没有任何可用设备时返回 (None, None)。
+    index 为 None 时自动选择：优先首帧尺寸与 size 一致的设备，其次索引最小的设备。
+    """
+    if use_cache and profile_path:
+        profile = load_profile(profile_path)
+        if profile is not None and (index is None or profile.index == index):
+            cap = open_cached(profile, size, opener)
+            if cap is not None:
+                return cap, profile
+
+    indices = [index] if index is not None else range(max_devices)
+    found = probe_devices(indices, size, fps, backend, opener, keep_open=True)
+    if not found:
+        return None, None
+
+    exact = [item for item in found if size is None or (item[0].width, item[0].height) == tuple(size)]
+    profile, cap = (exact or found)[0]
+    for other, other_cap in found:
+        if other_cap is not cap:
+            other_cap.release()
+
+    if profile_path:
+        save_profile(profile, profile_path)
+    return cap, profile
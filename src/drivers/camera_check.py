@@ -1,16 +1,8 @@
-import cv2
+from src.drivers.camera import probe_devices
 
 def get_available_cameras(max_tests=5):
     """
     扫描系统硬件管线，返回所有可用摄像头的索引列表。
+    各索引由线程池并行打开并读取首帧，总耗时取决于最慢的一个设备，而不是全部相加。
     """
-    available_indices = []
-    for i in range(max_tests):
-        # 使用 DSHOW 后端在 Windows 上更稳定
-        cap = cv2.VideoCapture(i, cv2.CAP_DSHOW)
-        if cap.isOpened():
-            ret, frame = cap.read()
-            if ret:
-                available_indices.append(i)
-            cap.release()
-    return available_indices
\ No newline at end of file
+    return [profile.index for profile, _ in probe_devices(range(max_tests))]
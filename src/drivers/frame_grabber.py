@@ -0,0 +1,97 @@
+"""
+--- frame_grabber.py v1.0 ---
+目的：
+把 cap.read() 从主循环中剥离出来，交给独立的采集线程。
+采集线程持续抽干驱动队列，只在一个“单槽缓冲区”里保留最新的一帧，并打上采集时间戳与帧号。
+主循环随取随走，永远拿到最新鲜的画面，不再为一个完整的帧间隔阻塞，也不会处理在驱动队列里积压过的旧帧。
+
+使用方式：
+    grabber = LatestFrameGrabber(cap, size=(640, 480)).start()
+    packet = grabber.read(last_id)      # 非阻塞：没有新帧时返回 None
+    packet = grabber.wait(last_id, 0.1) # 阻塞等待新帧（带超时）
+    grabber.stop()
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+
+# 帧数据包：帧号单调递增，timestamp 为 time.perf_counter() 时钟下的采集时刻（秒）
+FramePacket = namedtuple("FramePacket", ["frame_id", "timestamp", "frame"])
+
+
+class LatestFrameGrabber:
+    def __init__(self, cap, size=None):
+        # cap: 已打开的 cv2.VideoCapture（或任何具备 read()/release() 的同构对象）
+        # size: (w, h)，若给定则在采集线程内完成缩放，把 resize 的开销移出控制回路
+        self.cap = cap
+        self.size = size
+
+        self._cond = threading.Condition()
+        self._packet = None   # 单槽缓冲区：只保存最新一帧
+        self._running = False
+        self._thread = None
+
+        # 统计寄存器
+        self.frames_grabbed = 0
+        self.read_failures = 0
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        frame_id = 0
+        while self._running:
+            ret, frame = self.cap.read()
+            # 时间戳紧跟在 read() 返回之后打，尽量贴近曝光完成的时刻
+            stamp = time.perf_counter()
+            if not ret or frame is None:
+                self.read_failures += 1
+                time.sleep(0.005)  # 防止设备掉线时空转占满 CPU
+                continue
+
+            if self.size is not None and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+                frame = cv2.resize(frame, tuple(self.size))
+
+            frame_id += 1
+            with self._cond:
+                self._packet = FramePacket(frame_id, stamp, frame)
+                self.frames_grabbed = frame_id
+                self._cond.notify_all()
+
+    def read(self, last_id=0):
+        """
+        非阻塞读取：若槽中帧号大于 last_id 则返回该 FramePacket，否则返回 None。
+        last_id=0 时只要有帧就返回。
+        """
+        packet = self._packet  # 引用赋值是原子的，无需加锁
+        if packet is None or packet.frame_id <= last_id:
+            return None
+        return packet
+
+    def wait(self, last_id=0, timeout=None):
+        """
+        阻塞等待一帧比 last_id 更新的画面，超时返回 None。
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: not self._running or (self._packet is not None and self._packet.frame_id > last_id),
+                timeout=timeout,
+            )
+            return self.read(last_id)
+
+    def stop(self):
+        """停止采集线程（不负责 release 摄像头句柄，由调用者决定）"""
+        self._running = False
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
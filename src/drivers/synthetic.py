@@ -0,0 +1,87 @@
+"""
+--- synthetic.py v1.0 ---
+目的：
+没有摄像头时的替身。SyntheticCamera 与 cv2.VideoCapture 同构（read / release / isOpened / get / set），
+按给定的轨迹函数在固定背景上渲染一颗“液滴”，并记录每一帧离开“镜头”的时刻与液滴的真实位置，
+供基准测试计算 glass-to-command 延迟，也可用于离线调试整条控制链路。
+"""
+
+import time
+from collections import deque, namedtuple
+
+import cv2
+import numpy as np
+
+# 真值记录：seq 为第几次 read()，timestamp 为 read() 返回时刻（time.perf_counter 时钟）
+GroundTruth = namedtuple("GroundTruth", ["seq", "timestamp", "x", "y"])
+
+
+def square_wave(center, amplitude, period, y=None):
+    """液滴在 center ± amplitude 之间阶跃往返的轨迹，每半个周期跳变一次"""
+    cx, cy = center
+    y = cy if y is None else y
+
+    def trajectory(t):
+        phase = int(t / (period / 2.0)) % 2
+        return (cx - amplitude if phase == 0 else cx + amplitude, y)
+    return trajectory
+
+
+class SyntheticCamera:
+    def __init__(self, size=(640, 480), fps=30.0, trajectory=None, radius=14, seed=0, history=100000):
+        self.size = tuple(size)
+        self.fps = fps # 0 表示不限速，read() 立即返回
+        self.radius = radius
+        self.trajectory = trajectory or (lambda t: (size[0] / 2.0, size[1] / 2.0))
+
+        # 固定纹理背景只生成一次：每帧只做一次整帧拷贝 + 画圆
+        rng = np.random.default_rng(seed)
+        w, h = self.size
+        self._background = np.clip(rng.normal(180, 12, (h, w, 1)), 0, 255).astype(np.uint8).repeat(3, axis=2)
+
+        self.truth = deque(maxlen=history)
+        self.seq = 0
+        self._t0 = None
+        self._opened = True
+
+    def isOpened(self):
+        return self._opened
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.size[0])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.size[1])
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.fps)
+        return 0.0
+
+    def set(self, prop, value):
+        return False # 尺寸与帧率在构造时确定
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        now = time.perf_counter()
+        if self._t0 is None:
+            self._t0 = now
+        if self.fps > 0:
+            # 按绝对时刻排程，模拟传感器的固定帧间隔
+            deadline = self._t0 + self.seq / self.fps
+            if deadline > now:
+                time.sleep(deadline - now)
+
+        x, y = self.trajectory(time.perf_counter() - self._t0)
+        frame = self._background.copy()
+        center = (int(round(x)), int(round(y)))
+        cv2.circle(frame, center, self.radius, (60, 60, 70), -1)              # 液态金属本体
+        cv2.circle(frame, (center[0] - self.radius // 3, center[1] - self.radius // 3),
+                   max(self.radius // 4, 2), (250, 250, 250), -1)               # 镜面高光
+
+        stamp = time.perf_counter()
+        self.seq += 1
+        self.truth.append(GroundTruth(self.seq, stamp, float(x), float(y)))
+        return True, frame
+
+    def release(self):
+        self._opened = False
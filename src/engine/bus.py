@@ -0,0 +1,321 @@
+"""
+--- bus.py v1.0 ---
+目的：
+在仪表盘 (dashboard.py) 与引擎 (main.py) 之间建立一条本地双向消息总线，取代“config.json 轮询共享寄存器”。
+不依赖任何外部 broker：POSIX 上走 Unix 域套接字，Windows 上退化为 127.0.0.1 回环 TCP。
+
+协议（每条消息一行 JSON，以 \\n 结尾）：
+    客户端 -> 引擎
+        {"type": "set", "seq": 7, "params": {"Kp": 0.5}}   参数下发
+        {"type": "subscribe", "rate_hz": 20}                调整遥测推送频率
+    引擎 -> 客户端
+        {"type": "ack", "seq": 7, "frame_id": 1234, "version": 3}   参数在第 1234 帧生效
+        {"type": "nack", "seq": 7, "error": "..."}                  参数被拒收
+        {"type": "telemetry", "frame_id": ..., "pos": ..., ...}     引擎状态回流
+
+线程模型：
+EngineBus 自带一个 I/O 线程负责 accept / 收发；引擎线程只调用 drain() 取入站消息、
+reply() / publish_telemetry() 投递出站消息，二者之间只通过线程安全队列交互，引擎 tick 永远不会被网络阻塞。
+"""
+
+import json
+import math
+import os
+import queue
+import selectors
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+
+DEFAULT_TCP_PORT = 47800
+MAX_OUTBUF = 256 * 1024 # 单个客户端的出站缓冲上限，超出则丢弃遥测（慢消费者不拖累引擎）
+
+
+def default_address():
+    if hasattr(socket, "AF_UNIX"):
+        return "unix:" + os.path.join(tempfile.gettempdir(), "galinstan_engine.sock")
+    return f"tcp:127.0.0.1:{DEFAULT_TCP_PORT}"
+
+
+def parse_address(address):
+    """'unix:/tmp/x.sock' -> (AF_UNIX, path)；'tcp:127.0.0.1:47800' -> (AF_INET, (host, port))"""
+    kind, _, rest = address.partition(":")
+    if kind == "unix":
+        return socket.AF_UNIX, rest
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    raise ValueError(f"无法识别的总线地址: {address}")
+
+
+def encode(msg):
+    return (json.dumps(msg, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class _Client:
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbuf = b""
+        self.outbuf = bytearray()
+
+
+class EngineBus:
+    def __init__(self, address=None, telemetry_hz=20.0):
+        self.address = address or default_address()
+        self.telemetry_hz = telemetry_hz
+        self._last_telemetry = -float("inf")
+
+        self._inbox = queue.Queue()   # (client_id, msg)
+        self._outbox = queue.Queue()  # (client_id 或 None 表示广播, bytes)
+        self._clients = {}
+        self._sel = selectors.DefaultSelector()
+        self._server = None
+        self._running = False
+        self._thread = None
+        self._next_id = 0
+
+    # --- 生命周期 ---
+    def start(self):
+        family, addr = parse_address(self.address)
+        if family == getattr(socket, "AF_UNIX", None) and os.path.exists(addr):
+            os.remove(addr) # 清理上次异常退出遗留的套接字文件
+        server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(addr)
+        server.listen(4)
+        server.setblocking(False)
+        self._server = server
+        self._sel.register(server, selectors.EVENT_READ, None)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="engine-bus", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        for client in list(self._clients.values()):
+            client.sock.close()
+        self._clients.clear()
+        if self._server is not None:
+            self._server.close()
+            family, addr = parse_address(self.address)
+            if family == getattr(socket, "AF_UNIX", None) and os.path.exists(addr):
+                os.remove(addr)
+        self._sel.close()
+
+    @property
+    def client_count(self):
+        return len(self._clients)
+
+    # --- 引擎线程调用的接口 ---
+    def drain(self):
+        """取出所有待处理的入站消息 [(client_id, msg), ...]，非阻塞"""
+        items = []
+        while True:
+            try:
+                items.append(self._inbox.get_nowait())
+            except queue.Empty:
+                return items
+
+    def reply(self, client_id, msg):
+        self._outbox.put((client_id, encode(msg)))
+
+    def telemetry_due(self, now=None):
+        """
+        此刻是否该推送遥测（有客户端连接、且距上次推送已满 1 / telemetry_hz）。
+        遥测的构建本身有代价（各阶段统计、分位数），引擎先问这一句，只在会真正发出时才构建。
+        """
+        if not self._clients or self.telemetry_hz <= 0:
+            return False
+        now = time.perf_counter() if now is None else now
+        return now - self._last_telemetry >= 1.0 / self.telemetry_hz
+
+    def publish_telemetry(self, data, now=None):
+        """按 telemetry_hz 限频广播遥测，返回本次是否真正发出"""
+        now = time.perf_counter() if now is None else now
+        if not self.telemetry_due(now):
+            return False
+        self._last_telemetry = now
+        self._outbox.put((None, encode(dict(data, type="telemetry"))))
+        return True
+
+    # --- I/O 线程 ---
+    def _run(self):
+        while self._running:
+            for key, _ in self._sel.select(timeout=0.005):
+                if key.data is None:
+                    self._accept()
+                else:
+                    self._read(key.data)
+            self._flush()
+
+    def _accept(self):
+        try:
+            sock, _ = self._server.accept()
+        except OSError:
+            return
+        sock.setblocking(False)
+        self._next_id += 1
+        client_id = self._next_id
+        self._clients[client_id] = _Client(sock)
+        self._sel.register(sock, selectors.EVENT_READ, client_id)
+
+    def _drop(self, client_id):
+        client = self._clients.pop(client_id, None)
+        if client is not None:
+            self._sel.unregister(client.sock)
+            client.sock.close()
+
+    def _read(self, client_id):
+        client = self._clients.get(client_id)
+        if client is None:
+            return
+        try:
+            data = client.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client_id)
+            return
+
+        client.inbuf += data
+        *lines, client.inbuf = client.inbuf.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                msg = json.loads(line)
+            except ValueError: # 坏 JSON 或非 UTF-8 字节
+                continue
+            if not isinstance(msg, dict):
+                continue # 协议只接受 JSON 对象：数字、数组等一律丢弃，不交给引擎
+            if msg.get("type") == "subscribe":
+                # 订阅频率由 I/O 线程直接处理，不打扰引擎；非法频率直接忽略，I/O 线程不能因此退出
+                try:
+                    rate_hz = float(msg.get("rate_hz", self.telemetry_hz))
+                except (TypeError, ValueError):
+                    continue
+                if math.isfinite(rate_hz) and rate_hz >= 0:
+                    self.telemetry_hz = rate_hz
+                continue
+            self._inbox.put((client_id, msg))
+
+    def _flush(self):
+        while True:
+            try:
+                client_id, payload = self._outbox.get_nowait()
+            except queue.Empty:
+                break
+            targets = self._clients.values() if client_id is None else [self._clients.get(client_id)]
+            for client in targets:
+                if client is None:
+                    continue
+                # 广播（遥测）在慢消费者处直接丢弃；点对点（ack）必须送达
+                if client_id is None and len(client.outbuf) > MAX_OUTBUF:
+                    continue
+                client.outbuf += payload
+
+        for client_id, client in list(self._clients.items()):
+            if not client.outbuf:
+                continue
+            try:
+                sent = client.sock.send(client.outbuf)
+                del client.outbuf[:sent]
+            except (BlockingIOError, InterruptedError):
+                pass
+            except OSError:
+                self._drop(client_id)
+
+
+class BusClient:
+    """
+    仪表盘侧的客户端：后台线程持续接收，保存最新一帧遥测与所有 ack。
+    """
+
+    def __init__(self, address=None, timeout=0.5):
+        self.address = address or default_address()
+        family, addr = parse_address(self.address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(addr) # 引擎未运行时抛出 OSError，由调用者决定是否退回文件模式
+        self.sock.settimeout(None)
+
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._acks = {}
+        self._ack_cond = threading.Condition()
+        self.telemetry = None # 最新一帧遥测
+        self.telemetry_history = deque(maxlen=600)
+        self.connected = True
+
+        self._thread = threading.Thread(target=self._run, name="bus-client", daemon=True)
+        self._thread.start()
+
+    def _send(self, msg):
+        with self._lock:
+            self.sock.sendall(encode(msg))
+
+    def subscribe(self, rate_hz):
+        self._send({"type": "subscribe", "rate_hz": rate_hz})
+
+    def set_params(self, params, wait=0.5):
+        """
+        下发参数；wait > 0 时阻塞等待引擎回执，返回 ack/nack 消息（超时返回 None）。
+        """
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        self._send({"type": "set", "seq": seq, "params": params})
+        if wait <= 0:
+            return None
+        with self._ack_cond:
+            self._ack_cond.wait_for(lambda: seq in self._acks or not self.connected, timeout=wait)
+            return self._acks.pop(seq, None)
+
+    def send(self, msg):
+        self._send(msg)
+
+    def _run(self):
+        buf = b""
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            buf += data
+            *lines, buf = buf.split(b"\n")
+            for line in lines:
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(msg, dict):
+                    continue
+                kind = msg.get("type")
+                if kind == "telemetry":
+                    self.telemetry = msg
+                    self.telemetry_history.append(msg)
+                elif kind in ("ack", "nack"):
+                    with self._ack_cond:
+                        self._acks[msg.get("seq")] = msg
+                        self._ack_cond.notify_all()
+        self.connected = False
+        with self._ack_cond:
+            self._ack_cond.notify_all()
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
@@ -0,0 +1,184 @@
+"""
+--- config_service.py v1.0 ---
+目的：
+替代主循环里“每一帧都 os.path.exists + open + json.load 一次 config.json”的做法。
+
+功能：
+1. 变更检测：只有当文件的 (mtime, inode, size) 指纹发生变化时才重新解析 JSON；
+   指纹本身也最多每 min_interval 秒 stat 一次，主循环里的 poll() 绝大多数时候是零系统调用。
+2. Schema 校验：每个已知参数都有类型与取值范围，任何一项不合法（或文件是半截的坏 JSON），
+   整份文件都被拒收，继续沿用上一份合法快照，并在 last_error 中留下原因，而不是用裸 except 吞掉。
+3. 不可变快照：校验通过后发布一个只读的 ConfigSnapshot(version, params)，
+   PhysicsBrain 与 GalinstanTracker 在各自的 tick 边界上一次性换入，不会读到“一半新一半旧”的参数。
+4. 推送通道：push() 接受来自消息总线的参数修改，与文件来源走同一套校验与快照发布流程。
+5. 原子写入：write_config_atomic() 先写临时文件再 os.replace()，读者永远看不到被截断的文件。
+"""
+
+import json
+import os
+import tempfile
+import time
+from collections import namedtuple
+from collections.abc import Mapping
+from types import MappingProxyType
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
+
+# 参数登记表：键 -> (类型, 下限, 上限, 出厂默认值)
+# 字符串类型的键写作 (str, 可选值元组, None, 出厂默认值)
+# 未登记的键原样透传（供后续模块扩展），但不参与数值校验
+CONFIG_SCHEMA = {
+    "Kp": (float, 0.0, 10.0, 0.4),
+    "Ki": (float, 0.0, 5.0, 0.01),
+    "Kd": (float, 0.0, 5.0, 0.1),
+    "TARGET_X": (float, 0.0, 4096.0, 320.0), # 始终为像素；引擎加载标定时自行换算为毫米
+    "Critical_V": (float, 0.0, 10.0, 1.2),
+    "vis_thresh_C": (int, 0, 100, 6),
+    "vis_kernel_size": (int, 0, 31, 7),
+    "vis_min_area": (int, 0, 1000000, 300),
+    "vis_search_window": (int, 0, 1, 1),
+    "vis_detect_scale": (float, 0.25, 1.0, 1.0),
+    "vis_subpixel": (int, 0, 1, 1),
+    "vis_hybrid": (int, 0, 1, 0),
+    "bg_learning_rate": (float, 0.0, 1.0, 0.02),
+    "tracker_backend": (str, ("csrt", "kcf", "mosse", "classical", "background"), None, "csrt"),
+}
+
+# 不可变参数快照：version 每发布一次新快照加 1，params 为只读映射
+ConfigSnapshot = namedtuple("ConfigSnapshot", ["version", "params"])
+
+
+class ConfigError(ValueError):
+    """配置文件内容不符合 Schema"""
+
+
+def default_params(schema=CONFIG_SCHEMA):
+    return {key: spec[3] for key, spec in schema.items()}
+
+
+def validate_config(raw, schema=CONFIG_SCHEMA):
+    """
+    按 Schema 校验并规整一份原始配置字典，返回新的 dict。
+    缺失的已知键以默认值补齐；任何一项类型或范围不合法都抛出 ConfigError。
+    """
+    if not isinstance(raw, dict):
+        raise ConfigError("配置文件顶层必须是 JSON 对象")
+
+    params = default_params(schema)
+    for key, value in raw.items():
+        if key not in schema:
+            params[key] = value
+            continue
+        kind, lo, hi, _ = schema[key]
+        if kind is str:
+            if value not in lo:
+                raise ConfigError(f"{key}={value!r} 不在可选值 {lo} 中")
+            params[key] = value
+            continue
+        # bool 是 int 的子类，必须单独排除
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ConfigError(f"{key}={value!r} 不是数值")
+        if kind is int and value != int(value):
+            raise ConfigError(f"{key}={value!r} 必须为整数")
+        value = kind(value)
+        if not (lo <= value <= hi):
+            raise ConfigError(f"{key}={value} 超出范围 [{lo}, {hi}]")
+        params[key] = value
+    return params
+
+
+def write_config_atomic(path, data, retries=5):
+    """
+    原子写入：同目录下写临时文件 -> fsync -> os.replace。
+    Windows 上若目标文件恰好被读者占用，os.replace 会抛 PermissionError，短暂退避后重试。
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(retries):
+            try:
+                os.replace(tmp_path, path)
+                return
+            except PermissionError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(0.01)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ConfigService:
+    def __init__(self, path=CONFIG_PATH, schema=CONFIG_SCHEMA, min_interval=0.1):
+        self.path = path
+        self.schema = schema
+        self.min_interval = min_interval # 两次 stat 之间的最短间隔 (秒)
+
+        self._fingerprint = None
+        self._last_check = -float("inf")
+        self._snapshot = ConfigSnapshot(0, MappingProxyType(default_params(schema)))
+
+        self.last_error = None # 最近一次被拒收的原因（None 表示最近一次读取成功）
+        self.rejections = 0    # 累计被拒收的次数
+        self.reloads = 0
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+    def poll(self, force=False):
+        """
+        检查文件是否变化，变化且校验通过则发布新快照。
+        返回 True 表示本次调用发布了新快照，调用者应在 tick 边界上换入。
+        """
+        now = time.perf_counter()
+        if not force and now - self._last_check < self.min_interval:
+            return False
+        self._last_check = now
+
+        fingerprint = self._stat()
+        if fingerprint is None or fingerprint == self._fingerprint:
+            return False
+        self._fingerprint = fingerprint
+
+        try:
+            with open(self.path, "r") as f:
+                raw = json.load(f)
+            params = validate_config(raw, self.schema)
+        except (OSError, json.JSONDecodeError, ConfigError) as e:
+            # 拒收整份文件，沿用上一份合法快照
+            self.last_error = f"{type(e).__name__}: {e}"
+            self.rejections += 1
+            return False
+
+        self.last_error = None
+        self.reloads += 1
+        return self._publish(params)
+
+    def push(self, changes):
+        """
+        直接推送一组参数修改（例如来自消息总线），与当前快照合并、校验后立即发布。
+        不合法时抛出 ConfigError，当前快照保持不变。返回是否发布了新快照。
+        """
+        if not isinstance(changes, Mapping):
+            raise ConfigError("参数修改必须是 JSON 对象")
+        params = validate_config(dict(self._snapshot.params, **changes), self.schema)
+        return self._publish(params)
+
+    def _publish(self, params):
+        if dict(self._snapshot.params) == params:
+            return False
+        self._snapshot = ConfigSnapshot(self._snapshot.version + 1, MappingProxyType(params))
+        return True
@@ -0,0 +1,161 @@
+"""
+--- metrics.py v1.0 ---
+目的：
+回答“到底是哪个阶段吃掉了 33ms 的帧预算”。
+每个 tick 把 采集 / 追踪 / 控制律 / 指令编码 / 串口写入 / 渲染 各阶段的耗时记入直方图，
+运行时可通过画面叠加层、消息总线遥测、Prometheus 文本文件随时查看，停机时打印 p50/p90/p99/max 汇总。
+
+功能：
+1. HDR 风格直方图：对数-线性分桶（每个 2 的幂区间再等分 2^(sub_bits-1) 份），
+   1µs ~ 60s 的量程只需几百个 int64 计数器，相对误差约 2^-(sub_bits-1)，内存固定，记录一次是 O(1)。
+2. 单写者：每个阶段只在一个线程中记录，读者（导出线程 / 遥测）读到的至多是“少一两次记录”的数据，无需加锁。
+3. 导出：prometheus_text() 生成 Prometheus 文本格式（summary 类型），MetricsExporter 定期原子重写到文件，
+   可直接交给 node_exporter 的 textfile collector 采集。
+"""
+
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+# 控制回路的标准阶段（按数据流顺序）
+STAGES = ("capture", "track", "control", "encode", "serial", "render")
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencyHistogram:
+    def __init__(self, lowest_us=1, highest_us=60_000_000, sub_bits=5):
+        # 内部以整数微秒计数；lowest_us 以下的值都落在第一个桶
+        self.unit = 1e-6 * lowest_us
+        self.sub_bits = sub_bits
+        self.sub_count = 1 << sub_bits
+        self.half = self.sub_count >> 1
+        self.highest = int(highest_us // lowest_us)
+        self.counts = np.zeros(self._index(self.highest) + 1, dtype=np.int64)
+        self.total = 0
+        self.max_value = 0
+
+    def _index(self, v):
+        if v < self.sub_count:
+            return v
+        shift = v.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half + ((v >> shift) - self.half)
+
+    def _value(self, idx):
+        """桶的代表值（区间中点），单位与内部计数一致"""
+        if idx < self.sub_count:
+            return float(idx)
+        shift = (idx - self.sub_count) // self.half + 1
+        low = ((idx - self.sub_count) % self.half + self.half) << shift
+        return low + ((1 << shift) - 1) / 2.0
+
+    def record(self, seconds):
+        v = min(max(int(seconds / self.unit), 0), self.highest)
+        self.counts[self._index(v)] += 1
+        self.total += 1
+        if v > self.max_value:
+            self.max_value = v
+
+    def percentile(self, q):
+        """q ∈ [0, 1]，返回秒；没有样本时返回 0"""
+        if self.total == 0:
+            return 0.0
+        rank = max(int(np.ceil(q * self.total)), 1)
+        idx = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._value(idx), self.max_value) * self.unit
+
+    def summary(self):
+        """返回毫秒单位的统计字典"""
+        out = {"count": self.total}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}_ms"] = self.percentile(q) * 1000
+        out["max_ms"] = self.max_value * self.unit * 1000
+        return out
+
+    def reset(self):
+        self.counts[:] = 0
+        self.total = 0
+        self.max_value = 0
+
+
+class LatencyRecorder:
+    def __init__(self, stages=STAGES):
+        self.histograms = {name: LatencyHistogram() for name in stages}
+
+    def record(self, stage, seconds):
+        hist = self.histograms.get(stage)
+        if hist is None:
+            # 未登记的阶段在第一次记录时创建（该阶段的单写者线程负责）
+            hist = self.histograms[stage] = LatencyHistogram()
+        hist.record(seconds)
+
+    def summary(self):
+        return {name: hist.summary() for name, hist in list(self.histograms.items())}
+
+    def format_overlay(self):
+        """叠加层用的单行简报：各阶段 p99（毫秒）"""
+        return " ".join(f"{name[:3]}:{hist.percentile(0.99) * 1000:.1f}"
+                        for name, hist in list(self.histograms.items()) if hist.total)
+
+    def format_summary(self):
+        lines = [f"   {'stage':<8}{'count':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)"]
+        for name, s in self.summary().items():
+            if s["count"]:
+                lines.append(f"   {name:<8}{s['count']:>8}{s['p50_ms']:>9.2f}{s['p90_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+    def prometheus_text(self, prefix="galinstan_stage_latency_seconds"):
+        lines = [f"# HELP {prefix} Per-stage control loop latency.", f"# TYPE {prefix} summary"]
+        for name, hist in list(self.histograms.items()):
+            for q in QUANTILES:
+                lines.append(f'{prefix}{{stage="{name}",quantile="{q}"}} {hist.percentile(q):.9f}')
+            lines.append(f'{prefix}_max{{stage="{name}"}} {hist.max_value * hist.unit:.9f}')
+            lines.append(f'{prefix}_count{{stage="{name}"}} {hist.total}')
+        return "\n".join(lines) + "\n"
+
+
+def write_text_atomic(path, text):
+    """先写临时文件再 os.replace，采集端永远读不到写了一半的文件"""
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".metrics.", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class MetricsExporter:
+    """后台线程：每 interval 秒把 Prometheus 文本重写一次"""
+
+    def __init__(self, recorder, path, interval=1.0):
+        self.recorder = recorder
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            write_text_atomic(self.path, self.recorder.prometheus_text())
+        except OSError as e:
+            print(f"\n⚠️ 指标文件写入失败: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.export() # 停机时再写一次，保留最终数据
@@ -0,0 +1,200 @@
+"""
+--- pipeline.py v1.0 ---
+目的：
+把 Sense-Think-Act 从“单线程串行”改造为“流水线并行”。
+每个阶段（追踪 / 演算 / 执行 ...）各自运行在独立的工作线程中，阶段之间用“有界、丢旧”的队列连接：
+下游来不及消化时，直接丢弃最旧的消息，永远只处理最新的状态，绝不积压。
+这样第 N 帧的追踪与第 N-1 帧的执行可以同时进行，整条回路的吞吐率由最慢的那一级决定，而不是所有阶段耗时之和。
+
+数据契约：
+阶段之间传递的是 Message(frame_id, timestamp, payload)，frame_id 与 timestamp 从采集源一路透传，
+任何阶段都能知道自己手上的数据是哪一帧、何时曝光的。
+阶段函数签名为 func(message) -> payload，返回 None 表示本条消息到此为止，不再向下游传递。
+
+使用方式：
+    engine = PipelineEngine()
+    engine.set_source(lambda timeout: ...)     # 返回 Message 或 None
+    engine.add_stage("track", track_fn)
+    engine.add_stage("think", think_fn)
+    render_q = engine.add_tap("think")         # 旁路：把 think 的输出复制一份给渲染
+    engine.start(); ...; engine.stop()
+    engine.stats()                              # 各阶段占用率与丢弃计数
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+# 流水线消息：frame_id 单调递增，timestamp 为 time.perf_counter() 时钟下的采集时刻（秒）
+Message = namedtuple("Message", ["frame_id", "timestamp", "payload"])
+
+
+class DropOldestQueue:
+    """有界队列：满了以后再 put，就挤掉最旧的一条，并计入 dropped。"""
+
+    def __init__(self, maxsize=1):
+        self.maxsize = maxsize
+        self._items = deque()
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """取出最旧的一条，超时返回 None"""
+        with self._cond:
+            if not self._items:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def get_latest(self):
+        """非阻塞：清空队列，只返回最新的一条（没有则返回 None）"""
+        with self._cond:
+            if not self._items:
+                return None
+            item = self._items.pop()
+            self._items.clear()
+            return item
+
+    def wake(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class Stage:
+    def __init__(self, name, func, maxsize=1):
+        self.name = name
+        self.func = func
+        self.inbox = DropOldestQueue(maxsize)
+        self.outputs = [] # 下游阶段的 inbox 以及旁路 tap
+
+        # 统计寄存器
+        self.processed = 0
+        self.errors = 0
+        self.busy_time = 0.0 # 累计在 func 内的耗时（秒）
+        self.last_error = None
+
+    def handle(self, msg):
+        t0 = time.perf_counter()
+        try:
+            payload = self.func(msg)
+        except Exception as e:
+            # 单帧异常不允许拖垮整条流水线
+            self.errors += 1
+            self.last_error = repr(e)
+            payload = None
+        self.busy_time += time.perf_counter() - t0
+        self.processed += 1
+
+        if payload is None:
+            return
+        out = Message(msg.frame_id, msg.timestamp, payload)
+        for q in self.outputs:
+            q.put(out)
+
+
+class PipelineEngine:
+    def __init__(self, poll_timeout=0.05):
+        self.poll_timeout = poll_timeout
+        self.stages = []
+        self._source = None
+        self._threads = []
+        self._running = False
+        self._start_time = None
+        self.source_count = 0
+
+    def set_source(self, source):
+        """source(timeout) -> Message 或 None，在独立线程中被反复调用"""
+        self._source = source
+
+    def add_stage(self, name, func, maxsize=1):
+        stage = Stage(name, func, maxsize)
+        if self.stages:
+            self.stages[-1].outputs.append(stage.inbox)
+        self.stages.append(stage)
+        return stage
+
+    def add_tap(self, stage_name, maxsize=1):
+        """在某一阶段的输出上挂一条旁路队列（例如给主线程渲染用）"""
+        q = DropOldestQueue(maxsize)
+        self.get_stage(stage_name).outputs.append(q)
+        return q
+
+    def get_stage(self, name):
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._start_time = time.perf_counter()
+        if self._source is not None:
+            self._threads.append(threading.Thread(target=self._run_source, name="pipeline-source", daemon=True))
+        for stage in self.stages:
+            self._threads.append(threading.Thread(target=self._run_stage, args=(stage,), name=f"pipeline-{stage.name}", daemon=True))
+        for t in self._threads:
+            t.start()
+        return self
+
+    def _run_source(self):
+        first = self.stages[0].inbox
+        while self._running:
+            msg = self._source(self.poll_timeout)
+            if msg is None:
+                continue
+            self.source_count += 1
+            first.put(msg)
+
+    def _run_stage(self, stage):
+        while self._running:
+            msg = stage.inbox.get(timeout=self.poll_timeout)
+            if msg is None:
+                continue
+            stage.handle(msg)
+
+    def stop(self):
+        self._running = False
+        for stage in self.stages:
+            stage.inbox.wake()
+        for t in self._threads:
+            t.join(timeout=1.0)
+        self._threads = []
+
+    def stats(self):
+        """
+        返回 {stage_name: {...}}：
+        occupancy 为该阶段工作线程处于忙碌状态的时间占比 (0~1)，最接近 1 的阶段就是瓶颈；
+        queued 为当前排队消息数，dropped 为因下游来不及消化而被挤掉的消息数。
+        """
+        elapsed = max(time.perf_counter() - (self._start_time or time.perf_counter()), 1e-9)
+        report = {}
+        for stage in self.stages:
+            report[stage.name] = {
+                "occupancy": stage.busy_time / elapsed,
+                "queued": len(stage.inbox),
+                "dropped": stage.inbox.dropped,
+                "processed": stage.processed,
+                "errors": stage.errors,
+                "avg_ms": stage.busy_time / stage.processed * 1000 if stage.processed else 0.0,
+            }
+        return report
+
+    def format_stats(self):
+        return " | ".join(
+            f"{name}:{s['occupancy'] * 100:>3.0f}% q{s['queued']} drop{s['dropped']}"
+            for name, s in self.stats().items()
+        )
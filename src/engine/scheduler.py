@@ -0,0 +1,126 @@
+"""
+--- scheduler.py v1.0 ---
+目的：
+让控制节拍脱离“帧什么时候到、imshow/waitKey/串口 flush 什么时候返回”的偶然性，
+以固定频率（例如 30/60/100 Hz）触发控制 tick，并把真实流逝的时间 dt 交给 PhysicsBrain.think()。
+
+功能：
+1. 绝对时刻排程：第 k 个 tick 的期限为 t0 + k * period，误差不会随 tick 累积漂移。
+2. 混合等待：先 sleep 到期限前 spin_threshold 秒，再忙等到期限，兼顾 CPU 占用与唤醒精度。
+3. 期限记账：tick 唤醒时刻相对期限的迟到量 (lateness) 写入定长环形数组；
+   若迟到超过整整一个周期，则记为错过期限 (missed)，并直接跳到下一个未来期限，不做“补课式”连发。
+4. 抖动统计：stats() 随时返回 p50/p99/max 迟到量，write_stats() 在停机时落盘。
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class FixedRateScheduler:
+    def __init__(self, rate_hz, spin_threshold=0.001, history=4096):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz 必须为正数")
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.spin_threshold = spin_threshold
+
+        # 迟到量环形缓冲区（秒），固定内存，不随运行时长增长
+        self._lateness = np.zeros(history, dtype=np.float64)
+        self._cursor = 0
+
+        self.ticks = 0
+        self.missed = 0
+        self.max_lateness = 0.0
+
+        self._running = False
+        self._thread = None
+
+    # --- 记账 ---
+    def _record(self, lateness):
+        self._lateness[self._cursor % len(self._lateness)] = lateness
+        self._cursor += 1
+        self.ticks += 1
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+
+    def stats(self):
+        """返回迟到量统计（毫秒）与错过期限计数，可在运行时随时调用"""
+        n = min(self._cursor, len(self._lateness))
+        window = self._lateness[:n]
+        if n:
+            p50, p99 = np.percentile(window, [50, 99])
+        else:
+            p50 = p99 = 0.0
+        return {
+            "rate_hz": self.rate_hz,
+            "ticks": self.ticks,
+            "missed": self.missed,
+            "lateness_p50_ms": float(p50) * 1000,
+            "lateness_p99_ms": float(p99) * 1000,
+            "lateness_max_ms": self.max_lateness * 1000,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return (f"{s['rate_hz']:.0f}Hz miss:{s['missed']} "
+                f"p50:{s['lateness_p50_ms']:.2f} p99:{s['lateness_p99_ms']:.2f} max:{s['lateness_max_ms']:.2f}ms")
+
+    def write_stats(self, path):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.stats(), f, indent=4)
+
+    # --- 排程 ---
+    def _sleep_until(self, deadline):
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin_threshold:
+            time.sleep(remaining - self.spin_threshold)
+        while time.perf_counter() < deadline:
+            time.sleep(0) # 忙等期间主动让出 GIL，避免饿死追踪线程
+
+    def run(self, tick_fn, should_stop=lambda: False):
+        """
+        在当前线程中按固定频率调用 tick_fn(dt)，dt 为距上一次 tick 真实流逝的时间（秒）。
+        tick_fn 返回 False 或 should_stop() 为真时退出。
+        """
+        t0 = time.perf_counter()
+        last = t0
+        k = 1
+        while not should_stop():
+            deadline = t0 + k * self.period
+            self._sleep_until(deadline)
+            now = time.perf_counter()
+
+            lateness = now - deadline
+            self._record(lateness)
+            if lateness >= self.period:
+                # 错过了整数个期限：计数并跳过，保持相位对齐
+                skipped = int(lateness // self.period)
+                self.missed += skipped
+                k += skipped
+
+            dt = now - last
+            last = now
+            k += 1
+
+            if tick_fn(dt) is False or should_stop():
+                break
+
+    def start(self, tick_fn):
+        """在后台线程中运行 run()，用 stop() 结束"""
+        self._running = True
+        self._thread = threading.Thread(target=self.run, args=(tick_fn, lambda: not self._running),
+                                        name="fixed-rate-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
@@ -21,13 +21,28 @@ import cv2 # OpenCV 库用于处理视频流和图像数据，提供了丰富的
 import time # time 库用于在主循环中计算时间差（dt），以便 PhysicsBrain 模块能够根据实际的时间步长进行物理演算，确保控制算法的稳定性和响应速度。
 import sys # sys 库用于修改 Python 的模块搜索路径，确保程序能够正确导入 src 目录下的模块，例如 vision.tracker、analysis.Brain、control.actuator 和 ui.dashboard。
 # 确保导入路径与你的项目结构一致
+from src.vision.reacquire import Reacquirer # Reacquirer 在失锁期间由后台线程做全局检测，找回液滴后重建追踪器。
 from src.vision.tracker import GalinstanTracker # GalinstanTracker 模块是视觉处理的核心，负责从视频帧中检测和追踪液态金属球的位置，为后续的物理演算提供输入数据。
+from src.analysis.estimator import create_estimator # create_estimator 构造卡尔曼 / α-β-γ 状态估计器，融合测量并做延迟补偿外推。
+from src.vision.calibration import Calibration # Calibration 用预先算好的查找表把追踪点从像素换算成培养皿平面上的毫米。
 from src.analysis.Brain import PhysicsBrain # PhysicsBrain 模块是物理演算的核心，负责根据视觉输入和 PID 控制算法计算出理想的控制电压，为硬件控制器提供指导。
 from src.control.actuator import HardwareController, SerialTransmitter # HardwareController 模块负责将理想控制电压转换为适合 Arduino 接收的串口指令格式，SerialTransmitter 模块负责与 Arduino 建立串口通信，发送控制指令以驱动硬件执行相应的动作。
 from src.drivers.camera_check import get_available_cameras # get_available_cameras 函数用于检测系统中可用的摄像头设备，帮助程序在启动时选择正确的摄像头进行视频捕捉，避免因摄像头连接问题导致的程序崩溃。
+from src.drivers.camera import open_camera # open_camera 并行探测设备、协商分辨率 / 帧率 / 像素格式，并缓存设备档案。
+from src.drivers.frame_grabber import LatestFrameGrabber # LatestFrameGrabber 在独立线程中持续采集，只保留最新一帧（单槽缓冲区），主循环不再被 cap.read() 阻塞。
+from src.engine.pipeline import PipelineEngine, Message # PipelineEngine 把各阶段拆成独立线程，以有界丢旧队列串联，实现追踪与执行的重叠。
+from src.engine.scheduler import FixedRateScheduler # FixedRateScheduler 以固定频率触发控制 tick，统计期限错过次数与抖动。
+from src.engine.config_service import ConfigService, ConfigError, CONFIG_PATH # ConfigService 只在 config.json 真正变化时才重新解析，并发布经过校验的只读参数快照。
+from src.ui.preview import PreviewRenderer # PreviewRenderer 在独立线程中以低频率渲染预览窗口，控制回路只提交画面引用。
+from src.ui.console import StdinKeyReader # StdinKeyReader 在无窗口模式下从标准输入读取 q / t / s 指令。
+from src.engine.metrics import LatencyRecorder, MetricsExporter # LatencyRecorder 以 HDR 风格直方图记录各阶段耗时，MetricsExporter 定期导出 Prometheus 文本。
+from src.engine.bus import EngineBus # EngineBus 是本地消息总线（Unix 域套接字 / 回环 TCP），参数下发即时生效，遥测回流仪表盘。
 import datetime # datetime 库用于生成时间戳，帮助程序在录制视频时创建唯一的文件夹和文件名，确保每次录制的数据都能被正确保存和区分。
 import os # os 库用于处理文件和目录操作，例如创建保存视频的文件夹、构建视频文件的路径等，确保程序能够正确地管理录制的数据资产。
-import json
+import json # json 库用于在停机时落盘各阶段耗时汇总。
+import queue # queue 库提供线程安全的队列，用于主线程向流水线工作线程投递指令（例如切换目标）。
+from types import SimpleNamespace # SimpleNamespace 用作引擎上下文容器，把各模块句柄打包传给不同的运行模式。
+import argparse # argparse 库用于解析命令行参数，例如选择串行 / 流水线 / 定频运行模式。
 
 # --- 静态配置参数 ---
 TARGET_X = 320.0        # 目标 X 坐标 (假设图像宽度 640)
@@ -35,6 +50,10 @@ FPS = 30                # 设定频率
 COM_PORT = 'COM5'       # 实际串口，根据Arduino IDE中显示的端口号进行修改
 MAX_V = 5.0             # 逻辑上限电压
 TARGET_X = 320.0 
+FRAME_SIZE = (640, 480) # 处理分辨率 (w, h)
+FRAME_WAIT_TIMEOUT = 0.05 # 等待新帧的超时时间 (秒)，超时后仍会刷新 UI 事件
+STATUS_HZ = 10          # 终端状态栏刷新频率上限 (Hz)
+TOGGLE_TARGETS = (150.0, 450.0) # [t] 键在两个目标之间切换；加载标定后换算为毫米
 
 
 # --- 配置录制参数 ---
@@ -44,15 +63,6 @@ recording_active = False # recording_active 变量用于控制录制状态的开
 frame_counter = 0 # frame_counter 变量用于计数当前已经录制的帧数，每当 recording_active 为 True 时，程序会在主循环中将 frame_counter 加 1，并检查是否达到了 record_frames_limit，如果达到了限制，程序会自动停止录制并保存视频文件。这个变量帮助程序控制录制的时长，确保不会因为过多的帧数导致存储空间不足或处理性能下降。
 video_writers = [] # video_writers 列表用于存储多个 cv2.VideoWriter 对象，每个对象对应一个视频文件的写入器。当用户开始录制时，程序会创建多个 VideoWriter 对象，并将它们添加到 video_writers 列表中；在主循环中，如果 recording_active 为 True，程序会使用这些 VideoWriter 对象将当前帧写入对应的视频文件中；当录制结束时，程序会关闭这些 VideoWriter 对象并清空 video_writers 列表。这个列表帮助程序管理多个视频文件的写入器，确保在录制过程中能够正确地保存每个视频流的数据。
 
-def load_config(): # 建议把这个函数也搬到 main.py 或建立共用工具类
-    if os.path.exists("config.json"):
-        try:
-            with open("config.json", 'r') as f:
-                return json.load(f)
-        except: pass
-    return None
-
-
 def start_recording(frame_shape): # 这个函数用于开始录制视频数据，接受一个参数 frame_shape，表示视频帧的尺寸（高度和宽度）。在函数内部，程序会生成一个基于当前时间戳的唯一文件夹路径，用于保存录制的视频文件；然后根据设定的 FPS 和帧尺寸创建多个 cv2.VideoWriter 对象，并将它们添加到 video_writers 列表中；最后将 recording_active 设置为 True，表示开始录制，并重置 frame_counter 以便计数新的录制帧数。
     global recording_active, frame_counter, video_writers, TARGET_X 
     # 通过 global 关键字声明这些变量为全局变量，确保在函数内部能够访问和修改它们的值。
@@ -79,121 +89,158 @@ def start_recording(frame_shape): # 这个函数用于开始录制视频数据
     frame_counter = 0 # 重置 frame_counter 以便计数新的录制帧数，确保在每次开始录制时都能正确地统计录制的帧数，并在达到 record_frames_limit 时自动停止录制。
     print(f"\n🔴 开始录制瞬态数据至: {folder}")
 
-def main():
+def main(argv=None, camera=None):
+    """
+    camera: 可选，已打开的 VideoCapture 同构对象（例如 SyntheticCamera）。给定时跳过设备探测，
+    配合 --port 指向串口模拟器，即可在没有任何硬件的情况下跑通完整闭环（见 tests/bench_closed_loop.py）。
+    """
     global recording_active, frame_counter, video_writers, TARGET_X 
+    args = parse_args(argv)
     
     # 1. 硬件初始化
     try:
-        transmitter = SerialTransmitter(port=COM_PORT, baudrate=115200)
+        transmitter = SerialTransmitter(port=args.port, baudrate=115200, reset_delay=args.reset_delay)
         actuator = HardwareController(max_voltage=MAX_V)
     except Exception as e:
         print(f"❌ 硬件初始化失败: {e}")
         return
 
     # 2. 逻辑引擎初始化
+    # 标定：给定时 PhysicsBrain 以毫米为单位工作，追踪与估计器仍在像素上进行。
+    # config.json / 仪表盘里的 TARGET_X 始终是像素，换入 brain 前换算为毫米（见 brain_params）；
+    # 增益不做换算，直接按毫米解释：Kp 为 V/mm、Ki 为 V/(mm·s)、Kd 为 V·s/mm
+    calibration = None
+    if args.calibration:
+        try:
+            calibration = Calibration.load(args.calibration)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"❌ 标定文件读取失败: {e}")
+            return
+        set_toggle_targets(calibration)
+        w, h = calibration.size
+        print(f"📐 已加载标定 {args.calibration} | 画面中心 1px = {calibration.scale_at(w / 2.0, h / 2.0) * 1000:.1f}µm，控制单位为 mm")
+
     tracker = GalinstanTracker(buffer_sec=2, fps=FPS) 
-    brain = PhysicsBrain(Kp=0.4, Ki=0.01, Kd=0.1, target_x=TARGET_X)
+    brain = PhysicsBrain(Kp=0.4, Ki=0.01, Kd=0.1, target_x=target_to_control(calibration, TARGET_X))
+
+    # 参数服务：启动时强制读取一次，之后只在文件变化时重新解析
+    config = ConfigService(args.config)
+    config.poll(force=True)
+    if config.last_error:
+        print(f"⚠️ config.json 不合法，使用出厂参数: {config.last_error}")
+    brain.apply_params(brain_params(calibration, config.snapshot.params))
+    tracker.apply_params(config.snapshot.params)
+    TARGET_X = brain.target_x
+
+    # 本地消息总线：仪表盘的参数修改直接推送到引擎，引擎遥测回流到仪表盘
+    bus = None
+    if not args.no_bus:
+        try:
+            bus = EngineBus(args.bus_address, telemetry_hz=args.telemetry_hz).start()
+            print(f"📡 消息总线已监听: {bus.address}")
+        except OSError as e:
+            print(f"⚠️ 消息总线启动失败，仅使用 config.json 轮询: {e}")
 
     # 3. 视觉流唤醒与安全断言
     print("正在尝试唤醒视觉传感器...")
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        cap = cv2.VideoCapture(1)
+    if camera is not None:
+        cap, profile = camera, None
+    else:
+        cap, profile = open_camera(size=FRAME_SIZE, fps=FPS, index=args.camera, use_cache=not args.reprobe)
 
-    if not cap.isOpened():
+    if cap is None:
         print("❌ 致命错误：视觉传感器唤醒失败！请检查物理连接或隐私设置。")
+        if bus is not None: bus.stop()
         if 'transmitter' in locals(): transmitter.close()
         return
     
+    if profile is not None:
+        print(f"📷 摄像头 #{profile.index}: {profile.width}x{profile.height} @ {profile.fps:.0f}FPS {profile.fourcc or '(默认格式)'}")
+        if (profile.width, profile.height) != FRAME_SIZE:
+            print(f"⚠️ 驱动不支持 {FRAME_SIZE[0]}x{FRAME_SIZE[1]}，将在采集线程内逐帧缩放")
+
     # 强行丢弃前 5 帧，规避曝光震荡
     for _ in range(5): cap.read()
+
+    # 启动采集线程：此后 cap.read() 只在采集线程中调用；只有协商失败时才会在采集线程内缩放
+    grabber = LatestFrameGrabber(cap, size=FRAME_SIZE).start()
+
+    # 引擎上下文：各运行模式共享的模块句柄
+    ctx = SimpleNamespace(
+        grabber=grabber, tracker=tracker, brain=brain, actuator=actuator, transmitter=transmitter,
+        config=config, bus=bus, calibration=calibration,
+        commands=queue.Queue(), # 其他线程 -> 控制线程的指令通道（例如切换目标），保证 brain 只在一个线程中被修改
+        keys=queue.Queue(),     # 窗口 / 标准输入 / 消息总线 -> 主线程的按键通道
+        loop_stats=lambda: {},  # 由各运行模式替换为自己的回路统计
+        display=args.display,
+        preview=None,
+        metrics=LatencyRecorder(), # 各阶段耗时直方图：capture / track / control / encode / serial / render
+        # 有状态估计器时由它负责丢帧期间的外推，Reacquirer 不再另行外推
+        estimator=create_estimator(args.estimator, max_dropout=args.max_dropout),
+        predict_lead=args.predict_lead / 1000.0, # 在“此刻”之外再向前预测的时间（执行器延迟），秒
+        reacquirer=None if args.no_reacquire else Reacquirer(
+            args.reacquire_confidence, 0 if args.estimator != "none" else args.coast_frames),
+        ticks=0,                   # 已下发的控制指令数
+        max_ticks=args.max_ticks,  # 达到后自动请求退出（0 表示不限）
+    )
+    exporter = MetricsExporter(ctx.metrics, args.metrics_file, args.metrics_interval).start() if args.metrics_file else None
         
     # =====================================================
     # 🔴 强制挂起：视网膜物理特征注入 (CSRT Calibration)
     # =====================================================
-    ret, first_frame = cap.read()
-    if not ret:
-        print("❌ 无法截取标定帧，视觉引擎启动失败。")
+    # --roi 给定时直接注入目标框；--acquire auto（默认）在开机的几帧里自动捕获液滴，
+    # 置信度不足时退回框选窗口（headless 模式下直接放弃）；--acquire manual 总是弹出框选窗口
+    roi = tuple(int(v) for v in args.roi.split(",")) if args.roi else None
+    packet = grabber.wait(timeout=2.0)
+    locked = False
+    if packet is None:
+        pass
+    elif roi is not None:
+        locked = tracker.calibrate(packet.frame, bbox=roi)
+    elif args.acquire == "auto":
+        packets = [packet]
+        while len(packets) < args.acquire_frames:
+            nxt = grabber.wait(last_id=packets[-1].frame_id, timeout=1.0)
+            if nxt is None:
+                break
+            packets.append(nxt)
+        packet = packets[-1]
+        locked, _ = tracker.auto_calibrate([p.frame for p in packets], args.min_confidence,
+                                           manual_fallback=args.display != "headless")
+    elif args.display == "headless":
+        print("❌ headless 模式下无法弹出框选窗口，请用 --roi x,y,w,h 指定初始目标框或使用 --acquire auto。")
+    else:
+        locked = tracker.calibrate(packet.frame)
+    if not locked:
+        print("❌ 无法截取标定帧或未捕获物理目标，系统安全退出。")
+        if exporter is not None: exporter.stop()
+        grabber.stop()
+        cap.release()
+        if bus is not None: bus.stop()
         if 'transmitter' in locals(): transmitter.close()
         return
+    # =====================================================
 
-    # 若后续需要 resize，此处必须同步 resize
-    first_frame = cv2.resize(first_frame, (640, 480)) 
+    if ctx.reacquirer is not None:
+        ctx.reacquirer.start()
 
-    # 弹出框选窗口，不框选确认绝不放行
-    if not tracker.calibrate(first_frame):
-        print("❌ 未捕获物理目标，系统安全退出。")
-        if 'transmitter' in locals(): transmitter.close()
-        return
-    # =====================================================
+    print(f"\n🚀 引擎已就绪 | 模式: {args.mode} | 显示: {args.display} | 目标 X: {TARGET_X} | [q] 退出 | [t] 切换目标")
 
-    print(f"\n🚀 引擎已就绪 | 目标 X: {TARGET_X} | [q] 退出 | [t] 切换目标")
-    
-    last_time = time.perf_counter() 
+    # 按键来源：window 模式由主线程 waitKey 读取；preview 模式由预览线程读取；headless 模式读标准输入
+    if args.display == "preview":
+        ctx.preview = PreviewRenderer(draw_preview, rate_hz=args.preview_hz, on_key=ctx.keys.put,
+                                      record=lambda sec: ctx.metrics.record("render", sec)).start()
+    elif args.display == "headless":
+        print("⌨️ headless 模式：在终端输入 q / t / s 并回车，或通过消息总线发送 {\"type\": \"key\", \"key\": \"t\"}")
+        StdinKeyReader(on_key=ctx.keys.put).start()
     
     try:
-        while True:
-            ret, frame = cap.read()
-            if not ret: continue
-            
-            frame = cv2.resize(frame, (640, 480))
-
-            current_time = time.perf_counter()
-            dt = current_time - last_time
-            last_time = current_time
-
-            # --- Sense ---
-            pos = tracker.process_frame(frame, debug=True) 
-            
-            # --- Think ---
-            if pos is not None:
-                curr_x = pos[0]
-                v_ideal = brain.think([curr_x, 0], dt=dt) 
-            else:
-                curr_x = 0.0
-                v_ideal = 0.0
-
-            # --- Act ---
-            cmd = actuator.generate_instruction(v_ideal)
-            transmitter.send_command(cmd)
-
-            # 防止底层串口积压
-            if transmitter.ser and transmitter.ser.in_waiting > 0:
-                transmitter.ser.reset_input_buffer()
-
-            # --- UI 与终端渲染层 ---
-            print(f"\r[Engine] Target:{TARGET_X:>5.1f} | Pos:{curr_x:>5.1f} | dt:{dt:.3f}s | Out: {v_ideal:>5.2f}V   ", end="", flush=True)
-
-            # 绘制控制底座防白背景干扰
-            cv2.rectangle(frame, (5, 5), (260, 45), (0, 0, 0), -1)
-            cv2.putText(frame, f"V_out: {v_ideal:.2f}V", (15, 32), 
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-            cv2.line(frame, (int(TARGET_X), 0), (int(TARGET_X), 480), (0, 255, 0), 2)
-            
-            # 视觉引擎已经自带绘制了液滴锁定框，这里直接 imshow
-            cv2.imshow("Galinstan Controller Console", frame)
-
-            # --- 物理参数热更新 (仅保留动力学参数) ---
-            cfg = load_config()
-            if cfg:
-                brain.Kp = cfg.get("Kp", 0.4)
-                brain.Ki = cfg.get("Ki", 0.01)
-                brain.Kd = cfg.get("Kd", 0.1)
-                brain.voltage_threshold = cfg.get("Critical_V", 1.2)
-
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'): break
-            elif key == ord('t'):
-                TARGET_X = 450.0 if TARGET_X == 150.0 else 150.0
-                brain.update_target(TARGET_X)
-                
-            # ⚠️ 录制逻辑说明：由于视觉追踪引擎换成了 CSRT，
-            # 这里砍掉了原来试图提取 mask 和 preprocessed 多路流的录制逻辑。
-            # 现在的引擎追求极致速度，如果你仍需录制，只需保存这一路 frame 即可。
-            if key == ord('s') and not recording_active:
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-                cv2.imwrite(f"data/snap_{timestamp}.jpg", frame)
-                print(f"\n📸 快照已保存: data/snap_{timestamp}.jpg")
+        if args.mode == "pipeline":
+            run_pipeline(ctx, packet)
+        elif args.mode == "fixed":
+            run_fixed_rate(ctx, packet, args.rate)
+        else:
+            run_sequential(ctx, packet)
 
     except KeyboardInterrupt:
         print("\n检测到用户中断...")
@@ -203,10 +250,543 @@ def main():
         if 'transmitter' in locals() and 'actuator' in locals():
             transmitter.send_command(actuator.generate_instruction(0.0))
             transmitter.close()
+        if bus is not None:
+            bus.stop()
+        if ctx.preview is not None:
+            ctx.preview.stop()
+        if exporter is not None:
+            exporter.stop()
+        if ctx.reacquirer is not None:
+            ctx.reacquirer.stop()
+            r = ctx.reacquirer.summary()
+            print(f"🔎 失锁 {r['episodes']} 次 | 后台找回 {r['reacquired']} | 自行恢复 {r['self_recovered']} | "
+                  f"找回耗时 p50 {r['time_to_reacquire_p50_ms']:.0f}ms / max {r['time_to_reacquire_max_ms']:.0f}ms")
+        write_latency_summary(ctx.metrics)
+        write_track_history(ctx.tracker.history)
+        grabber.stop()
         cap.release()
-        cv2.destroyAllWindows()
+        if args.display != "headless":
+            cv2.destroyAllWindows() # headless 构建的 OpenCV 不支持任何窗口函数
+
+
+def write_latency_summary(metrics):
+    """停机时打印并落盘各阶段 p50/p90/p99/max"""
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = f"data/latency_summary_{timestamp}.json"
+    os.makedirs("data", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(metrics.summary(), f, indent=4)
+    print(f"⏱️ 各阶段耗时汇总 -> {path}")
+    print(metrics.format_summary())
+
+
+def write_track_history(history):
+    """停机时把追踪历史（最近 buffer_sec 秒）按时间顺序落盘，供离线分析与状态估计器回放"""
+    if not len(history):
+        return
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = f"data/track_history_{timestamp}.npy"
+    os.makedirs("data", exist_ok=True)
+    history.save(path)
+    s = history.stats()
+    print(f"🧭 追踪历史 {s['n']} 帧 -> {path} | 锁定率 {s['lock_rate']:.1%} | 平均质心质量 {s['quality']:.2f}")
+
+
+def target_to_control(calibration, x):
+    """像素目标 x 在控制单位下的值：加载标定时换算为毫米（取画面中线上的点），否则原样返回"""
+    if calibration is None:
+        return x
+    return round(calibration.to_mm(x, calibration.size[1] / 2.0)[0], 2)
+
+
+def brain_params(calibration, params):
+    """参数快照中交给 brain 的部分：TARGET_X 在配置里是像素，加载标定时换算为毫米"""
+    if calibration is None or params.get("TARGET_X") is None:
+        return params
+    return dict(params, TARGET_X=target_to_control(calibration, params["TARGET_X"]))
+
+
+def set_toggle_targets(calibration):
+    """把 [t] 键的两个像素目标换算为毫米"""
+    global TOGGLE_TARGETS
+    TOGGLE_TARGETS = tuple(target_to_control(calibration, x) for x in TOGGLE_TARGETS)
+
+
+def control_x(ctx, pos):
+    """追踪点 (px) 在控制单位下的 x：加载标定时为毫米，否则原样返回；pos 为 None 时返回 0.0"""
+    if pos is None:
+        return 0.0
+    if ctx.calibration is None:
+        return float(pos[0])
+    return ctx.calibration.to_mm(pos[0], pos[1])[0]
+
+
+def target_px(ctx):
+    """目标线在画面上的 x (px)：毫米目标取画面中线上对应的像素"""
+    if ctx.calibration is None:
+        return TARGET_X
+    cal = ctx.calibration
+    return cal.to_pixel(TARGET_X, cal.to_mm(cal.size[0] / 2.0, cal.size[1] / 2.0)[1])[0]
+
+
+def apply_snapshot(ctx):
+    """
+    控制线程换入新快照：brain 当场换入；追踪器只登记到待换入槽，
+    由追踪线程在下一帧开头换入（后端切换、开关变化不会落在一帧的中途）。
+    """
+    global TARGET_X
+    snapshot = ctx.config.snapshot
+    ctx.brain.apply_params(brain_params(ctx.calibration, snapshot.params))
+    ctx.tracker.submit_params(snapshot.params)
+    TARGET_X = ctx.brain.target_x
+    return snapshot
+
+
+def service_inputs(ctx, frame_id):
+    """
+    控制线程在每次 think() 之前调用，统一处理所有外部输入：
+    1. 本进程其他线程投递的指令（例如键盘切换目标）；
+    2. config.json 的变化（只有指纹变化且通过校验时才换入新快照）；
+    3. 消息总线上的参数下发：立即校验、换入，并以当前帧号回执，告诉仪表盘参数在哪一帧生效。
+    """
+    while not ctx.commands.empty():
+        name, value = ctx.commands.get_nowait()
+        if name == "target":
+            ctx.brain.update_target(value)
+
+    rejections = ctx.config.rejections
+    if ctx.config.poll():
+        snapshot = apply_snapshot(ctx)
+        print(f"\n🔧 参数快照 v{snapshot.version} 已生效 (config.json)")
+    elif ctx.config.rejections != rejections:
+        print(f"\n⚠️ config.json 被拒收，沿用 v{ctx.config.snapshot.version}: {ctx.config.last_error}")
+
+    if ctx.bus is None:
+        return
+    for client_id, msg in ctx.bus.drain():
+        if msg.get("type") == "key" and msg.get("key"):
+            # 远程按键：转交主线程，与窗口按键走同一套处理逻辑
+            ctx.keys.put(ord(str(msg["key"])[0].lower()))
+            continue
+        if msg.get("type") != "set":
+            continue
+        try:
+            ctx.config.push(msg.get("params", {}))
+        except ConfigError as e:
+            ctx.bus.reply(client_id, {"type": "nack", "seq": msg.get("seq"), "error": str(e)})
+            continue
+        snapshot = apply_snapshot(ctx)
+        ctx.bus.reply(client_id, {"type": "ack", "seq": msg.get("seq"), "frame_id": frame_id, "version": snapshot.version})
+
+
+def think_step(ctx, frame_id, pos, dt, timestamp, velocity=None):
+    """
+    Think：处理外部输入后，由 PhysicsBrain 给出理想电压。
+    有状态估计器时，先融合本帧测量（timestamp 为采集时刻），再把状态外推到此刻 + predict_lead，
+    控制律作用在液滴“现在”的位置上，微分项直接使用滤波后的速度。
+    没有估计器时，velocity 给定则微分项用它（控制单位/秒），否则由 brain 对相邻两次误差做差分。
+    """
+    service_inputs(ctx, frame_id)
+    t0 = time.perf_counter()
+    if ctx.estimator is not None:
+        state = ctx.estimator.step(timestamp, pos, t0 + ctx.predict_lead)
+        if state is None:
+            return 0.0
+        x, vx = state.pos[0], state.vel[0]
+        if ctx.calibration is not None:
+            # 估计器在像素上滤波（噪声参数按像素整定），只在交给 brain 之前换算位置与速度
+            x = ctx.calibration.to_mm(*state.pos)[0]
+            vx = ctx.calibration.velocity_to_mm(*state.pos, *state.vel)[0]
+        v_ideal = ctx.brain.think([x, 0], dt=dt, velocity=vx)
+        ctx.metrics.record("control", time.perf_counter() - t0)
+        return v_ideal
+    if pos is None:
+        return 0.0
+    v_ideal = ctx.brain.think([control_x(ctx, pos), 0], dt=dt, velocity=velocity)
+    ctx.metrics.record("control", time.perf_counter() - t0)
+    return v_ideal
+
+
+def act_step(ctx, frame_id, timestamp, pos, v_ideal, dt):
+    """Act：下发串口指令，并按限频向消息总线推送遥测"""
+    t0 = time.perf_counter()
+    instruction = ctx.actuator.generate_instruction(v_ideal)
+    t1 = time.perf_counter()
+    ctx.transmitter.send_command(instruction)
+    # 防止底层串口积压
+    if ctx.transmitter.ser and ctx.transmitter.ser.in_waiting > 0:
+        ctx.transmitter.ser.reset_input_buffer()
+    t2 = time.perf_counter()
+    ctx.metrics.record("encode", t1 - t0)
+    ctx.metrics.record("serial", t2 - t1)
+
+    ctx.ticks += 1
+    if ctx.ticks == ctx.max_ticks:
+        ctx.keys.put(ord('q')) # 与按下 [q] 走同一条退出路径
+
+    # 先问总线是否到了推送时刻：大多数 tick 不推送，也就不必构建遥测（各阶段统计与分位数）
+    now = time.perf_counter()
+    if ctx.bus is not None and ctx.bus.telemetry_due(now):
+        direction, pwm = ctx.actuator.map_voltage(v_ideal)
+        ctx.bus.publish_telemetry({
+            "frame_id": frame_id,
+            "pos": None if pos is None else [float(pos[0]), float(pos[1])],
+            "target_x": ctx.brain.target_x,
+            "pos_mm": None if pos is None or ctx.calibration is None else list(ctx.calibration.to_mm(pos[0], pos[1])),
+            "error": None if pos is None else ctx.brain.target_x - control_x(ctx, pos),
+            "voltage": float(v_ideal),
+            "direction": direction,
+            "pwm": pwm,
+            "dt_ms": dt * 1000,
+            "lag_ms": (now - timestamp) * 1000,
+            "loop": ctx.loop_stats(),
+            "latency": ctx.metrics.summary(),
+            "reacquire": None if ctx.reacquirer is None else ctx.reacquirer.summary(),
+            "centroid_quality": ctx.tracker.centroid_quality,
+        }, now=now)
+
+
+def render_console(frame, v_ideal, pos=None, target_x=None, latency=None):
+    """在画面上绘制控制台叠加层（原地修改 frame）；latency 为各阶段 p99 简报"""
+    target_x = TARGET_X if target_x is None else target_x
+    # 绘制控制底座防白背景干扰
+    cv2.rectangle(frame, (5, 5), (260, 45), (0, 0, 0), -1)
+    cv2.putText(frame, f"V_out: {v_ideal:.2f}V", (15, 32), 
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    cv2.line(frame, (int(target_x), 0), (int(target_x), frame.shape[0]), (0, 255, 0), 2)
+    if pos is not None:
+        cv2.circle(frame, (int(pos[0]), int(pos[1])), 4, (0, 0, 255), -1)
+    if latency:
+        cv2.putText(frame, f"p99 ms {latency}", (10, frame.shape[0] - 12),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 255, 255), 1)
+
 
+def draw_preview(canvas, state):
+    """预览线程的绘制函数：state 是控制侧提交的只读快照"""
+    render_console(canvas, state["v"], state["pos"], state["target_x"], state["latency"])
+
+
+def show_frame(ctx, frame, v_ideal, pos):
+    """按显示模式输出一帧：window 在当前线程绘制并 imshow（计入 render 耗时），preview 只提交引用"""
+    if ctx.display == "window":
+        t0 = time.perf_counter()
+        render_console(frame, v_ideal, pos, target_px(ctx), latency=ctx.metrics.format_overlay())
+        cv2.imshow("Galinstan Controller Console", frame)
+        ctx.metrics.record("render", time.perf_counter() - t0)
+    elif ctx.display == "preview":
+        ctx.preview.submit(frame, {"v": v_ideal, "pos": pos, "target_x": target_px(ctx),
+                                   "latency": ctx.metrics.format_overlay()})
+
+
+def track_step(ctx, frame, timestamp, debug=False):
+    """
+    Sense：记录帧从采集到进入追踪的等待时间 (capture) 与追踪本身的耗时 (track)。
+    失锁时交给 Reacquirer：找回则重建追踪器，否则在短时间内返回按速度外推的位置。
+    """
+    t0 = time.perf_counter()
+    pos = ctx.tracker.process_frame(frame, debug=debug, timestamp=timestamp)
+    if ctx.reacquirer is not None:
+        pos = ctx.reacquirer.step(ctx.tracker, frame, timestamp, pos)
+    ctx.metrics.record("capture", t0 - timestamp)
+    ctx.metrics.record("track", time.perf_counter() - t0)
+    return pos
+
+
+def handle_key(key, frame, set_target):
+    """
+    键盘指令解析，返回 False 表示请求退出。
+    set_target 为目标切换的回调：串行模式下直接改 brain，多线程模式下投递到控制线程执行。
+    """
+    global TARGET_X
+    if key == ord('q'):
+        return False
+    elif key == ord('t'):
+        TARGET_X = TOGGLE_TARGETS[1] if TARGET_X == TOGGLE_TARGETS[0] else TOGGLE_TARGETS[0]
+        set_target(TARGET_X)
+
+    # ⚠️ 录制逻辑说明：由于视觉追踪引擎换成了 CSRT，
+    # 这里砍掉了原来试图提取 mask 和 preprocessed 多路流的录制逻辑。
+    # 现在的引擎追求极致速度，如果你仍需录制，只需保存这一路 frame 即可。
+    if key == ord('s') and not recording_active and frame is not None:
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        cv2.imwrite(f"data/snap_{timestamp}.jpg", frame)
+        print(f"\n📸 快照已保存: data/snap_{timestamp}.jpg")
+    return True
+
+
+def make_source(ctx, packet):
+    """流水线采集源：只交付比上一帧更新的画面"""
+    state = {"last_id": packet.frame_id}
+
+    def source(timeout):
+        p = ctx.grabber.wait(state["last_id"], timeout=timeout)
+        if p is None:
+            return None
+        state["last_id"] = p.frame_id
+        return Message(p.frame_id, p.timestamp, p.frame)
+    return source
+
+
+def poll_keys(ctx):
+    """收集本轮的所有按键：window 模式下来自 waitKey，其余来源（预览窗口 / 标准输入 / 总线）经由 ctx.keys"""
+    keys = []
+    if ctx.display == "window":
+        key = cv2.waitKey(1) & 0xFF
+        if key != 0xFF:
+            keys.append(key)
+    while not ctx.keys.empty():
+        keys.append(ctx.keys.get_nowait())
+    return keys
+
+
+def ui_loop(ctx, render_q, describe, set_target):
+    """
+    主线程的 UI 循环（多线程模式共用）：
+    - window：每帧在主线程绘制并 imshow（与旧版行为一致）；
+    - preview：只把画面引用交给预览线程，由它以低频率异步渲染；
+    - headless：不做任何 GUI 调用，只维护最新一帧供快照使用。
+    describe(msg) -> (v_ideal, 状态栏文字)。终端状态栏限频到 STATUS_HZ，避免 SSH 终端 I/O 吃掉帧预算。
+    """
+    frame = None
+    last_status = 0.0
+    while True:
+        msg = render_q.get(timeout=FRAME_WAIT_TIMEOUT)
+        if msg is not None:
+            frame = msg.payload["frame"]
+            pos = msg.payload["pos"]
+            v_ideal, status = describe(msg)
+            show_frame(ctx, frame, v_ideal, pos)
+
+            now = time.perf_counter()
+            if now - last_status >= 1.0 / STATUS_HZ:
+                last_status = now
+                print(f"\r{status}   ", end="", flush=True)
+
+        for key in poll_keys(ctx):
+            if not handle_key(key, frame, set_target):
+                return
+
+
+def run_sequential(ctx, packet):
+    """
+    串行模式：Sense -> Think -> Act -> Render 在同一线程中依次执行。
+    保留作为流水线模式的对照基准。
+    """
+    last_id = packet.frame_id
+    last_time = packet.timestamp
+    last_status = 0.0
+    debug = ctx.display == "window" # 只有 window 模式才允许追踪器弹出调试窗口
+
+    while True:
+        # 只取比上一帧更新的画面：有新帧立即返回，绝不重复处理旧帧
+        packet = ctx.grabber.wait(last_id, timeout=FRAME_WAIT_TIMEOUT)
+        if packet is None:
+            if ctx.display == "window":
+                cv2.waitKey(1) # 摄像头暂时无帧时，保持窗口事件循环存活
+            continue
+        last_id = packet.frame_id
+        frame = packet.frame
+
+        # dt 取两帧采集时刻之差，即物理世界真实流逝的时间
+        dt = packet.timestamp - last_time
+        last_time = packet.timestamp
+
+        # --- Sense ---
+        pos = track_step(ctx, frame, packet.timestamp, debug=debug)
         
+        # --- Think ---
+        v_ideal = think_step(ctx, packet.frame_id, pos, dt, packet.timestamp)
+        curr_x = control_x(ctx, pos)
+
+        # --- Act ---
+        act_step(ctx, packet.frame_id, packet.timestamp, pos, v_ideal, dt)
+
+        # --- UI 与终端渲染层 ---
+        # 终端状态栏与多线程模式一样限频到 STATUS_HZ
+        now = time.perf_counter()
+        if now - last_status >= 1.0 / STATUS_HZ:
+            last_status = now
+            print(f"\r[Engine] Target:{TARGET_X:>5.1f} | Pos:{curr_x:>5.1f} | dt:{dt:.3f}s | Lag:{(now - packet.timestamp) * 1000:>4.0f}ms | Out: {v_ideal:>5.2f}V   ", end="", flush=True)
+
+        # 视觉引擎已经自带绘制了液滴锁定框，这里直接叠加控制台
+        show_frame(ctx, frame, v_ideal, pos)
+
+        if not all(handle_key(key, frame, ctx.brain.update_target) for key in poll_keys(ctx)):
+            break
+
+
+def run_pipeline(ctx, packet):
+    """
+    流水线模式：采集 / 追踪 / 演算 / 执行 各占一个工作线程，阶段之间用有界丢旧队列连接。
+    追踪第 N 帧时，执行线程可以同时在下发第 N-1 帧的指令；主线程只负责渲染与按键。
+    """
+    state = {"last_time": packet.timestamp}
+
+    def track(msg):
+        # 工作线程中禁止调用 imshow，debug 渲染交给主线程
+        pos = track_step(ctx, msg.payload, msg.timestamp)
+        return {"frame": msg.payload, "pos": pos}
+
+    def think(msg):
+        # dt 取相邻两条被处理消息的采集时刻之差：即便中间有帧被丢弃，也是真实流逝的时间
+        dt = msg.timestamp - state["last_time"]
+        state["last_time"] = msg.timestamp
+        v_ideal = think_step(ctx, msg.frame_id, msg.payload["pos"], dt, msg.timestamp)
+        return dict(msg.payload, v=v_ideal, dt=dt)
+
+    def act(msg):
+        p = msg.payload
+        act_step(ctx, msg.frame_id, msg.timestamp, p["pos"], p["v"], p["dt"])
+        return None # 执行阶段是流水线的终点
+
+    engine = PipelineEngine()
+    engine.set_source(make_source(ctx, packet))
+    engine.add_stage("track", track)
+    engine.add_stage("think", think)
+    engine.add_stage("act", act)
+    render_q = engine.add_tap("think")
+    ctx.loop_stats = engine.stats
+
+    def describe(msg):
+        p = msg.payload
+        curr_x = control_x(ctx, p["pos"])
+        return p["v"], (f"[Engine] Target:{TARGET_X:>5.1f} | Pos:{curr_x:>5.1f} | dt:{p['dt']:.3f}s | "
+                        f"Lag:{(time.perf_counter() - msg.timestamp) * 1000:>4.0f}ms | Out: {p['v']:>5.2f}V | {engine.format_stats()}")
+
+    engine.start()
+    try:
+        ui_loop(ctx, render_q, describe, lambda x: ctx.commands.put(("target", x)))
+    finally:
+        engine.stop()
+        print("\n📊 流水线统计:")
+        for name, s in engine.stats().items():
+            print(f"   {name:<6} 占用率 {s['occupancy'] * 100:5.1f}% | 平均 {s['avg_ms']:6.2f}ms | 处理 {s['processed']} | 丢弃 {s['dropped']} | 异常 {s['errors']}")
+
+
+def run_fixed_rate(ctx, packet, rate_hz):
+    """
+    定频模式：追踪仍由流水线线程随帧驱动，控制 tick 则由 FixedRateScheduler 以 rate_hz 独立触发。
+    每个 tick 取最新的追踪结果（采样保持），think() 收到的 dt 为两个 tick 之间真实流逝的时间，
+    不再受 imshow / waitKey / 串口 flush 的抖动影响。
+    没有估计器时，同一帧会被相邻几个 tick 重复使用：对 tick 差分的微分项在重复帧上为 0、
+    新帧到达时又放大 rate / fps 倍。因此微分项改用相邻两帧之间的速度（按两帧的采集时刻计算）。
+    """
+    state = {"latest": None, "v": 0.0, "velocity": None, "prev": None}
+
+    def track(msg):
+        pos = track_step(ctx, msg.payload, msg.timestamp)
+        return {"frame": msg.payload, "pos": pos}
+
+    engine = PipelineEngine()
+    engine.set_source(make_source(ctx, packet))
+    engine.add_stage("track", track)
+    latest_q = engine.add_tap("track")  # 单槽：控制 tick 只关心最新的测量
+    render_q = engine.add_tap("track")
+
+    def tick(dt):
+        msg = latest_q.get_latest()
+        if msg is not None:
+            state["latest"] = msg
+            if ctx.estimator is None:
+                state["velocity"] = measured_velocity(ctx, state["prev"], msg)
+                state["prev"] = msg
+        latest = state["latest"]
+        if latest is None:
+            return
+        pos = latest.payload["pos"]
+        v_ideal = think_step(ctx, latest.frame_id, pos, dt, latest.timestamp, velocity=state["velocity"])
+        state["v"] = v_ideal
+        act_step(ctx, latest.frame_id, latest.timestamp, pos, v_ideal, dt)
+
+    scheduler = FixedRateScheduler(rate_hz)
+    ctx.loop_stats = scheduler.stats
+
+    def describe(msg):
+        pos = msg.payload["pos"]
+        curr_x = control_x(ctx, pos)
+        return state["v"], f"[Engine] Target:{TARGET_X:>5.1f} | Pos:{curr_x:>5.1f} | Out: {state['v']:>5.2f}V | {scheduler.format_stats()}"
+
+    engine.start()
+    scheduler.start(tick)
+    try:
+        ui_loop(ctx, render_q, describe, lambda x: ctx.commands.put(("target", x)))
+    finally:
+        scheduler.stop()
+        engine.stop()
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        stats_path = f"data/scheduler_stats_{timestamp}.json"
+        scheduler.write_stats(stats_path)
+        print(f"\n⏱️ 定频调度统计: {scheduler.format_stats()} -> {stats_path}")
+
+
+def measured_velocity(ctx, prev, msg):
+    """相邻两条追踪结果之间的 x 速度（控制单位/秒）；任一帧没有位置时为 0（本次不施加微分项）"""
+    if prev is None or prev.payload["pos"] is None or msg.payload["pos"] is None:
+        return 0.0
+    span = msg.timestamp - prev.timestamp
+    if span <= 1e-5:
+        return 0.0
+    return (control_x(ctx, msg.payload["pos"]) - control_x(ctx, prev.payload["pos"])) / span
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Galinstan 闭环控制引擎")
+    parser.add_argument("--mode", choices=["pipeline", "fixed", "sequential"], default="pipeline",
+                        help="pipeline: 多线程流水线 (默认); fixed: 定频控制 tick; sequential: 单线程串行 (对照基准)")
+    parser.add_argument("--rate", type=float, default=60.0,
+                        help="fixed 模式下的控制频率 (Hz)，例如 30 / 60 / 100")
+    parser.add_argument("--port", default=COM_PORT,
+                        help="Arduino 串口号，例如 COM5 或 /dev/ttyACM0")
+    parser.add_argument("--reset-delay", type=float, default=2.0,
+                        help="打开串口后等待 Arduino 复位的时间 (秒)")
+    parser.add_argument("--config", default=CONFIG_PATH,
+                        help="参数文件路径 (默认项目根目录下的 config.json)")
+    parser.add_argument("--max-ticks", type=int, default=0,
+                        help="下发指定数量的控制指令后自动退出，0 表示一直运行 (用于基准测试)")
+    parser.add_argument("--camera", type=int, default=None,
+                        help="指定摄像头索引；默认并行探测 0~4 号设备并自动选择")
+    parser.add_argument("--reprobe", action="store_true",
+                        help="忽略 data/camera_profile.json 中缓存的设备档案，重新探测")
+    parser.add_argument("--display", choices=["window", "preview", "headless"], default="window",
+                        help="window: 每帧在主线程显示 (默认); preview: 独立线程低频预览; headless: 不做任何 GUI 调用")
+    parser.add_argument("--preview-hz", type=float, default=10.0,
+                        help="preview 模式下的窗口刷新频率 (Hz)")
+    parser.add_argument("--roi", default=None,
+                        help="初始目标框 x,y,w,h；给定时跳过自动捕获与 selectROI 框选窗口")
+    parser.add_argument("--acquire", choices=["auto", "manual"], default="auto",
+                        help="auto: 开机自动捕获液滴，置信度不足时退回框选窗口 (默认); manual: 总是人工框选")
+    parser.add_argument("--acquire-frames", type=int, default=5,
+                        help="自动捕获使用的开机帧数")
+    parser.add_argument("--min-confidence", type=float, default=0.6,
+                        help="自动捕获的置信度下限，低于它退回人工框选 (headless 模式下放弃启动)")
+    parser.add_argument("--estimator", choices=["kalman", "abg", "none"], default="kalman",
+                        help="状态估计器：kalman (默认) / abg (α-β-γ 固定增益) / none (直接使用原始测量)")
+    parser.add_argument("--predict-lead", type=float, default=0.0,
+                        help="在延迟补偿之外额外向前预测的时间 (ms)，用于抵消串口与电极的响应延迟")
+    parser.add_argument("--max-dropout", type=float, default=0.3,
+                        help="测量中断后状态估计器继续外推的最长时间 (秒)，超过后输出 0V")
+    parser.add_argument("--no-reacquire", action="store_true",
+                        help="关闭失锁后的后台重新捕获（失锁即输出 0V，直到追踪器自行恢复）")
+    parser.add_argument("--reacquire-confidence", type=float, default=0.5,
+                        help="后台重新捕获的置信度下限")
+    parser.add_argument("--coast-frames", type=int, default=10,
+                        help="失锁后按速度外推位置的最大帧数，超过后输出 0V (仅 --estimator none 时使用)")
+    parser.add_argument("--calibration", default=None,
+                        help="像素 -> 毫米标定文件 (python -m src.vision.calibration 生成，例如 data/calibration.npz)；"
+                             "给定时控制单位为毫米：config.json 中的 TARGET_X 仍填像素，由引擎换算；"
+                             "PID 增益不换算，按毫米解释 (Kp: V/mm, Ki: V/(mm·s), Kd: V·s/mm)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="定期以 Prometheus 文本格式重写各阶段耗时统计的文件路径，例如 data/metrics.prom")
+    parser.add_argument("--metrics-interval", type=float, default=1.0,
+                        help="指标文件的重写间隔 (秒)")
+    parser.add_argument("--no-bus", action="store_true",
+                        help="不启动本地消息总线，只通过 config.json 轮询接收参数")
+    parser.add_argument("--bus-address", default=None,
+                        help="消息总线地址，例如 unix:/tmp/galinstan_engine.sock 或 tcp:127.0.0.1:47800 (默认按平台选择)")
+    parser.add_argument("--telemetry-hz", type=float, default=20.0,
+                        help="遥测推送频率 (Hz)，仪表盘也可通过 subscribe 消息在运行时调整")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
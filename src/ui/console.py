@@ -0,0 +1,30 @@
+"""
+--- console.py v1.0 ---
+目的：
+无窗口（headless）模式下的键盘替代品。
+后台线程逐行读取标准输入，每行第一个字符视为一次按键（q / t / s），交给 on_key 回调，
+与 OpenCV 窗口里的按键走同一套处理逻辑。SSH 会话里直接敲 `t` + 回车即可切换目标。
+"""
+
+import sys
+import threading
+
+
+class StdinKeyReader:
+    def __init__(self, on_key, stream=None):
+        self.on_key = on_key
+        self.stream = stream if stream is not None else sys.stdin
+        self._thread = None
+
+    def start(self):
+        # stdin 的 readline 无法被中断，因此使用守护线程，随主进程一起退出
+        self._thread = threading.Thread(target=self._run, name="stdin-keys", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for line in self.stream:
+            line = line.strip()
+            if line:
+                self.on_key(ord(line[0].lower()))
+        # 标准输入被关闭（例如 nohup 后台运行）时静默结束，引擎继续运行，可通过消息总线或 Ctrl+C 停止
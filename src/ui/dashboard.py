@@ -1,6 +1,7 @@
 
 import streamlit as st # Streamlit 是一个用于构建交互式数据应用的 Python 库，提供了丰富的组件和布局功能，使得开发者能够快速创建用户友好的界面。
 import json # json 库用于处理 JSON 格式的数据，在这个程序中主要用于读取和写入 config.json 文件，以实现参数的持久化存储和热更新功能。
+import sys # sys 库用于把项目根目录加入模块搜索路径，使 streamlit 启动的脚本也能导入 src 下的模块。
 import os # os 库用于处理文件路径和系统相关的操作，在这个程序中主要用于获取脚本所在目录的绝对路径，确保能够正确找到 config.json 文件，无论用户从哪个目录启动 Streamlit。
 
 
@@ -25,6 +26,9 @@ import os # os 库用于处理文件路径和系统相关的操作，在这个
 # 无论在哪个目录下执行 streamlit run，它都能精准找到根目录的 config.json
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 CONFIG_PATH = os.path.join(BASE_DIR, "config.json")
+sys.path.append(BASE_DIR) # 赋予 Python 寻找 src 模块的视野，以便复用引擎侧的原子写入工具
+from src.engine.config_service import write_config_atomic, CONFIG_SCHEMA
+from src.engine.bus import BusClient
 # 这两个全局变量的目的是确保程序能够正确找到 config.json 文件，无论用户从哪个目录启动 Streamlit。通过动态获取脚本所在目录的绝对路径，消除了空间坐标依赖，增强了程序的鲁棒性和可移植性。
 # 详情可以搜索关键词 "Python os.path.abspath" 和 "Python os.path.dirname" 来了解更多关于如何在 Python 中处理文件路径的知识。
 
@@ -47,9 +51,10 @@ def load_config():
     }
 
 def save_config(data): # 将新的参数数据写入 config.json 文件，覆盖原有内容，实现参数的持久化存储和热更新功能。
-    with open(CONFIG_PATH, 'w') as f: # 使用 with 语句以写入模式 ('w') 打开 config.json 文件，如果文件不存在则会创建一个新的文件，如果文件已经存在则会覆盖原有内容。
-        json.dump(data, f, indent=4) # 使用 json.dump() 方法将 Python 字典对象 data 转换为 JSON 格式，并写入到文件中。参数 indent=4 用于美化输出，使得 JSON 文件更易读，层级结构清晰。
-        # 详情可以搜索关键词 "Python json.dump" 来了解更多关于 json.dump() 方法的用法和参数选项。
+    write_config_atomic(CONFIG_PATH, data)
+    # 原子写入：先把 JSON 完整写进同目录的临时文件，再用 os.replace() 一步替换 config.json。
+    # 底层引擎要么读到旧文件、要么读到新文件，永远不会撞上“写了一半”的文件，上面 load_config 里的 JSONDecodeError 兜底也就很少再被触发。
+    # 详情可以搜索关键词 "Python os.replace atomic" 来了解更多关于原子替换文件的原理。
 
 # --- 2. 前端渲染管线 ---
 st.set_page_config(page_title="Galinstan 控制中枢", layout="wide") 
@@ -57,6 +62,25 @@ st.title("🔬 Galinstan 动力学参数寻优平台")
 st.markdown("调整以下物理与视觉参数，系统将实时热更新底层的 `config.json` 协议。")
 
 
+# --- 消息总线：参数即时下发，遥测实时回流 ---
+@st.cache_resource
+def get_bus_client():
+    """整个 Streamlit 会话共用一条总线连接；引擎未启动时返回 None，退回纯 config.json 模式"""
+    try:
+        client = BusClient()
+    except OSError:
+        return None
+    return client
+
+bus_client = get_bus_client()
+if bus_client is not None and not bus_client.connected:
+    # 引擎重启过：丢弃失效连接，重新握手
+    get_bus_client.clear()
+    bus_client = get_bus_client()
+# st.cache_resource 装饰的函数在整个会话中只执行一次，返回的对象会被缓存复用，避免每次 Streamlit 重跑脚本都重新建立连接。
+# 详情可以搜索关键词 "Streamlit st.cache_resource" 来了解更多关于资源缓存的用法。
+
+
 #st.xxx() 是 Streamlit 提供的一个函数，用于设置页面的配置参数。
 #在这个程序中，
 #st.set_page_config() 被用来设置页面的标题和布局方式。
@@ -80,18 +104,37 @@ with col1:
     new_C = st.slider("阈值灵敏度 (C) - 抵抗光照扰动", 0, 50, current_cfg.get("vis_thresh_C", 6))
     new_K = st.slider("形态学核大小 (Kernel) - 抹除物理杂质", 0, 15, current_cfg.get("vis_kernel_size", 7), step=2)
     new_area = st.slider("液滴面积下限 (Min Area) - 质量守恒过滤", 0, 5000, current_cfg.get("vis_min_area", 300))
+    new_window = int(st.checkbox("局部搜索窗口 (Search Window) - 只在液滴附近搜索", bool(current_cfg.get("vis_search_window", 1))))
+    backend_choices = list(CONFIG_SCHEMA["tracker_backend"][1])
+    new_backend = st.selectbox("追踪后端 (Backend) - 用 src/vision/benchmark.py 实测后选择", backend_choices,
+                               index=backend_choices.index(current_cfg.get("tracker_backend", "csrt")))
+    new_scale = st.slider("分割分辨率 (Detect Scale) - classical 后端降采样分割", 0.25, 1.0, current_cfg.get("vis_detect_scale", 1.0), 0.25)
+    new_subpixel = int(st.checkbox("亚像素质心 (Sub-pixel) - 框内图像矩精修坐标", bool(current_cfg.get("vis_subpixel", 1))))
+    new_hybrid = int(st.checkbox("混合追踪 (Hybrid) - 每 N 帧运行一次完整追踪器，其余帧光流传播", bool(current_cfg.get("vis_hybrid", 0))))
+    new_bg_rate = st.slider("背景学习率 (BG Rate) - background 后端适应光照漂移的速度", 0.0, 0.2, current_cfg.get("bg_learning_rate", 0.02), 0.005)
     # st.slider() 函数的参数说明：
     # 第一个参数是滑动条的标签，第二个和第三个参数分别是滑动条的最小值和最大值，第四个参数是滑动条的初始值，这里使用 current_cfg.get() 方法从当前配置中获取对应的参数值，如果 config.json 中缺少这些键值，则使用默认值（例如 6、7、300）。step 参数用于指定滑动条的步长，例如 kernel 的步长为 2，确保用户只能选择奇数值。
     # 详情可以搜索关键词 "Streamlit st.slider" 来了解更多关于 st.slider() 函数的用法和参数选项。
 
 with col2:
     st.subheader("⚙️ 动力学控制律 (Brain PID)")
-    new_Kp = st.slider("比例系数 (Kp) - 刚度", 0.0, 5.0, current_cfg.get("Kp", 0.4), 0.1)
-    new_Ki = st.slider("积分系数 (Ki) - 破冰锤", 0.0, 1.0, current_cfg.get("Ki", 0.01), 0.01)
-    new_Kd = st.slider("微分系数 (Kd) - 阻尼器", 0.0, 2.0, current_cfg.get("Kd", 0.1), 0.05)
+    # 自动整定（src/analysis/autotune.py）写入的增益表：载入所选的一组后，滑动条以它为初值，照常经总线下发并持久化
+    gain_cfg = current_cfg
+    gain_table = current_cfg.get("gain_table") or []
+    if gain_table:
+        pick = st.selectbox("自动整定增益表 (Auto-tune) - 按仿真代价排序", range(len(gain_table)),
+                            format_func=lambda i: f"#{i + 1} Kp={gain_table[i]['Kp']:g} Ki={gain_table[i]['Ki']:g} "
+                                                  f"Kd={gain_table[i]['Kd']:g} | 代价 {gain_table[i].get('cost', 0.0):.3f}"
+                                                  + ("" if gain_table[i].get("relay_ok", True) else " ⚠️ 继电确认未通过"))
+        if st.button("载入所选增益"):
+            gain_cfg = dict(current_cfg, **{k: gain_table[pick][k] for k in ("Kp", "Ki", "Kd")})
+    new_Kp = st.slider("比例系数 (Kp) - 刚度", 0.0, 5.0, gain_cfg.get("Kp", 0.4), 0.1)
+    new_Ki = st.slider("积分系数 (Ki) - 破冰锤", 0.0, 1.0, gain_cfg.get("Ki", 0.01), 0.01)
+    new_Kd = st.slider("微分系数 (Kd) - 阻尼器", 0.0, 2.0, gain_cfg.get("Kd", 0.1), 0.05)
     
     st.subheader("📏 物理边界条件")
-    new_target = st.slider("目标位置坐标 (TARGET_X)", 50.0, 600.0, current_cfg.get("TARGET_X", 320.0), 10.0)
+    # TARGET_X 始终以像素下发；引擎以 --calibration 运行时自行换算为毫米，而增益按毫米解释 (Kp: V/mm)
+    new_target = st.slider("目标位置坐标 (TARGET_X, px)", 50.0, 600.0, current_cfg.get("TARGET_X", 320.0), 10.0)
     new_critical = st.slider("临界启动电压 (Critical_V)", 0.0, 10.0, current_cfg.get("Critical_V", 1.2), 0.1)
 
 # --- 3. 状态对比与指令下发 ---
@@ -99,13 +142,55 @@ with col2:
 updated_cfg = {
     "Kp": new_Kp, "Ki": new_Ki, "Kd": new_Kd, 
     "TARGET_X": new_target, "Critical_V": new_critical,
-    "vis_thresh_C": new_C, "vis_kernel_size": new_K, "vis_min_area": new_area
+    "vis_thresh_C": new_C, "vis_kernel_size": new_K, "vis_min_area": new_area,
+    "vis_search_window": new_window, "tracker_backend": new_backend, "vis_detect_scale": new_scale,
+    "vis_subpixel": new_subpixel, "vis_hybrid": new_hybrid, "bg_learning_rate": new_bg_rate,
 }
 # 定义了updated_cfg字典，将用户通过滑动条调整后的参数值进行汇总，形成一个新的配置字典。
 # 这个 updated_cfg 将用于与 current_cfg 进行对比，判断是否有参数发生了变化，从而决定是否需要将新的参数写入 config.json 文件，实现热更新。
 
 
+# 与当前配置合并：保留 config.json 中不由本面板管理的键（例如自动整定写入的增益表）
+merged_cfg = dict(current_cfg, **updated_cfg)
+
 # 只有当参数发生真实的物理位移时，才触发高耗能的 I/O 写入
-if updated_cfg != current_cfg:
-    save_config(updated_cfg)
-    st.success("✅ 协议已更新！底层引擎将以新的物理参数运行。")
\ No newline at end of file
+if merged_cfg != current_cfg:
+    changes = {k: v for k, v in updated_cfg.items() if current_cfg.get(k) != v}
+    ack = bus_client.set_params(changes) if bus_client is not None else None
+    save_config(merged_cfg) # 无论总线是否在线，都持久化到 config.json，保证引擎重启后参数不丢
+    if ack is None:
+        st.success("✅ 协议已更新！底层引擎将以新的物理参数运行。")
+    elif ack.get("type") == "ack":
+        st.success(f"✅ 参数已在第 {ack['frame_id']} 帧生效 (快照 v{ack['version']})")
+    else:
+        st.error(f"❌ 引擎拒收参数: {ack.get('error')}")
+
+# --- 4. 引擎遥测面板 ---
+st.subheader("📡 引擎遥测")
+
+def render_telemetry():
+    if bus_client is None or not bus_client.connected:
+        st.info("引擎未连接：参数仅通过 config.json 同步，无遥测回流。")
+        return
+    t = bus_client.telemetry
+    if t is None:
+        st.info("等待引擎遥测...")
+        return
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("帧号", t["frame_id"])
+    c2.metric("位置 X (px)", "--" if t["pos"] is None else f"{t['pos'][0]:.1f}")
+    c3.metric("误差 (px)", "--" if t["error"] is None else f"{t['error']:.1f}")
+    c4.metric("电压 (V)", f"{t['voltage']:.2f}", f"PWM {t['pwm']} / DIR {t['direction']}")
+    c5.metric("延迟 (ms)", f"{t['lag_ms']:.1f}", f"dt {t['dt_ms']:.1f}ms")
+    history = [h["pos"][0] for h in bus_client.telemetry_history if h["pos"] is not None]
+    if history:
+        st.line_chart(history)
+    if t.get("latency"):
+        # 各阶段耗时分位数 (ms)：一眼看出哪个阶段在吃帧预算
+        st.dataframe({stage: s for stage, s in t["latency"].items() if s["count"]})
+    st.json(t.get("loop", {}), expanded=False)
+
+# 新版 Streamlit 支持局部定时刷新：只重跑遥测面板，不打扰上面的滑动条
+if hasattr(st, "fragment"):
+    render_telemetry = st.fragment(run_every=0.5)(render_telemetry)
+render_telemetry()
\ No newline at end of file
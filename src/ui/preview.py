@@ -0,0 +1,77 @@
+"""
+--- preview.py v1.0 ---
+目的：
+把 OpenCV 窗口渲染从控制回路中彻底剥离。
+控制线程每帧只调用 submit() 交出“画面 + 状态”的引用（零拷贝、零绘制），
+预览线程以较低的频率（默认 10 Hz）取最新的一份快照，在副本上绘制叠加层并 imshow。
+窗口里的按键通过 on_key 回调交还给主线程处理。
+
+通过 SSH 远程操作实验台时，imshow/waitKey 的开销会吃掉相当一部分帧预算；
+降频 + 异线程之后，无论窗口多卡，都不会拖慢追踪与执行。
+"""
+
+import threading
+import time
+
+import cv2
+
+
+class PreviewRenderer:
+    def __init__(self, draw_fn, window_name="Galinstan Controller Preview", rate_hz=10.0, on_key=None, record=None):
+        # draw_fn(canvas, state)：在画面副本上原地绘制叠加层
+        # record(seconds)：可选，每渲染一帧回报一次 拷贝 + 绘制 + imshow 的耗时
+        self.draw_fn = draw_fn
+        self.record = record
+        self.window_name = window_name
+        self.period = 1.0 / rate_hz
+        self.on_key = on_key
+
+        self._latest = None # (frame, state) 单槽快照
+        self._running = False
+        self._thread = None
+        self.frames_rendered = 0
+
+    def submit(self, frame, state):
+        """控制侧调用：只保存引用，开销可以忽略"""
+        self._latest = (frame, state)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="preview-renderer", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        shown = None
+        next_time = time.perf_counter()
+        while self._running:
+            latest = self._latest
+            if latest is not None and latest is not shown:
+                frame, state = latest
+                t0 = time.perf_counter()
+                canvas = frame.copy() # 只在预览频率下拷贝，绝不在控制回路里拷贝
+                self.draw_fn(canvas, state)
+                cv2.imshow(self.window_name, canvas)
+                if self.record is not None:
+                    self.record(time.perf_counter() - t0)
+                shown = latest
+                self.frames_rendered += 1
+
+            # waitKey 必须由创建窗口的同一线程调用
+            key = cv2.waitKey(1) & 0xFF
+            if key != 0xFF and self.on_key is not None:
+                self.on_key(key)
+
+            next_time += self.period
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.perf_counter()
+
+        cv2.destroyWindow(self.window_name)
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
@@ -0,0 +1,99 @@
+"""
+--- acquisition.py v1.0 ---
+目的：
+开机自动捕获液滴，替代 cv2.selectROI 人工框选，使无人值守的重启成为可能。
+在最初几帧上运行 ClassicalDetector，对每个候选按三类线索打分：
+1. 形状：圆度（液滴在电解液中近似圆盘）；
+2. 尺寸：面积落在 [min_area, max_area] 之内，给定 expected_area 时越接近越好；
+3. 光学：液态金属本体是一块均匀的暗区，只有一小点镜面高光——
+   本体内部灰度离散度（p10~p90 跨度）相对本体与周围电解液的对比度越小越像，
+   且本体要比周围暗得足够多（相对深度 ≥ MIN_DEPTH 才得满分），浅灰色的杂质得分更低。
+再在帧间聚类：同一位置反复出现的候选才可信（持续度），
+且最佳候选必须明显优于次佳候选（区分度）；两颗一模一样的液滴只会得到一半的置信度。
+
+confidence = 单帧得分均值 × 持续度 × (0.5 + 0.5 × 区分度)，取值 0~1。
+调用方在 confidence 低于阈值时退回人工框选。
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from src.vision.classical import ClassicalDetector
+
+# bbox: 用于初始化追踪器的目标框（对应 frames[-1]）；position: 该帧中的质心
+Acquisition = namedtuple("Acquisition", ["bbox", "position", "confidence", "candidates"])
+
+BBOX_PAD = 4 # 目标框在液滴外接框基础上每边外扩的像素，与人工框选的习惯一致
+MIN_DEPTH = 0.5 # 本体比周围暗 50% 以上视为“足够暗”
+
+
+def score_blob(gray, blob, expected_area=None):
+    """单个候选的形状 × 尺寸 × 光学得分，0~1"""
+    shape = float(np.clip((blob.circularity - 0.3) / 0.6, 0.0, 1.0))
+    size = 1.0 if expected_area is None else float(np.exp(-abs(np.log(blob.area / expected_area))))
+
+    # 本体：外接框的内切椭圆；周围：外扩半个框的环带
+    h, w = gray.shape
+    x0, y0 = int(blob.x), int(blob.y)
+    x1, y1 = int(np.ceil(blob.x + blob.w)), int(np.ceil(blob.y + blob.h))
+    mx, my = max(int(blob.w // 2), 2), max(int(blob.h // 2), 2)
+    rx0, ry0, rx1, ry1 = max(x0 - mx, 0), max(y0 - my, 0), min(x1 + mx, w), min(y1 + my, h)
+    patch = gray[ry0:ry1, rx0:rx1]
+    inside = np.zeros(patch.shape, np.uint8)
+    center = (int(round(blob.cx)) - rx0, int(round(blob.cy)) - ry0)
+    cv2.ellipse(inside, center, (max(int(blob.w / 2) - 1, 1), max(int(blob.h / 2) - 1, 1)), 0, 0, 360, 255, -1)
+    body, ring = patch[inside > 0], patch[inside == 0]
+    if body.size == 0 or ring.size == 0:
+        return 0.0
+    p10, p90 = np.percentile(body, (10, 90))
+    background = float(np.median(ring))
+    contrast = abs(background - float(np.median(body)))
+    depth = min(contrast / (background + 1e-6) / MIN_DEPTH, 1.0)
+    optics = contrast / (contrast + float(p90 - p10) + 1e-6) * depth
+    return shape * size * optics
+
+
+def acquire(frames, params=None, expected_area=None, detector=None):
+    """
+    在若干帧（按时间顺序，液滴在开机阶段近似静止）中寻找液滴。
+    返回 Acquisition，或在没有任何候选时返回 None。
+    """
+    detector = detector or ClassicalDetector(params)
+    tracks = [] # 每条: {"pos": (x, y), "radius": r, "scores": [...], "last": (frame_idx, blob)}
+    n_candidates = 0
+    for idx, frame in enumerate(frames):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        blobs = detector.candidates(frame)
+        n_candidates = max(n_candidates, len(blobs))
+        for blob in blobs:
+            s = score_blob(gray, blob, expected_area)
+            # 帧间聚类：质心落在已有轨迹半个框以内视为同一目标
+            for track in tracks:
+                if np.hypot(blob.cx - track["pos"][0], blob.cy - track["pos"][1]) < track["radius"]:
+                    track["pos"], track["last"] = (blob.cx, blob.cy), (idx, blob)
+                    track["scores"].append(s)
+                    break
+            else:
+                tracks.append({"pos": (blob.cx, blob.cy), "radius": max(blob.w, blob.h) / 2.0,
+                               "scores": [s], "last": (idx, blob)})
+    if not tracks:
+        return None
+
+    n = len(frames)
+    ranked = sorted((np.mean(t["scores"]) * min(len(t["scores"]), n) / n, i) for i, t in enumerate(tracks))
+    best_score, best_i = ranked[-1]
+    second = ranked[-2][0] if len(ranked) > 1 else 0.0
+    margin = 1.0 - second / best_score if best_score > 0 else 0.0
+    confidence = float(best_score * (0.5 + 0.5 * margin))
+
+    last_idx, blob = tracks[best_i]["last"]
+    if last_idx != n - 1:
+        confidence *= 0.5 # 目标在最后一帧里消失了：用旧位置初始化追踪器不可靠
+    side = int(np.ceil(max(blob.w, blob.h))) + 2 * BBOX_PAD
+    fh, fw = frames[-1].shape[:2]
+    x = min(max(int(round(blob.cx - side / 2.0)), 0), fw - 1)
+    y = min(max(int(round(blob.cy - side / 2.0)), 0), fh - 1)
+    bbox = (x, y, min(side, fw - x), min(side, fh - y))
+    return Acquisition(bbox, (blob.cx, blob.cy), confidence, n_candidates)
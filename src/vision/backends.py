@@ -0,0 +1,160 @@
+"""
+--- backends.py v1.0 ---
+目的：
+把“用什么算法找液滴”从 GalinstanTracker 中解耦出来。GalinstanTracker 负责搜索窗口、坐标映射与历史记忆，
+具体的感知算法由可插拔的后端完成，通过 config.json 的 tracker_backend 键选择：
+
+    csrt       OpenCV CSRT：精度最高、最慢（判别式相关滤波 + 空间可靠性图）
+    kcf        OpenCV KCF：核相关滤波，比 CSRT 快一个数量级
+    mosse      OpenCV MOSSE（legacy）：最快的相关滤波，对形变与尺度变化最敏感
+    classical  经典分割管线（CLAHE -> 双边滤波 -> 自适应阈值 -> 形态学 -> 连通域），源自 tracker-old.py，实现见 classical.py
+    background 同 classical，但分割改用背景模型的前景掩膜（抑制阴影与静态杂物），实现见 background.py
+
+后端接口（与 cv2.Tracker 同构）：
+    init(image, bbox)          bbox 为 (x, y, w, h)，image 坐标系
+    update(image) -> (ok, bbox)
+    params                     视觉参数字典（C / kernel / min_area / scale），由 GalinstanTracker 整体替换
+    stateful                   True 表示内部状态依赖坐标系，搜索窗口移动时必须重建；False 则可随意移动窗口
+
+各后端在不同实验台上的速度与精度差别很大，用 src/vision/benchmark.py 在录像上实测后再选择。
+"""
+
+import cv2
+
+from src.vision.classical import ClassicalDetector
+from src.vision.background import BackgroundDetector
+
+DEFAULT_BACKEND = "csrt"
+DEFAULT_PARAMS = {"C": 6, "kernel": 7, "min_area": 300, "scale": 1.0}
+
+_REGISTRY = {}
+
+
+def register_backend(name):
+    """类装饰器：把后端登记到注册表，键名即 config.json 中 tracker_backend 的取值"""
+    def decorator(cls):
+        cls.name = name
+        _REGISTRY[name] = cls
+        return cls
+    return decorator
+
+
+def backend_names():
+    """所有已登记的后端（无论当前 OpenCV 构建是否支持）"""
+    return list(_REGISTRY)
+
+
+def available_backends():
+    """当前 OpenCV 构建实际可用的后端"""
+    return [name for name, cls in _REGISTRY.items() if cls.available()]
+
+
+def create_backend(name=DEFAULT_BACKEND, params=None):
+    cls = _REGISTRY.get(name)
+    if cls is None:
+        raise ValueError(f"未知的追踪后端 {name!r}，可选: {', '.join(_REGISTRY)}")
+    if not cls.available():
+        raise ValueError(f"当前 OpenCV 构建不支持 {name!r} 后端（需要 opencv-contrib-python）")
+    return cls(params)
+
+
+class OpenCVBackend:
+    """cv2.Tracker 的薄包装；子类只需给出工厂函数名"""
+    factories = ()  # 依次尝试的 (模块路径, 函数名)
+    stateful = True
+
+    def __init__(self, params=None):
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self._tracker = self._factory()()
+
+    @classmethod
+    def _factory(cls):
+        for module_path, func in cls.factories:
+            module = cv2
+            for part in module_path.split(".")[1:]:
+                module = getattr(module, part, None)
+            fn = getattr(module, func, None) if module is not None else None
+            if fn is not None:
+                return fn
+        return None
+
+    @classmethod
+    def available(cls):
+        return cls._factory() is not None
+
+    def init(self, image, bbox):
+        self._tracker.init(image, tuple(int(v) for v in bbox))
+
+    def update(self, image):
+        return self._tracker.update(image)
+
+
+@register_backend("csrt")
+class CSRTBackend(OpenCVBackend):
+    factories = (("cv2", "TrackerCSRT_create"), ("cv2.legacy", "TrackerCSRT_create"))
+
+
+@register_backend("kcf")
+class KCFBackend(OpenCVBackend):
+    factories = (("cv2", "TrackerKCF_create"), ("cv2.legacy", "TrackerKCF_create"))
+
+
+@register_backend("mosse")
+class MOSSEBackend(OpenCVBackend):
+    factories = (("cv2.legacy", "TrackerMOSSE_create"), ("cv2", "TrackerMOSSE_create"))
+
+
+@register_backend("classical")
+class ClassicalBackend:
+    """
+    逐帧检测而非跟踪：每帧用 ClassicalDetector 独立分割，再用“离上次位置最近”的运动连续性约束选出目标。
+    没有跨帧的内部模型，因此 stateful=False，搜索窗口可以每帧随液滴移动。
+    """
+    stateful = False
+    max_jump = 150     # 运动连续性约束：单帧位移上限 (px)
+
+    def __init__(self, params=None):
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.detector = ClassicalDetector(self.params)
+        self.last = None # 上一次的质心（image 坐标系）
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def init(self, image, bbox):
+        x, y, w, h = bbox
+        self.last = (x + w / 2.0, y + h / 2.0)
+
+    def _sync(self):
+        # params 由 GalinstanTracker 整体替换，这里只同步引用，不复制
+        self.detector.params = self.params
+        self.detector.scale = self.params.get("scale", 1.0)
+
+    def update(self, image):
+        self._sync()
+        blob = self.detector.detect(image, near=self.last, max_jump=self.max_jump)
+        if blob is None:
+            return False, None
+        self.last = (blob.cx, blob.cy)
+        # 以像素质心为中心给出目标框，保证调用方用框中心还原出的就是质心
+        return True, (blob.cx - blob.w / 2.0, blob.cy - blob.h / 2.0, blob.w, blob.h)
+
+
+@register_backend("background")
+class BackgroundBackend(ClassicalBackend):
+    """
+    GalinstanTracker 每帧把它维护的背景模型与搜索窗口左上角写入 background / origin，
+    检测在前景掩膜上进行；模型尚未建立（bg_learning_rate=0）时退回 classical 的自适应阈值分割。
+    """
+
+    def __init__(self, params=None):
+        super().__init__(params)
+        self.detector = BackgroundDetector(None, self.params)
+        self.background = None
+        self.origin = (0, 0)
+
+    def _sync(self):
+        self.detector.params = self.params
+        self.detector.model = self.background
+        self.detector.origin = self.origin
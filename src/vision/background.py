@@ -0,0 +1,208 @@
+"""
+--- background.py v1.0 ---
+目的：
+经典分割管线被 CSRT 取代的原因是阴影与反光：自适应阈值只看局部灰度，液滴的影子、电极边缘、
+培养皿上的反光都和液滴一样“比周围暗”。BackgroundModel 改为学习培养皿的静态场景（电极、固定阴影、
+不均匀照明都算背景），只把“与背景不一样”的像素交给检测：
+
+1. 模型：每个像素的 BGR 均值与灰度方差（float32），标定时用第一帧初始化——
+   液滴所在的目标框（连同外扩一个框边长的邻域，液滴自己的影子多半也在里面）先用再外一圈的中值颜色填平
+   （方差取环带的稳健方差），避免把液滴本身与它的影子学成背景；
+2. 前景：与背景均值的色差超过 k_sigma 倍标准差（方差有下限 min_sigma²，防止过于平静的像素对噪声过敏）；
+3. 阴影抑制：前景像素中，三个通道的亮度比 I / B 都落在 shadow_range 之内、且彼此相差不超过 shadow_chroma
+   （整体变暗但色度不变）的判为阴影，不算前景；液态金属比背景暗得多（亮度比约 0.3），不会被误判；
+   阴影判定只在前景像素上计算，代价与前景面积成正比；
+4. 学习：learn() 只更新给定 ROI（通常是搜索窗口）内的像素，目标框（外扩）内不学习，
+   因此液滴在原地停多久都不会被吸收进背景；当前判为阴影的像素均值只以 1/10 的速率学习，
+   液滴的影子扫过时不会被学成背景；其余前景（静态场景的真实变化、填平区域里的“鬼影”）照常学习、很快被吸收，
+   前景像素的方差不学习；额外每帧轮流刷新整帧的 1/refresh_bands 条带，
+   窗口之外的区域也能跟上缓慢的光照漂移；每帧代价 O(ROI 像素数)；
+5. 线程：learn() 只在追踪线程中调用；其他线程（后台重新捕获）使用 copy() 得到的独立副本，
+   foreground() 的中间结果写入调用方提供的缓冲区，与追踪线程之间没有共享的可写状态。
+
+BackgroundDetector 是以前景掩膜代替“CLAHE -> 双边滤波 -> 自适应阈值”的 ClassicalDetector，
+连通域过滤、候选排序与 detect() 的运动连续性约束完全复用。
+"""
+
+import copy
+
+import cv2
+import numpy as np
+
+from src.vision.classical import ClassicalDetector
+
+
+class BackgroundModel:
+    def __init__(self, learning_rate=0.02, k_sigma=4.0, min_sigma=6.0, shadow_range=(0.45, 0.95),
+                 shadow_chroma=0.08, exclude_pad=8, refresh_bands=16, shadow_rate=0.1):
+        self.learning_rate = learning_rate
+        self.k_sigma = k_sigma
+        self.min_var = float(min_sigma) ** 2
+        self.shadow_range = shadow_range
+        self.shadow_chroma = shadow_chroma
+        self.exclude_pad = exclude_pad     # 目标框每边外扩多少像素不学习
+        self.refresh_bands = refresh_bands
+        self.shadow_rate = shadow_rate # 阴影像素均值的学习率相对 learning_rate 的倍数
+
+        self.mean = None # (H, W, 3) float32
+        self.var = None  # (H, W) float32
+        self._band = 0
+        self._buffers = {}
+
+    def _buffer(self, name, shape, dtype=np.float32):
+        key = (name, shape)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = np.empty(shape, dtype)
+        return buf
+
+    @property
+    def ready(self):
+        return self.mean is not None
+
+    def copy(self):
+        """独立副本：均值 / 方差各拷贝一份，缓冲区不共享；交给其他线程只读使用"""
+        other = copy.copy(self)
+        other.mean = None if self.mean is None else self.mean.copy()
+        other.var = None if self.var is None else self.var.copy()
+        other._buffers = {}
+        return other
+
+    def reset(self, frame, exclude=None):
+        """用一帧初始化整个模型；exclude 为液滴目标框 (x, y, w, h)，连同邻域以更外一圈的中值颜色填平"""
+        self.mean = frame.astype(np.float32)
+        self.var = np.full(frame.shape[:2], self.min_var, np.float32)
+        if exclude is not None:
+            fh, fw = frame.shape[:2]
+            x, y, w, h = (int(v) for v in exclude)
+            x, y, w, h = x - w, y - h, 3 * w, 3 * h
+            m = max(w, h) // 4
+            rx0, ry0, rx1, ry1 = max(x - m, 0), max(y - m, 0), min(x + w + m, fw), min(y + h + m, fh)
+            ring = np.ones((ry1 - ry0, rx1 - rx0), bool)
+            ring[max(y - ry0, 0):y - ry0 + h, max(x - rx0, 0):x - rx0 + w] = False
+            around = frame[ry0:ry1, rx0:rx1][ring].astype(np.float32)
+            self.mean[max(y, 0):y + h, max(x, 0):x + w] = np.median(around, axis=0)
+            # 填平区域没有真实纹理：方差取环带灰度的稳健方差（MAD，不受环带里的阴影与电极边缘影响），
+            # 纹理噪声不至于被当成前景
+            gray = around.mean(axis=1)
+            sigma = 1.4826 * float(np.median(np.abs(gray - np.median(gray))))
+            self.var[max(y, 0):y + h, max(x, 0):x + w] = max(sigma * sigma, self.min_var)
+
+    def _classify(self, img, mean, var, diff, d2, fg):
+        """
+        img / mean 为 float32 (h, w, 3)，结果写入缓冲区：diff = img - mean，d2 = 三通道平方差之和，
+        fg = 与背景不同的像素；返回 fg 中被判为阴影的像素坐标 (ys, xs)
+        """
+        np.subtract(img, mean, out=diff)
+        np.einsum("ijk,ijk->ij", diff, diff, out=d2)
+        np.greater(d2, var * (3.0 * self.k_sigma ** 2), out=fg)
+        ys, xs = np.nonzero(fg)
+        if not len(ys):
+            return ys, xs
+        ratio = img[ys, xs] / (mean[ys, xs] + 1.0)
+        r = ratio.mean(axis=1)
+        spread = np.abs(ratio - r[:, None]).max(axis=1)
+        lo, hi = self.shadow_range
+        shadow = (r >= lo) & (r <= hi) & (spread <= self.shadow_chroma)
+        return ys[shadow], xs[shadow]
+
+    # --- 前景 ---
+    def foreground(self, image, origin=(0, 0), buffer=None, kernel=None):
+        """
+        image 为整帧中以 origin=(x0, y0) 为左上角的一块（可以是整帧），返回同尺寸的 uint8 前景掩膜。
+        buffer(name, shape, dtype): 中间结果缓冲区的提供者，默认使用模型自己的（仅限追踪线程）。
+        """
+        buffer = buffer or self._buffer
+        h, w = image.shape[:2]
+        x0, y0 = int(origin[0]), int(origin[1])
+        mean = self.mean[y0:y0 + h, x0:x0 + w]
+        var = self.var[y0:y0 + h, x0:x0 + w]
+
+        img = buffer("bg_img", (h, w, 3), np.float32)
+        np.copyto(img, image, casting="unsafe")
+        fg = buffer("bg_fg", (h, w), np.bool_)
+        ys, xs = self._classify(img, mean, var, buffer("bg_diff", (h, w, 3), np.float32),
+                                buffer("bg_d2", (h, w), np.float32), fg)
+        mask = buffer("bg_mask", (h, w), np.uint8)
+        np.multiply(fg, 255, out=mask, casting="unsafe")
+        mask[ys, xs] = 0
+        if kernel is not None:
+            opened = buffer("bg_open", (h, w), np.uint8)
+            cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel, dst=opened)
+            return opened
+        return mask
+
+    # --- 学习 ---
+    def learn(self, frame, roi=None, exclude=None):
+        """
+        更新 roi=(x0, y0, x1, y1)（默认整帧）内的背景，并轮流刷新整帧的一条条带；
+        exclude 为液滴目标框 (x, y, w, h)，外扩 exclude_pad 后不参与学习。
+        """
+        fh, fw = frame.shape[:2]
+        rois = [roi or (0, 0, fw, fh)]
+        if self.refresh_bands > 1:
+            band = -(-fh // self.refresh_bands)
+            y = self._band * band
+            rois.append((0, y, fw, min(y + band, fh)))
+            self._band = (self._band + 1) % self.refresh_bands
+
+        saved = None
+        if exclude is not None:
+            p = self.exclude_pad
+            x, y, w, h = (int(v) for v in exclude)
+            ex0, ey0, ex1, ey1 = max(x - p, 0), max(y - p, 0), min(x + w + p, fw), min(y + h + p, fh)
+            saved = (ex0, ey0, ex1, ey1, self.mean[ey0:ey1, ex0:ex1].copy(), self.var[ey0:ey1, ex0:ex1].copy())
+
+        for x0, y0, x1, y1 in rois:
+            self._update(frame[y0:y1, x0:x1], self.mean[y0:y1, x0:x1], self.var[y0:y1, x0:x1])
+
+        if saved is not None:
+            ex0, ey0, ex1, ey1, mean, var = saved
+            self.mean[ey0:ey1, ex0:ex1] = mean
+            self.var[ey0:ey1, ex0:ex1] = var
+
+    def _update(self, image, mean, var):
+        """
+        指数滑动平均：mean += a (I - mean)；var += a (|I - mean|² / 3 - var)，方差不低于 min_var。
+        阴影像素的 a 乘以 shadow_rate；前景像素的方差不更新。
+        """
+        h, w = image.shape[:2]
+        if h == 0 or w == 0:
+            return
+        a = self.learning_rate
+        img = self._buffer("learn_img", (h, w, 3))
+        np.copyto(img, image, casting="unsafe")
+        diff = self._buffer("learn_diff", (h, w, 3))
+        d2 = self._buffer("learn_d2", (h, w))
+        fg = self._buffer("learn_fg", (h, w), np.bool_)
+        ys, xs = self._classify(img, mean, var, diff, d2, fg)
+
+        rate = self._buffer("learn_rate", (h, w))
+        rate.fill(a)
+        rate[ys, xs] = a * self.shadow_rate
+        diff *= rate[:, :, None]
+        mean += diff
+
+        np.logical_not(fg, out=fg)
+        np.multiply(fg, a, out=rate) # 方差只在背景像素上学习
+        d2 *= 1.0 / 3.0
+        d2 -= var
+        d2 *= rate
+        var += d2
+        np.maximum(var, self.min_var, out=var)
+
+
+class BackgroundDetector(ClassicalDetector):
+    """以背景模型的前景掩膜代替自适应阈值的 ClassicalDetector；origin 为传入画面在整帧中的左上角"""
+
+    def __init__(self, model, params=None, **kwargs):
+        kwargs["scale"] = 1.0 # 前景掩膜逐像素计算，降采样不再必要
+        super().__init__(params, **kwargs)
+        self.model = model
+        self.origin = (0, 0)
+
+    def segment(self, image, scale=1.0):
+        if self.model is None or not self.model.ready or image.ndim != 3:
+            return super().segment(image, scale)
+        k = max(int(self.params["kernel"]), 1)
+        return self.model.foreground(image, self.origin, self._buffer, self._kernel(k))
@@ -0,0 +1,215 @@
+"""
+--- benchmark.py v1.0 ---
+目的：
+在同一段录像上逐一运行所有追踪后端（以及各自开 / 关搜索窗口、开 / 关光流混合模式），报告每帧耗时与精度，
+选出“满足精度要求的最快后端”，必要时直接写入 config.json。每个实验台的光照、液滴大小、帧率都不同，
+后端的取舍应当以实测为准。
+
+用法：
+    python -m src.vision.benchmark                                   # 合成录像（真值已知）
+    python -m src.vision.benchmark --video data/captures_x/1_Pre.avi --bbox 300,220,40,40
+    python -m src.vision.benchmark --video run.avi --truth run_truth.csv --box-size 40
+    python -m src.vision.benchmark --precision 1.5 --apply           # 把推荐结果写入 config.json
+
+精度的参照：
+- 合成录像或提供了 --truth（CSV：frame,x,y）时，与真值比较；
+- 否则以“整帧 CSRT”的输出为参照，报告的是与参照的偏差（适合比较快速后端相对 CSRT 的损失）。
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(BASE_DIR)
+
+from src.vision.tracker import GalinstanTracker
+from src.vision.backends import available_backends
+from src.engine.config_service import CONFIG_PATH, write_config_atomic
+
+
+def load_video(path, limit):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f"❌ 无法打开录像: {path}")
+    frames = []
+    while len(frames) < limit:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def load_truth(path):
+    truth = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            truth[int(row["frame"])] = (float(row["x"]), float(row["y"]))
+    return truth
+
+
+def synthetic_capture(n, size=(640, 480)):
+    """液滴沿利萨如曲线运动的合成录像，返回 (frames, truth)"""
+    from src.drivers.synthetic import SyntheticCamera
+    step = {"k": 0}
+
+    def trajectory(t):
+        step["k"] += 1
+        a = step["k"] / 30.0
+        return (size[0] / 2 + 180 * np.sin(a * 1.3), size[1] / 2 + 90 * np.sin(a * 2.1))
+
+    cam = SyntheticCamera(size=size, fps=0, trajectory=trajectory)
+    frames = [cam.read()[1] for _ in range(n)]
+    truth = {i: (g.x, g.y) for i, g in enumerate(cam.truth)}
+    return frames, truth
+
+
+def run_backend(frames, bbox, backend, search_window, hybrid=False):
+    """逐帧运行一个后端，返回 (每帧耗时数组, 每帧位置列表)"""
+    tracker = GalinstanTracker(backend=backend, search_window=search_window)
+    tracker.hybrid = hybrid
+    tracker.calibrate(frames[0], bbox)
+    costs = np.zeros(len(frames) - 1)
+    positions = []
+    for i, frame in enumerate(frames[1:]):
+        t0 = time.perf_counter()
+        pos = tracker.process_frame(frame)
+        costs[i] = time.perf_counter() - t0
+        positions.append(pos)
+    return costs, positions
+
+
+def score(costs, positions, reference):
+    """reference: {帧序号: (x, y)}，帧序号从 1 开始对应 frames[1:]"""
+    errors = []
+    locked = 0
+    for i, pos in enumerate(positions, start=1):
+        if pos is None:
+            continue
+        locked += 1
+        if i in reference:
+            rx, ry = reference[i]
+            errors.append(np.hypot(pos[0] - rx, pos[1] - ry))
+    errors = np.array(errors) if errors else np.array([np.inf])
+    ms = costs * 1000
+    finite = np.isfinite(errors).all()
+    return {
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "lock_rate": locked / max(len(positions), 1),
+        "err_median_px": float(np.median(errors)) if finite else float("inf"),
+        "err_p95_px": float(np.percentile(errors, 95)) if finite else float("inf"),
+    }
+
+
+def recommend(results, precision, min_lock):
+    """满足精度与锁定率要求的候选中，平均耗时最小者"""
+    ok = [(r["mean_ms"], key) for key, r in results.items()
+          if r["err_p95_px"] <= precision and r["lock_rate"] >= min_lock]
+    return min(ok)[1] if ok else None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="追踪后端基准：每帧耗时与精度")
+    parser.add_argument("--video", help="录像文件；省略时使用真值已知的合成录像")
+    parser.add_argument("--bbox", help="首帧目标框 x,y,w,h（录像模式；有 --truth 时可省略）")
+    parser.add_argument("--truth", help="真值 CSV（列：frame,x,y，frame 从 0 开始）")
+    parser.add_argument("--box-size", type=int, default=40, help="由真值生成首帧目标框时的边长 (px)；MOSSE 需要更多背景上下文")
+    parser.add_argument("--frames", type=int, default=300, help="最多使用的帧数")
+    parser.add_argument("--backends", help="逗号分隔的后端列表，默认当前 OpenCV 可用的全部后端")
+    parser.add_argument("--precision", type=float, default=2.0, help="精度要求：误差 p95 上限 (px)")
+    parser.add_argument("--min-lock", type=float, default=0.95, help="锁定率下限")
+    parser.add_argument("--output", help="把完整结果写入 JSON 文件")
+    parser.add_argument("--no-hybrid", action="store_true", help="不测试光流混合模式（vis_hybrid）")
+    parser.add_argument("--apply", action="store_true", help="把推荐的后端、搜索窗口与混合模式开关写入 config.json")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.video:
+        frames = load_video(args.video, args.frames)
+        truth = load_truth(args.truth) if args.truth else None
+        if truth is None or 0 not in truth:
+            if not args.bbox:
+                raise SystemExit("❌ 录像模式需要 --bbox，或提供含第 0 帧的 --truth")
+    else:
+        frames, truth = synthetic_capture(args.frames)
+
+    if args.bbox:
+        bbox = tuple(int(v) for v in args.bbox.split(","))
+    else:
+        x, y = truth[0]
+        bbox = (int(x - args.box_size / 2), int(y - args.box_size / 2), args.box_size, args.box_size)
+
+    if len(frames) < 2:
+        raise SystemExit("❌ 录像帧数不足")
+    backends = args.backends.split(",") if args.backends else available_backends()
+
+    if truth is None:
+        # 没有真值：以整帧 CSRT 为参照
+        print("ℹ️ 未提供真值，以整帧 CSRT 的输出为参照")
+        try:
+            _, ref_positions = run_backend(frames, bbox, "csrt", False)
+        except Exception as e:
+            raise SystemExit(f"❌ 参照后端 CSRT 不可用 ({type(e).__name__}: {e})，请提供 --truth")
+        reference = {i: tuple(p) for i, p in enumerate(ref_positions, start=1) if p is not None}
+    else:
+        reference = truth
+
+    print(f"🎞️ {len(frames)} 帧 {frames[0].shape[1]}x{frames[0].shape[0]} | 首帧目标框 {bbox}")
+    results = {}
+    unavailable = {} # 组合 -> 失败原因：某个 OpenCV 构建缺少某个追踪器时，只影响它自己那几行
+    modes = [(w, h) for h in ((False,) if args.no_hybrid else (False, True)) for w in (False, True)]
+    for backend in backends:
+        for window, hybrid in modes:
+            key = backend + ("+window" if window else "") + ("+hybrid" if hybrid else "")
+            try:
+                costs, positions = run_backend(frames, bbox, backend, window, hybrid)
+            except Exception as e:
+                unavailable[key] = f"{type(e).__name__}: {e}"
+                continue
+            results[key] = dict(score(costs, positions, reference), backend=backend,
+                                search_window=window, hybrid=hybrid)
+
+    print(f"\n   {'backend':<25}{'mean':>8}{'p50':>8}{'p99':>8}{'lock':>8}{'err50':>8}{'err95':>8}")
+    for key, r in sorted(results.items(), key=lambda kv: kv[1]["mean_ms"]):
+        print(f"   {key:<25}{r['mean_ms']:>8.2f}{r['p50_ms']:>8.2f}{r['p99_ms']:>8.2f}"
+              f"{r['lock_rate'] * 100:>7.1f}%{r['err_median_px']:>8.2f}{r['err_p95_px']:>8.2f}")
+    for key, error in unavailable.items():
+        print(f"   {key:<25}{'不可用':>8}  {error}")
+    print("   (耗时单位 ms，误差单位 px)")
+
+    best = recommend(results, args.precision, args.min_lock)
+    if best is None:
+        print(f"\n⚠️ 没有后端满足 p95 误差 ≤ {args.precision}px 且锁定率 ≥ {args.min_lock:.0%}")
+    else:
+        print(f"\n🏁 推荐: {best}（p95 误差 ≤ {args.precision}px 的后端中最快）")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"recommended": best, "results": results, "unavailable": unavailable}, f, indent=4)
+    if args.apply and best is not None:
+        cfg = {}
+        if os.path.exists(CONFIG_PATH):
+            with open(CONFIG_PATH, "r") as f:
+                cfg = json.load(f)
+        cfg.update(tracker_backend=results[best]["backend"], vis_search_window=int(results[best]["search_window"]),
+                   vis_hybrid=int(results[best]["hybrid"]))
+        write_config_atomic(CONFIG_PATH, cfg)
+        print(f"💾 已写入 {CONFIG_PATH}，运行中的引擎将在下一次轮询时切换")
+    return best
+
+
+if __name__ == "__main__":
+    main()
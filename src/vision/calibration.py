@@ -0,0 +1,277 @@
+"""
+--- calibration.py v1.0 ---
+目的：
+控制链路原本全部以原始像素为单位：TARGET_X = 320.0、旧版 _find_blob 的 150px 跳变门限、
+PhysicsBrain 的 PID 增益都和“这台相机、这个焦距、这个高度”绑死，换一台相机或挪一下支架就要重新调参，
+而且镜头畸变让画面边缘的 1px 比中心的 1px 更长。Calibration 把像素换算成培养皿平面上的毫米：
+
+1. 标定（离线，一次）：
+   - 棋盘格：若干张棋盘格照片 -> cv2.calibrateCamera 得到内参 K 与畸变系数；
+     最后一张照片里的棋盘格平放在培养皿上，它的角点（去畸变后）与棋盘格的毫米坐标求单应矩阵 H；
+     照片少于 min_views_lens 张时不估计畸变，只求单应矩阵；
+   - 培养皿标记：已知毫米坐标的 4 个以上标记点（电极角、刻度），直接求单应矩阵（可复用已有的镜头参数）；
+2. 查找表：标定时对整幅画面的每个像素做一次 去畸变 + 单应变换，
+   得到 undistort_map（原始像素 -> 去畸变像素）与 mm_map（原始像素 -> 毫米），两张 (H, W, 2) float32 表，
+   连同 K / 畸变系数 / H 一起存成 .npz（默认 data/calibration.npz）；
+3. 运行期：只换算追踪点（或目标框的四个角），在查找表上双线性插值，每个点约 20µs；
+   从不对整帧做 cv2.remap —— 追踪仍然在原始画面上进行，不引入任何逐帧开销；
+   画面之外的点（外推）退回解析公式；速度按查找表的局部雅可比矩阵换算。
+
+命令行：
+    python -m src.vision.calibration board_*.png --pattern 9x6 --square 2.5
+    python -m src.vision.calibration board_*.png --plane dish.png
+    python -m src.vision.calibration --markers markers.json --size 640x480
+"""
+
+import argparse
+import glob
+import json
+import os
+
+import cv2
+import numpy as np
+
+DEFAULT_PATH = "data/calibration.npz"
+
+
+def undistort_points(pts, camera_matrix, dist_coeffs):
+    """原始像素 (N, 2) -> 去畸变像素 (N, 2)，解析公式"""
+    pts = np.asarray(pts, np.float64).reshape(-1, 1, 2)
+    if not np.any(dist_coeffs):
+        return pts.reshape(-1, 2)
+    return cv2.undistortPoints(pts, camera_matrix, dist_coeffs, P=camera_matrix).reshape(-1, 2)
+
+
+class Calibration:
+    def __init__(self, size, camera_matrix, dist_coeffs, homography, undistort_map=None, mm_map=None):
+        self.size = (int(size[0]), int(size[1])) # (w, h)
+        self.camera_matrix = np.asarray(camera_matrix, np.float64)
+        self.dist_coeffs = np.asarray(dist_coeffs, np.float64).ravel()
+        self.homography = np.asarray(homography, np.float64) # 去畸变像素 -> 毫米
+        self._inverse = np.linalg.inv(self.homography)
+        if undistort_map is None or mm_map is None:
+            undistort_map, mm_map = self._build_maps()
+        self.undistort_map = undistort_map # (H, W, 2) float32
+        self.mm_map = mm_map               # (H, W, 2) float32
+
+    # --- 查找表 ---
+    def _undistort(self, pts):
+        return undistort_points(pts, self.camera_matrix, self.dist_coeffs)
+
+    def _analytic_mm(self, pts):
+        return cv2.perspectiveTransform(self._undistort(pts).reshape(-1, 1, 2), self.homography).reshape(-1, 2)
+
+    def _build_maps(self):
+        w, h = self.size
+        xs, ys = np.meshgrid(np.arange(w, dtype=np.float64), np.arange(h, dtype=np.float64))
+        grid = np.stack([xs.ravel(), ys.ravel()], axis=1)
+        undist = self._undistort(grid)
+        mm = cv2.perspectiveTransform(undist.reshape(-1, 1, 2), self.homography).reshape(-1, 2)
+        return undist.reshape(h, w, 2).astype(np.float32), mm.reshape(h, w, 2).astype(np.float32)
+
+    def _lookup(self, table, pts, fallback):
+        """在查找表上双线性插值；落在画面之外的点交给 fallback（解析公式）"""
+        pts = np.asarray(pts, np.float64).reshape(-1, 2)
+        w, h = self.size
+        x, y = pts[:, 0], pts[:, 1]
+        inside = (x >= 0) & (y >= 0) & (x <= w - 1) & (y <= h - 1)
+        out = np.empty_like(pts)
+        if inside.any():
+            xi, yi = x[inside], y[inside]
+            x0 = np.minimum(xi.astype(np.intp), w - 2)
+            y0 = np.minimum(yi.astype(np.intp), h - 2)
+            fx, fy = (xi - x0)[:, None], (yi - y0)[:, None]
+            top = table[y0, x0] * (1 - fx) + table[y0, x0 + 1] * fx
+            bottom = table[y0 + 1, x0] * (1 - fx) + table[y0 + 1, x0 + 1] * fx
+            out[inside] = top * (1 - fy) + bottom * fy
+        if not inside.all():
+            out[~inside] = fallback(pts[~inside])
+        return out
+
+    # --- 运行期换算 ---
+    def to_mm_points(self, pts):
+        """原始像素 (N, 2) -> 培养皿平面毫米 (N, 2)"""
+        return self._lookup(self.mm_map, pts, self._analytic_mm)
+
+    def to_mm(self, x, y):
+        p = self.to_mm_points([(x, y)])[0]
+        return float(p[0]), float(p[1])
+
+    def undistort(self, x, y):
+        """原始像素 -> 去畸变像素"""
+        p = self._lookup(self.undistort_map, [(x, y)], self._undistort)[0]
+        return float(p[0]), float(p[1])
+
+    def to_pixel(self, x_mm, y_mm):
+        """毫米 -> 原始像素（用于在画面上标出毫米单位的目标）"""
+        u = cv2.perspectiveTransform(np.array([[[x_mm, y_mm]]], np.float64), self._inverse).reshape(2)
+        if not self.dist_coeffs.any():
+            return float(u[0]), float(u[1])
+        # 去畸变像素 -> 归一化相机坐标 -> 按畸变模型投影回原始像素
+        k = self.camera_matrix
+        xn, yn = (u[0] - k[0, 2]) / k[0, 0], (u[1] - k[1, 2]) / k[1, 1]
+        p, _ = cv2.projectPoints(np.array([[xn, yn, 1.0]]), np.zeros(3), np.zeros(3), k, self.dist_coeffs)
+        return float(p[0, 0, 0]), float(p[0, 0, 1])
+
+    def jacobian(self, x, y, step=0.5):
+        """(x, y) 处 d(mm) / d(px) 的 2x2 雅可比矩阵，中心差分"""
+        p = self.to_mm_points([(x + step, y), (x - step, y), (x, y + step), (x, y - step)])
+        return np.column_stack([(p[0] - p[1]) / (2 * step), (p[2] - p[3]) / (2 * step)])
+
+    def velocity_to_mm(self, x, y, vx, vy):
+        """(x, y) 处的像素速度 -> 毫米速度"""
+        v = self.jacobian(x, y) @ np.array([vx, vy], np.float64)
+        return float(v[0]), float(v[1])
+
+    def bbox_to_mm(self, bbox):
+        """目标框 (x, y, w, h) 的四个角换算到毫米后的外接矩形 (x, y, w, h)"""
+        x, y, w, h = bbox
+        p = self.to_mm_points([(x, y), (x + w, y), (x, y + h), (x + w, y + h)])
+        lo, hi = p.min(axis=0), p.max(axis=0)
+        return float(lo[0]), float(lo[1]), float(hi[0] - lo[0]), float(hi[1] - lo[1])
+
+    def scale_at(self, x, y):
+        """(x, y) 处 1px 对应的毫米数（雅可比行列式的平方根）"""
+        return float(np.sqrt(abs(np.linalg.det(self.jacobian(x, y)))))
+
+    # --- 存取 ---
+    def save(self, path=DEFAULT_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, size=np.array(self.size), camera_matrix=self.camera_matrix,
+                            dist_coeffs=self.dist_coeffs, homography=self.homography,
+                            undistort_map=self.undistort_map, mm_map=self.mm_map)
+
+    @classmethod
+    def load(cls, path=DEFAULT_PATH):
+        with np.load(path) as d:
+            return cls(tuple(d["size"]), d["camera_matrix"], d["dist_coeffs"], d["homography"],
+                       d["undistort_map"], d["mm_map"])
+
+
+def default_camera_matrix(size):
+    """没有镜头标定时的内参：焦距取长边，主点取画面中心（畸变为 0 时它只影响 undistortPoints 的中间量）"""
+    w, h = size
+    f = float(max(w, h))
+    return np.array([[f, 0.0, w / 2.0], [0.0, f, h / 2.0], [0.0, 0.0, 1.0]])
+
+
+def board_points(pattern, square_mm):
+    """棋盘格内角点的毫米坐标 (N, 2)，原点为第一个角点，与 findChessboardCorners 的角点顺序一致"""
+    cols, rows = pattern
+    xs, ys = np.meshgrid(np.arange(cols), np.arange(rows))
+    return np.stack([xs.ravel(), ys.ravel()], axis=1).astype(np.float64) * square_mm
+
+
+def from_correspondences(size, views, object_mm, camera_matrix=None, dist_coeffs=None, min_views_lens=3):
+    """
+    views: 每张照片里检测到的角点 (N, 2) 的列表，全部对应同一组平面毫米坐标 object_mm (N, 2)；
+    最后一张照片中的平面即培养皿平面。照片数 >= min_views_lens 且未给定镜头参数时估计内参与畸变。
+    返回 (Calibration, 重投影误差 px)；只求单应矩阵时误差为单应变换的残差。
+    """
+    object_mm = np.asarray(object_mm, np.float64).reshape(-1, 2)
+    views = [np.asarray(v, np.float64).reshape(-1, 2) for v in views]
+    error = None
+    if camera_matrix is None and len(views) >= min_views_lens:
+        obj = np.hstack([object_mm, np.zeros((len(object_mm), 1))]).astype(np.float32)
+        error, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(
+            [obj] * len(views), [v.astype(np.float32) for v in views], tuple(size), None, None)
+    if camera_matrix is None:
+        camera_matrix, dist_coeffs = default_camera_matrix(size), np.zeros(5)
+    if dist_coeffs is None:
+        dist_coeffs = np.zeros(5)
+
+    undist = undistort_points(views[-1], camera_matrix, dist_coeffs)
+    homography, _ = cv2.findHomography(undist, object_mm, 0)
+    if homography is None:
+        raise ValueError("标定点退化（共线或重合），无法求单应矩阵")
+    cal = Calibration(size, camera_matrix, dist_coeffs, homography)
+    if error is None:
+        residual = cal.to_mm_points(views[-1]) - object_mm
+        error = float(np.sqrt((residual ** 2).sum(axis=1).mean()) / cal.scale_at(size[0] / 2.0, size[1] / 2.0))
+    return cal, float(error)
+
+
+def from_checkerboard(images, pattern=(9, 6), square_mm=2.5, min_views_lens=3):
+    """
+    images: BGR 或灰度照片的列表（最后一张的棋盘格平放在培养皿上）；返回 (Calibration, 误差, 使用的照片数)。
+    只用于估计镜头的照片检测不到棋盘格时跳过；最后一张检测不到时报错——否则单应矩阵会悄悄落在别的照片上。
+    """
+    views, size = [], None
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.01)
+    for i, image in enumerate(images):
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        size = (gray.shape[1], gray.shape[0])
+        found, corners = cv2.findChessboardCorners(gray, tuple(pattern))
+        if not found:
+            if i == len(images) - 1:
+                raise ValueError(f"培养皿平面照片（最后一张）没有检测到 {pattern[0]}x{pattern[1]} 棋盘格")
+            continue
+        corners = cv2.cornerSubPix(gray, corners, (5, 5), (-1, -1), criteria)
+        views.append(corners.reshape(-1, 2))
+    cal, error = from_correspondences(size, views, board_points(pattern, square_mm), min_views_lens=min_views_lens)
+    return cal, error, len(views)
+
+
+def from_markers(size, pixel_points, mm_points, lens=None):
+    """培养皿标记点：pixel_points / mm_points 各 (N, 2)，N >= 4；lens 为已有的 Calibration（复用其镜头参数）"""
+    if len(pixel_points) < 4:
+        raise ValueError("至少需要 4 个标记点")
+    k, d = (lens.camera_matrix, lens.dist_coeffs) if lens is not None else (None, None)
+    return from_correspondences(size, [pixel_points], mm_points, camera_matrix=k, dist_coeffs=d)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="像素 -> 毫米标定：生成去畸变与毫米查找表")
+    parser.add_argument("images", nargs="*",
+                        help="棋盘格照片（支持通配符，按参数顺序排列，同一通配符内按文件名排序）；"
+                             "未给 --plane 时最后一张须平放在培养皿上")
+    parser.add_argument("--plane", help="棋盘格平放在培养皿上的那张照片（求单应矩阵），给定时排在所有照片之后")
+    parser.add_argument("--pattern", default="9x6", help="棋盘格内角点数 列x行")
+    parser.add_argument("--square", type=float, default=2.5, help="棋盘格方格边长 (mm)")
+    parser.add_argument("--markers", help="标记点 JSON：{\"pixel\": [[x, y], ...], \"mm\": [[X, Y], ...]}")
+    parser.add_argument("--size", default="640x480", help="标记点模式下的画面尺寸 宽x高")
+    parser.add_argument("--lens", help="标记点模式下复用此前棋盘格标定的镜头参数 (.npz)")
+    parser.add_argument("--out", default=DEFAULT_PATH, help="输出文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.markers:
+        with open(args.markers) as f:
+            spec = json.load(f)
+        size = tuple(int(v) for v in args.size.lower().split("x"))
+        lens = Calibration.load(args.lens) if args.lens else None
+        cal, error = from_markers(size, spec["pixel"], spec["mm"], lens)
+        print(f"📐 标记点 {len(spec['pixel'])} 个 | 残差 {error:.3f}px")
+    else:
+        # 逐个参数展开通配符，不做全局排序：最后一张（或 --plane）是培养皿平面，顺序不能变
+        paths = [p for pattern in args.images for p in sorted(glob.glob(pattern))]
+        if args.plane:
+            paths = [p for p in paths if os.path.abspath(p) != os.path.abspath(args.plane)] + [args.plane]
+        if not paths:
+            print("❌ 没有可读取的棋盘格照片")
+            return 1
+        images = [cv2.imread(p) for p in paths]
+        if images[-1] is None:
+            print(f"❌ 培养皿平面照片读取失败: {paths[-1]}")
+            return 1
+        images = [img for img in images if img is not None]
+        pattern = tuple(int(v) for v in args.pattern.lower().split("x"))
+        try:
+            cal, error, used = from_checkerboard(images, pattern, args.square)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+        lens = "含镜头畸变" if cal.dist_coeffs.any() else "仅单应矩阵"
+        print(f"📐 棋盘格 {used}/{len(images)} 张可用（{lens}）| 重投影误差 {error:.3f}px")
+    w, h = cal.size
+    print(f"   画面中心 1px = {cal.scale_at(w / 2.0, h / 2.0) * 1000:.1f}µm | "
+          f"角落 1px = {cal.scale_at(0, 0) * 1000:.1f}µm")
+    cal.save(args.out)
+    print(f"💾 查找表 -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+"""
+--- flow.py v1.0 ---
+目的：
+CSRT 每次 update 约 15ms，是感知链路里最贵的一环，而相邻两帧之间液滴通常只移动几个像素。
+混合追踪模式下，完整追踪器只每 N 帧运行一次（或在光流质量不合格时立即运行），
+其余帧由 FlowPropagator 用稀疏 Lucas-Kanade 光流把目标框推到新位置，每帧约 0.1ms。
+
+1. 特征点：完整追踪器每次给出目标框后，在框附近小块上用 Otsu 分出液滴本体，
+   只在本体边缘的环带里取 goodFeaturesToTrack 角点（含镜面高光）——
+   框角落里的电解液背景纹理同样有强角点，但它们不随液滴运动，会把位移中位数拉向 0；
+2. 传播：金字塔 LK 前向跟踪再反向跟踪，前后向误差超过 1px 的点丢弃，
+   目标框按剩余点位移的中位数平移；存活点少于 min_points 时返回 None，由完整追踪器接手；
+3. 残差：前后向误差中位数与各点位移偏离中位数的中位数，取较大者——
+   点之间不一致（孔径问题、遮挡、形变）时残差升高；
+4. 自适应 N（interval）：
+   - 运动约束：两次完整更新之间液滴最多移动框边长的 travel 倍，N ≤ travel × 边长 / 速度；
+   - 残差约束：残差超过 max_residual 的一半就把 N 减半，否则每次完整更新后 N 加 1，直到 max_interval；
+   残差超过 max_residual 时本帧的光流结果直接作废。
+"""
+
+import cv2
+import numpy as np
+
+
+class FlowPropagator:
+    def __init__(self, max_points=16, min_points=4, max_interval=8, max_residual=0.5,
+                 travel=0.25, win_size=15, max_fb_error=1.0):
+        self.max_points = max_points
+        self.min_points = min_points
+        self.max_interval = max_interval
+        self.max_residual = max_residual # px
+        self.travel = travel             # 两次完整更新之间允许的位移（相对框边长）
+        self.win_size = (win_size, win_size)
+        self.max_fb_error = max_fb_error # px
+
+        self.interval = 1      # 当前 N：每 N 帧运行一次完整追踪器
+        self.since_full = 0    # 距上一次完整更新的帧数
+        self.points = None     # (K, 1, 2) float32，整帧坐标
+        self.bbox = None       # 浮点 (x, y, w, h)，整帧坐标
+        self.anchor = None     # 上一次完整更新的目标框
+        self.prev = None       # (上一帧的灰度小块, 小块左上角)
+        self.residual = 0.0
+        self.speed = 0.0       # px/帧
+        self.flow_frames = 0
+        self.full_frames = 0
+
+    def _patch(self, frame, bbox):
+        """目标框每边外扩一个框边长的灰度小块及其左上角（整帧坐标）"""
+        fh, fw = frame.shape[:2]
+        x, y, w, h = bbox
+        m = max(w, h)
+        x0, y0 = max(int(x - m), 0), max(int(y - m), 0)
+        x1, y1 = min(int(x + w + m) + 1, fw), min(int(y + h + m) + 1, fh)
+        patch = frame[y0:y1, x0:x1]
+        gray = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY) if patch.ndim == 3 else patch.copy()
+        return gray, (x0, y0)
+
+    def reset(self, frame, bbox):
+        """完整追踪器给出了可信的目标框：重新取特征点，并按上一段光流的表现调整 N"""
+        bbox = tuple(float(v) for v in bbox)
+        if self.anchor is not None:
+            # 速度取两次完整更新之间的真实位移，不依赖光流本身
+            frames = self.since_full + 1
+            self.speed = float(np.hypot(bbox[0] - self.anchor[0], bbox[1] - self.anchor[1])) / frames
+            if self.residual > 0.5 * self.max_residual:
+                self.interval = max(self.interval // 2, 1)
+            else:
+                self.interval = min(self.interval + 1, self.max_interval)
+            self.interval = min(self.interval, self._motion_limit(bbox))
+        self.bbox = self.anchor = bbox
+        self.since_full = 0
+        self.full_frames += 1
+
+        gray, (x0, y0) = self._patch(frame, self.bbox)
+        x, y, w, h = (int(v) for v in self.bbox)
+        box = gray[max(y - y0, 0):y - y0 + h, max(x - x0, 0):x - x0 + w]
+        self.points = None
+        self.prev = (gray, (x0, y0))
+        if box.size == 0:
+            return
+        _, inside = cv2.threshold(box, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        k = np.ones((3, 3), np.uint8)
+        ring = cv2.subtract(cv2.dilate(inside, k, iterations=2), cv2.erode(inside, k, iterations=2))
+        mask = np.zeros_like(gray)
+        mask[max(y - y0, 0):max(y - y0, 0) + box.shape[0], max(x - x0, 0):max(x - x0, 0) + box.shape[1]] = ring
+        points = cv2.goodFeaturesToTrack(gray, self.max_points, 0.01, 3, mask=mask)
+        if points is not None and len(points) >= self.min_points:
+            self.points = points + np.float32([x0, y0])
+
+    def recenter(self, cx, cy):
+        """亚像素质心比光流位移更准：把传播中的目标框移到质心上，避免漂移在两次完整更新之间累积"""
+        x, y, w, h = self.bbox
+        self.bbox = (cx - w / 2.0, cy - h / 2.0, w, h)
+
+    def _motion_limit(self, bbox):
+        """运动约束：液滴越快，距离下一次完整更新越近"""
+        if self.speed <= 0:
+            return self.max_interval
+        return max(int(self.travel * max(bbox[2], bbox[3]) / self.speed), 1)
+
+    def due(self):
+        """本帧是否应当运行完整追踪器"""
+        return self.points is None or self.since_full + 1 >= self.interval
+
+    def track(self, frame):
+        """用光流把目标框推到本帧；特征点不足或残差过大时返回 None"""
+        if self.points is None:
+            return None
+        prev_gray, (x0, y0) = self.prev
+        ph, pw = prev_gray.shape
+        cur = frame[y0:y0 + ph, x0:x0 + pw]
+        cur = cv2.cvtColor(cur, cv2.COLOR_BGR2GRAY) if cur.ndim == 3 else cur
+        p0 = self.points - np.float32([x0, y0])
+        p1, st1, _ = cv2.calcOpticalFlowPyrLK(prev_gray, cur, p0, None, winSize=self.win_size, maxLevel=2)
+        p0r, st0, _ = cv2.calcOpticalFlowPyrLK(cur, prev_gray, p1, None, winSize=self.win_size, maxLevel=2)
+        fb = np.linalg.norm((p0 - p0r).reshape(-1, 2), axis=1)
+        good = (st1.ravel() == 1) & (st0.ravel() == 1) & (fb < self.max_fb_error)
+        if good.sum() < self.min_points:
+            self.points = None
+            return None
+
+        disp = (p1 - p0).reshape(-1, 2)[good]
+        d = np.median(disp, axis=0)
+        self.residual = float(max(np.median(fb[good]), np.median(np.linalg.norm(disp - d, axis=1))))
+        if self.residual > self.max_residual:
+            self.points = None
+            return None
+
+        x, y, w, h = self.bbox
+        self.bbox = (x + float(d[0]), y + float(d[1]), w, h)
+        self.points = p1[good] + np.float32([x0, y0])
+        self.speed = float(np.hypot(*d))
+        self.since_full += 1
+        self.flow_frames += 1
+        self.interval = min(self.interval, self._motion_limit(self.bbox))
+        self.prev = self._patch(frame, self.bbox)
+        return self.bbox
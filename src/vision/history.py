@@ -0,0 +1,125 @@
+"""
+--- history.py v1.0 ---
+目的：
+GalinstanTracker.history 原本是 Python 列表组成的 deque，任何分析（速度、平滑、绘图、导出）
+都要先把它整体转换成数组。TrackHistory 是定长、数组存储的环形缓冲区：
+1. 每条记录是一个结构化 dtype：seq（帧序号）/ t（采集时刻）/ x / y / w / h（目标框尺寸）/ quality / lost；
+   失锁帧同样入账（lost=True，x / y 为 NaN），锁定率与失锁片段都能直接从历史里统计；
+2. 追加 O(1)：“双写”——每条记录同时写入下标 i 与 i + capacity，
+   因此最近 n 条记录在底层数组里总是连续的一段，view() 返回按时间从旧到新排列的零拷贝视图，
+   不需要 np.roll 或拼接；
+3. 内存在构造时一次分配，运行期间追加不产生任何数组分配；
+4. 统计全部向量化：速度、均值 / 标准差、锁定率、平均质量分直接对视图的字段做 numpy 运算；
+5. save() 把历史按时间顺序写成 .npy，录制时与视频一起保存，离线分析与状态估计器回放用同一份数据。
+"""
+
+import numpy as np
+
+HISTORY_DTYPE = np.dtype([
+    ("seq", np.int64),       # 追踪器处理的第几帧
+    ("t", np.float64),       # 采集时刻（time.perf_counter 时钟），秒
+    ("x", np.float64),       # 质心，px；失锁时为 NaN
+    ("y", np.float64),
+    ("w", np.float32),       # 目标框尺寸，px
+    ("h", np.float32),
+    ("quality", np.float32), # 质心质量分（见 subpixel.py），0~1
+    ("lost", np.bool_),
+])
+
+
+class TrackHistory:
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("capacity 必须为正数")
+        self.capacity = int(capacity)
+        self._data = np.zeros(2 * self.capacity, dtype=HISTORY_DTYPE)
+        self._head = 0  # 下一条记录写入的下标，0 <= _head < capacity
+        self._count = 0
+        self.seq = 0    # 累计追加的记录数（也是下一条记录的 seq）
+
+    def append(self, t, x, y, w=0.0, h=0.0, quality=0.0, lost=False):
+        record = (self.seq, t, x, y, w, h, quality, lost)
+        self._data[self._head] = record
+        self._data[self._head + self.capacity] = record
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self.seq += 1
+
+    def append_lost(self, t):
+        self.append(t, np.nan, np.nan, lost=True)
+
+    def clear(self):
+        """清空历史；seq 继续递增，保证帧序号在整个运行期间单调"""
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    # --- 视图 ---
+    def view(self, n=None):
+        """最近 n 条记录（默认全部），按时间从旧到新排列的零拷贝视图；下一次 append 之前有效"""
+        n = self._count if n is None else min(max(int(n), 0), self._count)
+        end = self._head + self.capacity
+        return self._data[end - n:end]
+
+    def window(self, seconds):
+        """最近 seconds 秒内的记录（以最新一条的时刻为准），零拷贝视图"""
+        v = self.view()
+        if not len(v):
+            return v
+        return v[np.searchsorted(v["t"], v["t"][-1] - seconds, side="left"):]
+
+    def last(self):
+        """最新一条记录（np.void），没有记录时返回 None"""
+        return self.view(1)[0] if self._count else None
+
+    def locked(self, n=None):
+        """最近 n 条记录中锁定的那些（布尔索引，返回的是拷贝）"""
+        v = self.view(n)
+        return v[~v["lost"]]
+
+    # --- 向量化统计 ---
+    def velocity(self, n=5, since=0):
+        """
+        最近 n 个锁定点首尾之差除以帧序号之差，单位 px/帧；不足两个锁定点时为 (0, 0)。
+        since: 只使用帧序号不小于它的记录（例如重新捕获之后，跳变前的点不参与速度估计）。
+        """
+        v = self.locked(4 * n)
+        v = v[v["seq"] >= since][-n:]
+        if len(v) < 2:
+            return (0.0, 0.0)
+        frames = float(v["seq"][-1] - v["seq"][0])
+        return (float(v["x"][-1] - v["x"][0]) / frames, float(v["y"][-1] - v["y"][0]) / frames)
+
+    def velocity_per_second(self, n=5):
+        """同 velocity()，以采集时刻为时间轴，单位 px/s"""
+        v = self.locked(4 * n)[-n:]
+        if len(v) < 2 or v["t"][-1] <= v["t"][0]:
+            return (0.0, 0.0)
+        dt = float(v["t"][-1] - v["t"][0])
+        return (float(v["x"][-1] - v["x"][0]) / dt, float(v["y"][-1] - v["y"][0]) / dt)
+
+    def stats(self, seconds=None):
+        """最近 seconds 秒（默认全部历史）的位置均值 / 标准差、锁定率与平均质量分"""
+        v = self.view() if seconds is None else self.window(seconds)
+        if not len(v):
+            return {"n": 0, "lock_rate": 0.0, "mean": None, "std": None, "quality": 0.0}
+        ok = ~v["lost"]
+        n_ok = int(ok.sum())
+        if n_ok:
+            xy = np.stack([v["x"][ok], v["y"][ok]])
+            mean, std = xy.mean(axis=1), xy.std(axis=1)
+            mean, std = (float(mean[0]), float(mean[1])), (float(std[0]), float(std[1]))
+        else:
+            mean = std = None
+        return {
+            "n": len(v),
+            "lock_rate": n_ok / len(v),
+            "mean": mean,
+            "std": std,
+            "quality": float(v["quality"][ok].mean()) if n_ok else 0.0,
+        }
+
+    def save(self, path):
+        """按时间顺序写成 .npy（结构化数组，np.load 即可读回）"""
+        np.save(path, self.view())
@@ -0,0 +1,215 @@
+"""
+--- multi_tracker.py v1.0 ---
+目的：
+路线图第三阶段（二维操控）需要同时追踪一个培养皿里的多颗液滴。
+给每颗液滴各开一个 CSRT 的代价随液滴数线性增长（每个约 16ms），很快就跟不上帧率；
+MultiDropletTracker 改为“检测 + 数据关联”：
+1. 每帧只做一次 ClassicalDetector 分割，得到所有候选 —— 分割代价与液滴数无关；
+2. 所有航迹的预测位置一次性向量化外推（α-β 滤波，状态存成 (N, 2) 数组）；
+3. 航迹 × 检测的代价矩阵用广播一次算出（距离 + 面积比），超出门限的配对置为不可行；
+4. 用匈牙利算法求全局最优分配：有 scipy 时用 scipy.optimize.linear_sum_assignment，
+   否则用本文件中的 numpy 实现（最短增广路 + 势函数，内层对列向量化）；
+5. 生命周期：
+   - 出生：未匹配的检测开一条试探航迹，连续命中 min_hits 帧后确认；
+   - 死亡：连续 max_misses 帧未匹配的航迹删除；
+   - 合并：未匹配航迹的预测位置落在某个已匹配检测的门限内，且该检测面积明显大于匹配到它的航迹
+     （两颗液滴融合成一颗），判定为被吞并，立即删除并记录 (被吞并 id, 吞并者 id)。
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from src.vision.classical import ClassicalDetector
+
+try:
+    from scipy.optimize import linear_sum_assignment as _scipy_assignment
+except ImportError:
+    _scipy_assignment = None
+
+# 对外输出的航迹快照：位置 px，速度 px/s
+Track = namedtuple("Track", ["id", "x", "y", "vx", "vy", "area", "age", "hits", "misses", "confirmed"])
+
+INFEASIBLE = 1e9 # 门限外配对的代价
+
+
+def hungarian(cost):
+    """
+    最小代价分配，返回 (行索引数组, 列索引数组)，与 scipy.optimize.linear_sum_assignment 的约定一致。
+    矩形矩阵自动转置为 行数 <= 列数；O(n²m)，对 n ≲ 100 足够快。
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.zeros(0, int), np.zeros(0, int)
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = hungarian(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)   # p[j]: 分配给第 j 列的行（1 起），0 表示空闲
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            masked = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(masked)) + 1
+            delta = masked[j1 - 1]
+            used_idx = np.nonzero(used)[0]
+            u[p[used_idx]] += delta
+            v[used_idx] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def assign(cost):
+    """优先使用 scipy，没有则退回 numpy 实现"""
+    if _scipy_assignment is not None:
+        return _scipy_assignment(cost)
+    return hungarian(cost)
+
+
+class MultiDropletTracker:
+    def __init__(self, detector=None, gate=60.0, area_weight=20.0, min_hits=3, max_misses=10,
+                 alpha=0.6, beta=0.3, merge_ratio=1.5):
+        self.detector = detector or ClassicalDetector()
+        self.gate = gate               # 预测位置与检测的最大关联距离 (px)
+        self.area_weight = area_weight # 面积比 |log(a_det / a_trk)| 折算为像素代价的系数
+        self.min_hits = min_hits
+        self.max_misses = max_misses
+        self.alpha, self.beta = alpha, beta
+        self.merge_ratio = merge_ratio # 检测面积 / 航迹面积超过它才可能是合并
+
+        self.next_id = 1
+        self.t = None
+        # 航迹状态（向量化存储，第 k 行即第 k 条航迹）
+        self.ids = np.zeros(0, dtype=int)
+        self.pos = np.zeros((0, 2))
+        self.vel = np.zeros((0, 2))
+        self.area = np.zeros(0)
+        self.age = np.zeros(0, dtype=int)
+        self.hits = np.zeros(0, dtype=int)
+        self.misses = np.zeros(0, dtype=int)
+        self.confirmed = np.zeros(0, dtype=bool)
+
+        self.births = 0
+        self.deaths = 0
+        self.merges = [] # [(被吞并 id, 吞并者 id), ...]
+
+    def update(self, frame, timestamp):
+        """对一帧做检测与关联，返回已确认的航迹列表"""
+        blobs = self.detector.candidates(frame)
+        det = np.array([(b.cx, b.cy) for b in blobs]).reshape(-1, 2)
+        areas = np.array([b.area for b in blobs], dtype=np.float64)
+        return self.update_detections(det, areas, timestamp)
+
+    def update_detections(self, det, areas, timestamp):
+        """det: (M, 2) 检测质心；areas: (M,) 检测面积"""
+        det = np.asarray(det, dtype=np.float64).reshape(-1, 2)
+        areas = np.asarray(areas, dtype=np.float64)
+        dt = 0.0 if self.t is None else max(timestamp - self.t, 1e-6)
+        self.t = timestamp
+
+        # 1. 向量化预测
+        predicted = self.pos + self.vel * dt
+        n, m = len(predicted), len(det)
+
+        # 2. 代价矩阵：距离 + 面积比，门限外不可行
+        rows = cols = np.zeros(0, dtype=int)
+        if n and m:
+            dist = np.linalg.norm(predicted[:, None, :] - det[None, :, :], axis=2)
+            ratio = np.abs(np.log(areas[None, :] / np.maximum(self.area[:, None], 1.0)))
+            cost = np.where(dist <= self.gate, dist + self.area_weight * ratio, INFEASIBLE)
+            rows, cols = assign(cost)
+            ok = cost[rows, cols] < INFEASIBLE
+            rows, cols = rows[ok], cols[ok]
+
+        # 3. 已匹配航迹：α-β 更新（先记下更新前的面积，合并判定要用）
+        prev_area = self.area.copy()
+        if len(rows):
+            residual = det[cols] - predicted[rows]
+            self.pos[rows] = predicted[rows] + self.alpha * residual
+            if dt > 0:
+                self.vel[rows] += self.beta / dt * residual
+            self.area[rows] = areas[cols]
+            self.hits[rows] += 1
+            self.misses[rows] = 0
+            self.confirmed[rows] |= self.hits[rows] >= self.min_hits
+
+        matched_trk = np.zeros(n, dtype=bool)
+        matched_trk[rows] = True
+        unmatched = np.nonzero(~matched_trk)[0]
+        self.pos[unmatched] = predicted[unmatched] # 未匹配航迹按预测继续前进
+        self.misses[unmatched] += 1
+        self.age += 1
+        dead = self.misses > self.max_misses
+
+        # 4. 合并：已确认的未匹配航迹，其预测落在某个已匹配检测的门限内，且该检测面积相对其航迹暴涨
+        if len(unmatched) and len(rows):
+            grown = areas[cols] > self.merge_ratio * prev_area[rows]
+            near = np.linalg.norm(predicted[unmatched][:, None, :] - det[cols][None, :, :], axis=2) <= self.gate
+            near &= grown[None, :] & self.confirmed[unmatched][:, None]
+            for ui in np.nonzero(near.any(axis=1))[0]:
+                k = int(np.argmin(np.where(near[ui], np.linalg.norm(predicted[unmatched[ui]] - det[cols], axis=1), np.inf)))
+                self.merges.append((int(self.ids[unmatched[ui]]), int(self.ids[rows[k]])))
+                dead[unmatched[ui]] = True
+
+        # 5. 死亡
+        self.deaths += int(dead.sum())
+        self._keep(~dead)
+
+        # 6. 出生
+        matched_det = np.zeros(m, dtype=bool)
+        matched_det[cols] = True
+        new = np.nonzero(~matched_det)[0]
+        if len(new):
+            k = len(new)
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + k)])
+            self.next_id += k
+            self.pos = np.vstack([self.pos, det[new]])
+            self.vel = np.vstack([self.vel, np.zeros((k, 2))])
+            self.area = np.concatenate([self.area, areas[new]])
+            self.age = np.concatenate([self.age, np.zeros(k, dtype=int)])
+            self.hits = np.concatenate([self.hits, np.ones(k, dtype=int)])
+            self.misses = np.concatenate([self.misses, np.zeros(k, dtype=int)])
+            self.confirmed = np.concatenate([self.confirmed, np.full(k, self.min_hits <= 1)])
+            self.births += k
+
+        return self.tracks()
+
+    def _keep(self, mask):
+        for name in ("ids", "pos", "vel", "area", "age", "hits", "misses", "confirmed"):
+            setattr(self, name, getattr(self, name)[mask])
+
+    def tracks(self, confirmed_only=True):
+        out = []
+        for k in range(len(self.ids)):
+            if confirmed_only and not self.confirmed[k]:
+                continue
+            out.append(Track(int(self.ids[k]), float(self.pos[k, 0]), float(self.pos[k, 1]),
+                             float(self.vel[k, 0]), float(self.vel[k, 1]), float(self.area[k]),
+                             int(self.age[k]), int(self.hits[k]), int(self.misses[k]), bool(self.confirmed[k])))
+        return out
@@ -0,0 +1,160 @@
+"""
+--- reacquire.py v1.0 ---
+目的：
+CSRT 失锁后，process_frame() 返回 None，旧版控制回路输出 0V 并一直“失明”，
+追踪器很少能碰巧自己找回液滴，长时间运行中失锁是最大的停机来源。
+
+Reacquirer 把“找回液滴”交给后台线程：
+1. 失锁期间，追踪线程每帧把最新画面投进单槽信箱（只保留最新一帧，旧帧直接覆盖），
+   后台线程在整帧上运行 ClassicalDetector（降采样），按 acquisition 的置信度给候选打分；
+   追踪器维护着背景模型时改用 BackgroundDetector：只在“与学到的背景不同”的像素里找，
+   电极、固定阴影等静态杂物不再成为候选；后台线程用的是每个失锁片段开始时拷贝的模型副本——
+   背景只在锁定时学习，片段内副本与原模型一致，追踪器恢复后继续学习也不会与后台的读取竞争；
+2. 找到置信度足够的候选后，追踪线程在下一帧用“检测所用的那一帧 + 检测框”重建追踪器（reseed），
+   再立即对当前帧做一次追踪，液滴在这期间的位移由追踪器自己跟上；
+3. 检测结果出来之前，控制回路按最后的速度外推位置（coast），最多 coast_frames 帧，之后才输出 None（0V）；
+4. 每个失锁片段从第一帧失锁到重新锁定的时间记入直方图（time-to-reacquire），
+   区分“后台检测找回”与“追踪器自行恢复”。
+
+线程约定：tracker 只在追踪线程中被修改（step 内的 reseed），后台线程只读自己拷贝的画面与背景模型。
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from src.vision.acquisition import acquire
+from src.vision.classical import ClassicalDetector
+from src.vision.background import BackgroundDetector
+from src.engine.metrics import LatencyHistogram
+
+# 后台检测的结果：frame 为检测所用画面的拷贝，bbox 为该画面中的目标框
+Seed = namedtuple("Seed", ["frame", "bbox", "confidence", "timestamp"])
+
+
+class Reacquirer:
+    def __init__(self, min_confidence=0.5, coast_frames=10, scale=0.5, params=None):
+        self.min_confidence = min_confidence
+        self.coast_frames = coast_frames # 失锁后按速度外推的最大帧数
+        self.detector = ClassicalDetector(params, scale=scale)
+        self.bg_detector = None # 绑定到背景模型副本的检测器，每个失锁片段重建一次
+
+        self._cond = threading.Condition()
+        self._inbox = None   # (frame, timestamp, detector)，只保留最新一帧
+        self._seed = None
+        self._bg_source = None # bg_detector 的副本拷贝自哪个模型；None 表示需要重新拷贝
+        self._running = False
+        self._thread = None
+
+        # 失锁片段统计（只在追踪线程中读写）
+        self.lost_since = None
+        self.episodes = 0
+        self.reacquired = 0     # 由后台检测找回
+        self.self_recovered = 0 # 追踪器自行恢复
+        self.attempts = 0       # 后台检测次数（在工作线程中累加）
+        self.time_to_reacquire = LatencyHistogram(highest_us=600_000_000) # 上限 10 分钟
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="reacquire", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    # --- 后台线程 ---
+    def submit(self, frame, timestamp, params=None, background=None):
+        """
+        追踪线程调用：投递最新画面（拷贝一份，渲染线程会在原帧上叠加文字）。
+        background: 追踪器的背景模型，给定时后台检测改用前景掩膜；
+        后台线程拿到的是模型的副本（每个失锁片段拷贝一次），追踪线程之后的 learn() 不影响它。
+        """
+        detector = self.detector
+        if background is not None:
+            if self.bg_detector is None or self._bg_source is not background:
+                self.bg_detector = BackgroundDetector(background.copy(), params)
+                self._bg_source = background
+            detector = self.bg_detector
+        with self._cond:
+            if params is not None:
+                detector.params = params
+            self._inbox = (frame.copy(), timestamp, detector)
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._inbox is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                frame, timestamp, detector = self._inbox
+                self._inbox = None
+            result = acquire([frame], detector=detector)
+            self.attempts += 1
+            if result is not None and result.confidence >= self.min_confidence:
+                with self._cond:
+                    self._seed = Seed(frame, result.bbox, result.confidence, timestamp)
+
+    def _take_seed(self):
+        with self._cond:
+            seed, self._seed = self._seed, None
+        return seed
+
+    # --- 追踪线程 ---
+    def step(self, tracker, frame, timestamp, pos):
+        """
+        在 tracker.process_frame() 之后调用，返回交给控制回路的位置：
+        锁定时原样返回；失锁时尝试用后台检测结果重建，仍失败则返回外推位置（超过 coast_frames 后为 None）。
+        """
+        if pos is not None:
+            if self.lost_since is not None:
+                self._close_episode(timestamp, recovered_by_detector=False)
+            return pos
+
+        if self.lost_since is None:
+            self.lost_since = timestamp
+            self.episodes += 1
+            with self._cond:
+                self._seed = None # 丢弃上一次片段遗留的结果
+            self._bg_source = None # 上次片段之后背景又学习过：本片段重新拷贝
+
+        seed = self._take_seed()
+        if seed is not None:
+            tracker.reseed(seed.frame, seed.bbox)
+            pos = tracker.process_frame(frame, timestamp=timestamp)
+            if pos is not None:
+                self._close_episode(timestamp, recovered_by_detector=True)
+                return pos
+        self.submit(frame, timestamp, tracker.params, getattr(tracker, "background", None))
+        return tracker.predict(self.coast_frames)
+
+    def _close_episode(self, timestamp, recovered_by_detector):
+        self.time_to_reacquire.record(max(timestamp - self.lost_since, 0.0))
+        if recovered_by_detector:
+            self.reacquired += 1
+        else:
+            self.self_recovered += 1
+        self.lost_since = None
+
+    @property
+    def lost(self):
+        return self.lost_since is not None
+
+    def summary(self):
+        s = self.time_to_reacquire.summary()
+        return {
+            "episodes": self.episodes,
+            "reacquired": self.reacquired,
+            "self_recovered": self.self_recovered,
+            "attempts": self.attempts,
+            "lost_now_s": 0.0 if self.lost_since is None else time.perf_counter() - self.lost_since,
+            "time_to_reacquire_p50_ms": s["p50_ms"],
+            "time_to_reacquire_p99_ms": s["p99_ms"],
+            "time_to_reacquire_max_ms": s["max_ms"],
+        }
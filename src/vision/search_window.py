@@ -0,0 +1,77 @@
+"""
+--- search_window.py v1.0 ---
+目的：
+液滴只占画面的一小块，整帧搜索把大部分算力花在了空白的电解液上。
+SearchWindow 根据上一次的目标框与近期速度，给出一个以 last_pos 为中心的裁剪窗口：
+- 窗口尺寸 = 目标框 × scale + |速度| × lookahead（每个轴分别计算），且不小于 min_size；
+  窗口中心沿运动方向超前半个 lookahead，让液滴从窗口的后半部分一路走到前缘；
+- 失锁时 grow() 逐次把窗口放大一倍，直到覆盖整帧；锁定稳定后 relax() 把放大倍数逐步收回；
+- 只有目标逼近窗口边缘、或窗口尺寸明显不合适时才需要移动窗口（滞回），
+  因为对有状态的追踪器（CSRT 等）而言，每次移动窗口都意味着一次重新初始化。
+窗口坐标一律为整帧坐标 (x0, y0, x1, y1)，裁剪结果是原帧的视图（零拷贝）。
+"""
+
+
+class SearchWindow:
+    def __init__(self, frame_size, scale=6.0, lookahead=10.0, min_size=128, edge_margin=0.5, max_growth=16.0):
+        self.frame_w, self.frame_h = frame_size
+        self.scale = scale            # 窗口边长相对目标框边长的倍数
+        self.lookahead = lookahead    # 按当前速度预留的帧数
+        self.min_size = min_size
+        self.edge_margin = edge_margin # 目标框离窗口边缘不足 margin × 框边长时需要移动窗口
+        self.max_growth = max_growth
+        self.growth = 1.0
+
+    @property
+    def full(self):
+        return (0, 0, self.frame_w, self.frame_h)
+
+    def fit(self, bbox, velocity=(0.0, 0.0)):
+        """以目标框中心为中心，给出当前放大倍数下的窗口（裁剪到画面内）"""
+        x, y, w, h = bbox
+        cx = x + w / 2.0 + velocity[0] * self.lookahead / 2.0
+        cy = y + h / 2.0 + velocity[1] * self.lookahead / 2.0
+        half_w = max(self.min_size / 2.0, w * self.scale / 2.0 + abs(velocity[0]) * self.lookahead) * self.growth
+        half_h = max(self.min_size / 2.0, h * self.scale / 2.0 + abs(velocity[1]) * self.lookahead) * self.growth
+        x0 = max(int(cx - half_w), 0)
+        y0 = max(int(cy - half_h), 0)
+        x1 = min(int(cx + half_w) + 1, self.frame_w)
+        y1 = min(int(cy + half_h) + 1, self.frame_h)
+        return (x0, y0, x1, y1)
+
+    def needs_move(self, rect, bbox, velocity=(0.0, 0.0)):
+        """
+        锁定状态下判断是否需要换窗口：
+        1. 目标框离窗口某条边（画面边界除外）太近；
+        2. 理想窗口比当前窗口大 1.5 倍以上（速度变快），或当前窗口面积超过理想窗口的 4 倍（锁定稳定后收缩）。
+        """
+        x, y, w, h = bbox
+        x0, y0, x1, y1 = rect
+        mx, my = w * self.edge_margin, h * self.edge_margin
+        if (x - x0 < mx and x0 > 0) or (y - y0 < my and y0 > 0):
+            return True
+        if (x1 - (x + w) < mx and x1 < self.frame_w) or (y1 - (y + h) < my and y1 < self.frame_h):
+            return True
+
+        fx0, fy0, fx1, fy1 = self.fit(bbox, velocity)
+        ideal_w, ideal_h = fx1 - fx0, fy1 - fy0
+        cur_w, cur_h = x1 - x0, y1 - y0
+        if ideal_w > 1.5 * cur_w or ideal_h > 1.5 * cur_h:
+            return True
+        return cur_w * cur_h > 4 * ideal_w * ideal_h
+
+    def grow(self):
+        """失锁：放大倍数翻倍，返回是否真的变大了"""
+        if self.growth >= self.max_growth:
+            return False
+        self.growth = min(self.growth * 2.0, self.max_growth)
+        return True
+
+    def relax(self):
+        """锁定稳定：放大倍数逐步回落到 1"""
+        self.growth = max(self.growth / 2.0, 1.0)
+
+    @staticmethod
+    def crop(frame, rect):
+        x0, y0, x1, y1 = rect
+        return frame[y0:y1, x0:x1]
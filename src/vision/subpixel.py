@@ -0,0 +1,78 @@
+"""
+--- subpixel.py v1.0 ---
+目的：
+process_frame() 原本取目标框的几何中心 x + w // 2 作为液滴位置：
+位置被量化到整像素（微分项看到的是 1px 的台阶），而且跟随的是框而不是液滴本身的质心。
+refine_centroid() 在追踪框内的一小块画面上重新求液滴的质心，返回浮点坐标和质量分：
+1. Otsu 阈值把小块分成本体 / 背景，两者的灰度均值记作 fg / bg；
+2. 按线性混合模型把灰度换算成 0~1 的“覆盖率”权重 (bg - I) / (bg - fg)：
+   边缘像素按部分覆盖计入，质心因此是亚像素的，而不是二值掩膜的整像素台阶；
+   只在 Otsu 掩膜外扩 2px 的范围内计权，背景纹理的噪声不参与；
+3. 对权重图做一次灰度闭运算，填掉镜面高光在本体上留下的小洞（否则质心被拉向高光的反方向）；
+4. cv2.moments 求一阶矩得到质心。
+质量分 = 对比度 × 完整度：本体比背景暗得不够、或本体被小块边缘截断（质心有偏）时降低。
+小块只比目标框略大（约 50x50），每帧耗时在 0.1ms 量级。
+"""
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# 整帧坐标下的亚像素质心；quality 0~1
+Centroid = namedtuple("Centroid", ["x", "y", "quality"])
+
+MIN_DEPTH = 0.5 # 本体比背景暗 50% 以上，对比度项得满分（与 acquisition.py 一致）
+
+_kernels = {}
+
+
+def _kernel(k):
+    kernel = _kernels.get(k)
+    if kernel is None:
+        kernel = _kernels[k] = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (k, k))
+    return kernel
+
+
+def refine_centroid(frame, bbox, pad=None):
+    """
+    bbox: 追踪器给出的 (x, y, w, h)，整帧坐标；小块在其基础上每边外扩 pad 像素
+    （默认为框边长的 1/4：追踪框常常偏离液滴几个像素，小块必须把液滴连同抗锯齿的边缘完整包住）。
+    返回 Centroid，或在小块退化 / 没有前景时返回 None。
+    """
+    fh, fw = frame.shape[:2]
+    x, y, w, h = (int(v) for v in bbox)
+    if pad is None:
+        pad = max(w, h) // 4
+    x0, y0 = max(x - pad, 0), max(y - pad, 0)
+    x1, y1 = min(x + w + pad, fw), min(y + h + pad, fh)
+    if x1 - x0 < 4 or y1 - y0 < 4:
+        return None
+    patch = frame[y0:y1, x0:x1]
+    gray = cv2.cvtColor(patch, cv2.COLOR_BGR2GRAY) if patch.ndim == 3 else patch
+
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    inside = mask > 0
+    if not inside.any() or inside.all():
+        return None
+    fg = float(gray[inside].mean())
+    bg = float(np.median(gray[~inside])) # 中位数：不受镜面高光影响
+    if bg - fg < 1.0:
+        return None
+
+    weight = np.clip((bg - gray.astype(np.float32)) / np.float32(bg - fg), 0.0, 1.0)
+    weight[cv2.dilate(mask, _kernel(3), iterations=2) == 0] = 0.0
+    k = max(min(w, h) // 4, 3) | 1
+    cv2.morphologyEx(weight, cv2.MORPH_CLOSE, _kernel(k), dst=weight)
+
+    m = cv2.moments(weight)
+    if m["m00"] < 1.0:
+        return None
+    cx, cy = m["m10"] / m["m00"], m["m01"] / m["m00"]
+
+    contrast = min(max(bg - fg, 0.0) / (bg + 1e-6) / MIN_DEPTH, 1.0)
+    # 本体在小块边缘上被截断的弦长，相对于同面积圆盘的直径：液滴完整落在小块里时为 0，从中间截断时约为 1
+    rim = float(weight[0].sum() + weight[-1].sum() + weight[1:-1, 0].sum() + weight[1:-1, -1].sum())
+    complete = max(1.0 - rim / (2.0 * np.sqrt(m["m00"] / np.pi)), 0.0)
+    quality = contrast * complete
+    return Centroid(x0 + cx, y0 + cy, float(quality))
@@ -1,83 +1,323 @@
 """
---- Galinstan 视觉伺服感知引擎 (v2.0 CSRT 版) ---
-核心逻辑已由“全局图像分割”更替为“局部特征追踪 (CSRT)”。
-外部调用者只需在进入主循环前调用一次 calibrate() 即可，
-原有 process_frame() 的 API 契约保持不变。
+--- Galinstan 视觉伺服感知引擎 (v2.1 可插拔后端版) ---
+核心逻辑已由“全局图像分割”更替为“局部特征追踪 (CSRT)”，
+v2.1 起感知算法由 src/vision/backends.py 中的后端提供（csrt / kcf / mosse / classical），
+通过 config.json 的 tracker_backend 键切换。
+外部调用者只需在进入主循环前调用一次 calibrate()（人工框选 / 给定目标框）
+或 auto_calibrate()（自动捕获，置信度不足时退回人工框选）即可，
+原有 process_frame() 的 API 契约保持不变；
+默认开启亚像素质心（config.json 的 vis_subpixel 键），返回的坐标为浮点数。
+混合模式（vis_hybrid 键）下完整追踪器只每 N 帧运行一次，其余帧由光流传播目标框（见 flow.py）。
+标定后维护一个增量背景模型（bg_learning_rate 键，见 background.py），供 background 后端与失锁找回使用。
 """
 
+import time
+
 import cv2
 import numpy as np
-from collections import deque
+
+from src.vision.search_window import SearchWindow
+from src.vision.backends import create_backend, DEFAULT_BACKEND
+from src.vision.acquisition import acquire
+from src.vision.subpixel import refine_centroid
+from src.vision.flow import FlowPropagator
+from src.vision.history import TrackHistory
+from src.vision.background import BackgroundModel
+
 
 class GalinstanTracker:
-    def __init__(self, buffer_sec=4, fps=30):
-        # 1. 状态寄存器 (维持原样，供物理预测使用)
-        self.history = deque(maxlen=buffer_sec * fps)
+    def __init__(self, buffer_sec=4, fps=30, search_window=True, backend=DEFAULT_BACKEND):
+        # 1. 状态寄存器：定长结构化环形缓冲区（见 history.py），锁定与失锁帧都入账
+        self.history = TrackHistory(buffer_sec * fps)
+        self.segment_start = 0 # 当前锁定片段的起始帧序号：重新捕获后速度只从这里开始估计
         self.last_pos = None
 
-        # 2. 核心：初始化 CSRT 追踪器引擎
-        try:
-            self.tracker = cv2.TrackerCSRT_create()
-        except AttributeError:
-            self.tracker = cv2.legacy.TrackerCSRT_create()
+        # 2. 核心：初始化追踪后端（默认 CSRT）
+        self.params = {"C": 6, "kernel": 7, "min_area": 300, "scale": 1.0}
+        self.backend = backend           # 期望的后端名（可由 config 热切换）
+        self.active_backend = backend    # 当前 self.tracker 实际使用的后端名
+        self.tracker = create_backend(backend, self.params)
 
         self.is_initialized = False
 
-        # 3. 兼容性填充：防报错机制
-        # 即使现在不需要调参，也要保留这个字典，防止 UI 端调用时崩溃
-        self.params = {"C": 0, "kernel": 0, "min_area": 0} 
+        # 3. 搜索窗口：追踪器只看 last_pos 附近的一块裁剪视图，坐标再映射回整帧
+        self.search_window = search_window
+        self.window = None  # SearchWindow，标定时按画面尺寸创建
+        self.windowed = False # 当前追踪器是否建立在裁剪窗口上
+        self.rect = None    # 当前裁剪窗口 (x0, y0, x1, y1)，整帧坐标
+        self.bbox = None    # 最近一次锁定的目标框 (x, y, w, h)，整帧坐标
+        self.template = None # 最近一次初始化时目标框内的像素（失锁扩窗时用来重新训练）
+        self.lost_frames = 0
+        self.stable_frames = 0
+        self.reinits = 0
+
+        # 4. 锁定校验：相关滤波类追踪器丢失目标后常常“锁”在背景上并照样报告成功，
+        #    每帧把目标框内的画面与标定模板做一次归一化相关，低于 min_similarity 视为失锁
+        self.min_similarity = 0.25
+        self.similarity = 1.0
+
+        # 5. 亚像素质心：在目标框附近的小块上用图像矩求液滴本身的质心（见 subpixel.py），
+        #    质量分低于 min_centroid_quality 时退回目标框几何中心
+        self.subpixel = True
+        self.min_centroid_quality = 0.3
+        self.centroid_quality = 0.0
+
+        # 6. 混合追踪：完整追踪器之间用稀疏光流传播目标框，N 随运动速度与光流残差自适应
+        self.hybrid = False
+        self.flow = FlowPropagator()
+
+        # 7. 背景模型：标定时建立，之后每帧只在搜索窗口（和一条轮换条带）内学习；学习率为 0 时不维护
+        self.bg_learning_rate = 0.02
+        self.background = None
+
+        # 8. 参数快照的待换入槽：控制线程只替换引用，追踪线程在下一帧 process_frame 的开头换入
+        self._pending_params = None
+        self._applied_params = None
 
     def update_params(self, new_params):
         """
         兼容原有的参数更新接口。
-        由于 CSRT 算法无需手动调参，此处直接吞掉传进来的参数，做静默处理。
+        CSRT / KCF / MOSSE 后端不使用这些参数，classical 后端用它们做分割：
+        构造一份新字典后整体替换引用，追踪线程要么看到旧参数、要么看到新参数，不会读到一半。
         """
-        pass 
+        self.params = dict(self.params, **new_params)
+        self.tracker.params = self.params
 
-    def calibrate(self, first_frame):
+    def submit_params(self, params):
+        """
+        其他线程提交一份参数快照（来自 ConfigService 的只读映射）：只替换一个引用，不触碰追踪器状态。
+        追踪线程在下一帧 process_frame 的开头整体换入，一帧之内不会新旧混杂；连续提交时只换入最新的一份。
+        """
+        self._pending_params = params
+
+    def _take_params(self):
+        params = self._pending_params
+        if params is not None and params is not self._applied_params:
+            self._applied_params = params
+            self.apply_params(params)
+
+    def apply_params(self, params):
+        """
+        换入一份参数快照（来自 ConfigService），把 vis_* 键映射为追踪器内部参数。
+        只能在调用 process_frame 的线程中（或追踪开始之前）调用；其他线程请用 submit_params()。
+        """
+        self.update_params({
+            "C": params.get("vis_thresh_C", self.params["C"]),
+            "kernel": params.get("vis_kernel_size", self.params["kernel"]),
+            "min_area": params.get("vis_min_area", self.params["min_area"]),
+            "scale": params.get("vis_detect_scale", self.params["scale"]),
+        })
+        # 开关与后端切换在下一帧 process_frame 的开头生效（需要重建追踪器）
+        self.search_window = bool(params.get("vis_search_window", self.search_window))
+        self.subpixel = bool(params.get("vis_subpixel", self.subpixel))
+        self.hybrid = bool(params.get("vis_hybrid", self.hybrid))
+        self.bg_learning_rate = float(params.get("bg_learning_rate", self.bg_learning_rate))
+        if self.background is not None:
+            self.background.learning_rate = self.bg_learning_rate
+        self.backend = params.get("tracker_backend", self.backend)
+
+    def calibrate(self, first_frame, bbox=None):
         """
         物理目标锁定（标定）。
         这相当于给导弹的导引头注入目标特征，必须在主循环前调用。
+        bbox: 可选的 (x, y, w, h)。给定时直接用它初始化追踪器，不弹出任何窗口（headless 模式）。
         """
-        print("[系统提示] 开启视网膜标定。请框选液态金属，按 SPACE 确认。")
-        bbox = cv2.selectROI("Calibration: Select Galinstan", first_frame, showCrosshair=True, fromCenter=False)
-        cv2.destroyWindow("Calibration: Select Galinstan")
+        if bbox is None:
+            print("[系统提示] 开启视网膜标定。请框选液态金属，按 SPACE 确认。")
+            bbox = cv2.selectROI("Calibration: Select Galinstan", first_frame, showCrosshair=True, fromCenter=False)
+            cv2.destroyWindow("Calibration: Select Galinstan")
+        bbox = tuple(int(v) for v in bbox)
 
         if bbox[2] == 0 or bbox[3] == 0:
             print("[致命错误] 未选择有效物理区域。")
             return False
 
         # 启动追踪器
-        self.tracker.init(first_frame, bbox)
+        self.window = SearchWindow((first_frame.shape[1], first_frame.shape[0]))
+        self.bbox = bbox
+        self.flow = FlowPropagator()
+        self.background = None
+        self._ensure_background(first_frame)
+        self._init_tracker(first_frame, bbox)
         self.is_initialized = True
         return True
 
-    def process_frame(self, frame, debug=False):
+    def auto_calibrate(self, frames, min_confidence=0.6, manual_fallback=True):
+        """
+        自动捕获：在开机的若干帧中按形状 / 尺寸 / 光学线索找出液滴，用最后一帧初始化追踪器。
+        置信度低于 min_confidence 时，manual_fallback=True 退回 selectROI 人工框选，否则放弃。
+        返回 (是否锁定, 自动捕获置信度)。
+        """
+        result = acquire(frames, self.params)
+        confidence = result.confidence if result is not None else 0.0
+        if result is not None and confidence >= min_confidence:
+            print(f"[系统提示] 自动捕获液滴 @ ({result.position[0]:.0f}, {result.position[1]:.0f})，"
+                  f"置信度 {confidence:.2f}（{result.candidates} 个候选）")
+            return self.calibrate(frames[-1], result.bbox), confidence
+        print(f"[系统提示] 自动捕获置信度不足 ({confidence:.2f} < {min_confidence:.2f})")
+        if not manual_fallback:
+            return False, confidence
+        return self.calibrate(frames[-1]), confidence
+
+    def reseed(self, frame, bbox):
+        """
+        外部检测器（见 reacquire.py）重新找到了液滴：以它给出的目标框重建追踪器。
+        液滴可能已经跳到了别处：放大过的窗口复位，速度估计从新片段开始；
+        历史（包括失锁记录）照常保留，锁定率与落盘的 .npy 覆盖整个运行期间。
+        """
+        fh, fw = frame.shape[:2]
+        x, y, w, h = (int(v) for v in bbox)
+        x, y = min(max(x, 0), fw - 1), min(max(y, 0), fh - 1)
+        self.bbox = (x, y, max(min(w, fw - x), 1), max(min(h, fh - y), 1))
+        self.window.growth = 1.0
+        self.segment_start = self.history.seq
+        self.last_pos = None
+        self.flow = FlowPropagator()
+        self._init_tracker(frame, self.bbox)
+        self.lost_frames = 0
+        self.stable_frames = 0
+
+    def predict(self, max_frames=10):
+        """失锁期间按最后的速度外推位置；超过 max_frames 帧或从未锁定过则返回 None"""
+        if self.last_pos is None or not 0 < self.lost_frames <= max_frames:
+            return None
+        vx, vy = self.velocity()
+        return [self.last_pos[0] + vx * self.lost_frames, self.last_pos[1] + vy * self.lost_frames]
+
+    def velocity(self, n=5):
+        """由最近 n 个锁定的历史点估计速度 (px/帧)"""
+        return self.history.velocity(n, since=self.segment_start)
+
+    def _init_tracker(self, frame, bbox, template=None):
+        """
+        在新窗口中（重新）初始化追踪器。窗口坐标系一变，有状态的追踪器就必须重建。
+        template 给定时，把它贴回目标框位置再训练：失锁时当前帧里已经没有液滴，只能用最后一次见到的样子。
+        """
+        self.windowed = self.search_window
+        self.rect = self.window.fit(bbox, self.velocity()) if self.search_window else self.window.full
+        x0, y0, x1, y1 = self.rect
+        x, y, w, h = bbox
+        view = SearchWindow.crop(frame, self.rect)
+        if template is not None and self.tracker.stateful:
+            view = view.copy()
+            th, tw = min(template.shape[0], y1 - y), min(template.shape[1], x1 - x)
+            view[y - y0:y - y0 + th, x - x0:x - x0 + tw] = template[:th, :tw]
+        elif template is None:
+            self.template = frame[y:y + h, x:x + w].copy()
+
+        # 有状态后端（相关滤波类）必须新建实例；无状态后端只需告诉它新坐标系下的上次位置
+        if self.active_backend != self.backend or getattr(self.tracker, "stateful", True):
+            self.tracker = create_backend(self.backend, self.params)
+            self.active_backend = self.backend
+        self.tracker.init(view, (x - x0, y - y0, w, h))
+        self.reinits += 1
+
+    def _similarity(self, frame, bbox):
+        """目标框内画面与标定模板的归一化相关系数 (-1~1)；目标框出界或退化时返回 0"""
+        fh, fw = frame.shape[:2]
+        x, y, w, h = bbox
+        if w <= 1 or h <= 1 or x < 0 or y < 0 or x + w > fw or y + h > fh:
+            return 0.0
+        th, tw = self.template.shape[:2]
+        patch = frame[y:y + h, x:x + w]
+        if (h, w) != (th, tw):
+            patch = cv2.resize(patch, (tw, th), interpolation=cv2.INTER_AREA)
+        return float(cv2.matchTemplate(patch, self.template, cv2.TM_CCOEFF_NORMED)[0, 0])
+
+    def _ensure_background(self, frame):
+        """按学习率建立或撤销背景模型（学习率可在运行中经 config 从 0 改为非 0）"""
+        if self.bg_learning_rate <= 0 or frame.ndim != 3:
+            self.background = None
+        elif self.background is None:
+            self.background = BackgroundModel(self.bg_learning_rate)
+            self.background.reset(frame, exclude=self.bbox)
+
+    def _verify(self, frame, bbox):
+        """锁定校验：bbox 为窗口坐标；关闭校验（min_similarity=0）或尚无模板时直接通过"""
+        if self.min_similarity <= 0 or self.template is None:
+            return True
+        x, y, w, h = (int(v) for v in bbox)
+        self.similarity = self._similarity(frame, (x + self.rect[0], y + self.rect[1], w, h))
+        return self.similarity >= self.min_similarity
+
+    def process_frame(self, frame, debug=False, timestamp=None):
         """
         唯一的公共感知接口：输入光场，输出质心坐标 [x, y]。
+        timestamp: 该帧的采集时刻（time.perf_counter 时钟），记入历史；省略时取当前时刻。
         """
+        self._take_params()
         if frame is None or not self.is_initialized:
             return None
+        t = time.perf_counter() if timestamp is None else timestamp
 
         # --- 核心感知逻辑 ---
-        # 算法会自动寻找与标定阶段最相似的 HOG 特征块
-        success, bbox = self.tracker.update(frame)
+        # 搜索窗口开关或后端在运行中被切换：在上一次锁定的位置按新模式重建追踪器
+        if self.search_window != self.windowed or self.backend != self.active_backend:
+            self._init_tracker(frame, self.bbox)
+
+        x0, y0 = self.rect[0], self.rect[1]
+        # 混合模式：未到完整更新的帧先用光流传播，光流或锁定校验不合格再退回完整追踪器
+        flowed = False
+        if self.hybrid and not self.flow.due():
+            fbox = self.flow.track(frame)
+            if fbox is not None:
+                bbox = (fbox[0] - x0, fbox[1] - y0, fbox[2], fbox[3]) # 换算为窗口坐标，与后端输出一致
+                flowed = self._verify(frame, bbox)
+        if flowed:
+            success = True
+        else:
+            # 后端只在裁剪视图内搜索（CSRT 会寻找与标定阶段最相似的 HOG 特征块）
+            if hasattr(self.tracker, "background"):
+                self.tracker.background, self.tracker.origin = self.background, (x0, y0)
+            success, bbox = self.tracker.update(SearchWindow.crop(frame, self.rect))
+            success = success and self._verify(frame, bbox)
 
         debug_canvas = frame.copy() if debug else None
 
         if success:
-            # 提取边界框坐标并计算几何中心
+            # 提取边界框坐标（窗口坐标 -> 整帧坐标）并计算几何中心
             x, y, w, h = [int(v) for v in bbox]
+            x += x0
+            y += y0
             cX = x + w // 2
             cY = y + h // 2
             pos = [cX, cY]
+            if self.subpixel:
+                c = refine_centroid(frame, (x, y, w, h))
+                self.centroid_quality = 0.0 if c is None else c.quality
+                if self.centroid_quality >= self.min_centroid_quality:
+                    pos = [c.x, c.y]
+                    if flowed:
+                        self.flow.recenter(c.x, c.y)
+
+            # 记忆中的目标框裁剪到画面内，保证后续窗口与模板切片合法
+            fh, fw = frame.shape[:2]
+            bx0, by0 = min(max(x, 0), fw - 1), min(max(y, 0), fh - 1)
+            self.bbox = (bx0, by0, max(min(x + w, fw) - bx0, 1), max(min(y + h, fh) - by0, 1))
+            if self.hybrid and not flowed:
+                self.flow.reset(frame, (bbox[0] + x0, bbox[1] + y0, bbox[2], bbox[3]))
+            # 背景只在锁定时学习，液滴所在的目标框不学习
+            self._ensure_background(frame)
+            if self.background is not None:
+                self.background.learn(frame, self.rect, exclude=self.bbox)
 
             # 更新物理状态记忆
-            self.history.append(pos)
+            self.history.append(t, pos[0], pos[1], w, h, self.centroid_quality if self.subpixel else 1.0)
             self.last_pos = pos
+            self.lost_frames = 0
+            self.stable_frames += 1
+
+            # 目标逼近窗口边缘或窗口尺寸不合适时换窗口；锁定稳定后逐步收回失锁时放大的窗口
+            if self.search_window:
+                if self.stable_frames % 10 == 0:
+                    self.window.relax()
+                # 无状态后端换窗口没有代价：每帧都让窗口跟随液滴
+                if not self.tracker.stateful or self.window.needs_move(self.rect, self.bbox, self.velocity()):
+                    self._init_tracker(frame, self.bbox)
 
             # 调试渲染
             if debug:
+                cv2.rectangle(debug_canvas, self.rect[:2], self.rect[2:], (255, 255, 0), 1)
                 cv2.rectangle(debug_canvas, (x, y), (x + w, y + h), (0, 255, 0), 2)
                 cv2.circle(debug_canvas, (cX, cY), 4, (0, 0, 255), -1)
                 cv2.putText(debug_canvas, f"LOCKED: [{cX}, {cY}]", (cX - 40, cY - 20),
@@ -86,9 +326,16 @@ class GalinstanTracker:
 
             return pos
         else:
-            # 目标逃逸或被严重遮挡
+            # 目标逃逸或被严重遮挡：以最后锁定的位置为中心放大搜索窗口，并用最后见到的样子重新训练
+            self.lost_frames += 1
+            self.stable_frames = 0
+            self.flow.points = None # 光流特征点随之作废，下一帧由完整追踪器接手
+            self.history.append_lost(t)
+            if self.search_window and self.window.grow():
+                self._init_tracker(frame, self.bbox, template=self.template)
             if debug:
+                cv2.rectangle(debug_canvas, self.rect[:2], self.rect[2:], (255, 255, 0), 1)
                 cv2.putText(debug_canvas, "LOST TARGET", (100, 80),
                             cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 0, 255), 2)
                 cv2.imshow("Debug_Vision_Tracking", debug_canvas)
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,181 @@
+# tests/bench_closed_loop.py
+"""
+--- 闭环延迟基准 ---
+在没有摄像头、没有 Arduino 的机器上运行真实的 main.py 控制回路：
+- 摄像头由 SyntheticCamera 替代，液滴在目标线两侧按方波阶跃往返，每一帧的真实位置与出光时刻都有记录；
+- Arduino 由 pty 上的 ArduinoEmulator 替代，记录每条 "DIR:x,PWM:y" 指令字节到达的时刻。
+
+测量指标：
+1. glass-to-command：液滴跳到目标线另一侧的第一帧离开“镜头”，到方向翻转后的第一条指令离开串口的时间；
+2. ticks/s：稳定运行期间每秒下发的控制指令数。
+任一指标相对 tests/bench_baseline.json 劣化超过容差即以非零状态码退出。
+
+用法：
+    python tests/bench_closed_loop.py                    # 跑全部模式并与基线比较
+    python tests/bench_closed_loop.py --mode pipeline    # 只跑一个模式
+    python tests/bench_closed_loop.py --update-baseline  # 以本机结果重写基线
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# --- 1. 绝对路径与模块寻址 ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BASE_DIR)
+
+from src.drivers.synthetic import SyntheticCamera, square_wave
+from src.drivers.arduino_emulator import ArduinoEmulator
+from src.engine.config_service import default_params, write_config_atomic
+from src import main as engine
+
+BASELINE_PATH = os.path.join(BASE_DIR, "tests", "bench_baseline.json")
+MODES = ("sequential", "pipeline", "fixed")
+TARGET_X = 320.0
+AMPLITUDE = 12      # 液滴在目标线两侧 ±12px 阶跃，保证每次跳变后方向位必然翻转
+STEP_PERIOD = 0.4   # 方波周期 (秒)
+WARMUP = 0.5        # 丢弃启动阶段的统计 (秒)
+
+
+def analyze(truth, commands):
+    """由相机真值与串口到达记录计算 glass-to-command 延迟与 ticks/s"""
+    truth = list(truth)
+    commands = list(commands)
+    if len(commands) < 2 or len(truth) < 2:
+        return None
+    t_start = truth[0].timestamp + WARMUP
+
+    stamps = np.array([c.timestamp for c in commands])
+    dirs = np.array([c.direction for c in commands])
+
+    latencies = []
+    missed = 0
+    steps = [cur for prev, cur in zip(truth, truth[1:]) if cur.x != prev.x and cur.timestamp > t_start]
+    for step, nxt in zip(steps, steps[1:] + [None]):
+        expected = 1 if TARGET_X - step.x > 0 else 0
+        window_end = nxt.timestamp if nxt is not None else stamps[-1] + 1e-9
+        hit = np.nonzero((stamps > step.timestamp) & (stamps <= window_end) & (dirs == expected))[0]
+        if len(hit):
+            latencies.append(stamps[hit[0]] - step.timestamp)
+        elif nxt is not None:
+            missed += 1 # 下一次跳变之前都没有响应：记为丢失（追踪失锁或回路卡死）
+
+    steady = stamps[stamps > t_start]
+    ticks_per_s = (len(steady) - 1) / (steady[-1] - steady[0]) if len(steady) > 1 else 0.0
+    lat_ms = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {
+        "steps": len(latencies),
+        "missed_steps": missed,
+        "glass_to_command_p50_ms": float(np.percentile(lat_ms, 50)),
+        "glass_to_command_p99_ms": float(np.percentile(lat_ms, 99)),
+        "glass_to_command_max_ms": float(np.max(lat_ms)),
+        "ticks_per_s": float(ticks_per_s),
+    }
+
+
+def run_mode(mode, args, workdir):
+    camera = SyntheticCamera(size=engine.FRAME_SIZE, fps=args.fps,
+                             trajectory=square_wave((TARGET_X, 240), AMPLITUDE, STEP_PERIOD))
+    emulator = ArduinoEmulator().start()
+
+    # 固定的参数文件：基准结果不受仓库里 config.json 当前取值的影响
+    config_path = os.path.join(workdir, "config.json")
+    write_config_atomic(config_path, dict(default_params(), TARGET_X=TARGET_X))
+
+    x0, y0 = TARGET_X - AMPLITUDE, 240
+    r = camera.radius + 4
+    argv = [
+        "--mode", mode, "--rate", str(args.rate), "--display", "headless", "--no-bus",
+        "--roi", f"{int(x0 - r)},{int(y0 - r)},{2 * r},{2 * r}",
+        "--port", emulator.port, "--reset-delay", "0", "--config", config_path,
+        "--max-ticks", str(args.ticks),
+        # 以方向位翻转作为“响应”的判据只对纯比例响应成立：估计器的速度阻尼项会在液滴停稳前
+        # 提前翻转方向位，使延迟被低估。基准衡量的是管线延迟，因此固定使用原始测量
+        "--estimator", "none",
+    ]
+    try:
+        engine.main(argv, camera=camera)
+    finally:
+        emulator.stop()
+    return analyze(camera.truth, emulator.commands)
+
+
+def compare(mode, result, baseline, tolerance):
+    """返回劣化项的描述列表"""
+    ref = baseline.get(mode)
+    if ref is None:
+        return []
+    failures = []
+    if result["glass_to_command_p50_ms"] > ref["glass_to_command_p50_ms"] * (1 + tolerance):
+        failures.append(f"{mode}: glass-to-command p50 {result['glass_to_command_p50_ms']:.1f}ms > 基线 {ref['glass_to_command_p50_ms']:.1f}ms")
+    if result["ticks_per_s"] < ref["ticks_per_s"] * (1 - tolerance):
+        failures.append(f"{mode}: ticks/s {result['ticks_per_s']:.1f} < 基线 {ref['ticks_per_s']:.1f}")
+    if result["missed_steps"] > result["steps"] * 0.1:
+        failures.append(f"{mode}: {result['missed_steps']} 次阶跃没有得到响应")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Galinstan 闭环延迟基准（无硬件）")
+    parser.add_argument("--mode", choices=MODES, action="append", help="要测试的运行模式，可重复；默认全部")
+    parser.add_argument("--fps", type=float, default=120.0, help="合成摄像头帧率")
+    parser.add_argument("--rate", type=float, default=100.0, help="fixed 模式的控制频率")
+    parser.add_argument("--ticks", type=int, default=600, help="每个模式下发的控制指令数")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="相对基线允许的劣化比例")
+    parser.add_argument("--update-baseline", action="store_true", help="以本次结果重写基线")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not hasattr(os, "openpty"):
+        print("❌ 串口模拟器依赖 pty，仅支持 Linux / macOS。")
+        return 2
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, "r") as f:
+            baseline = json.load(f)
+
+    results = {}
+    failures = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir) # 引擎停机时写出的 data/*.json 落在临时目录，不污染仓库
+        try:
+            for mode in args.mode or MODES:
+                print(f"\n===== 基准: {mode} =====")
+                result = run_mode(mode, args, workdir)
+                if result is None:
+                    failures.append(f"{mode}: 没有收到任何指令")
+                    continue
+                results[mode] = result
+                failures += compare(mode, result, baseline, args.tolerance)
+        finally:
+            os.chdir(cwd)
+
+    print("\n📊 闭环基准结果:")
+    print(f"   {'mode':<11}{'g2c p50':>10}{'g2c p99':>10}{'g2c max':>10}{'ticks/s':>10}{'steps':>7}{'missed':>8}")
+    for mode, r in results.items():
+        print(f"   {mode:<11}{r['glass_to_command_p50_ms']:>10.1f}{r['glass_to_command_p99_ms']:>10.1f}"
+              f"{r['glass_to_command_max_ms']:>10.1f}{r['ticks_per_s']:>10.1f}{r['steps']:>7}{r['missed_steps']:>8}")
+
+    if args.update_baseline:
+        write_config_atomic(BASELINE_PATH, dict(baseline, **results))
+        print(f"💾 基线已更新: {BASELINE_PATH}")
+        return 0
+    if failures:
+        print("\n❌ 性能回退:")
+        for line in failures:
+            print(f"   {line}")
+        return 1
+    print("\n✅ 未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
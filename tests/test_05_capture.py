@@ -0,0 +1,109 @@
+import os
+import time
+import cv2
+import pytest
+import numpy as np
+from src.drivers.frame_grabber import LatestFrameGrabber
+from src.drivers.camera import open_camera, load_profile
+from src.drivers.synthetic import SyntheticCamera
+from src.drivers.arduino_emulator import ArduinoEmulator
+from src.control.actuator import HardwareController, SerialTransmitter
+
+class FakeCapture:
+    """模拟一个 100FPS 的摄像头，每帧像素值等于帧序号"""
+    def __init__(self, period=0.01):
+        self.period = period
+        self.count = 0
+
+    def read(self):
+        time.sleep(self.period)
+        self.count += 1
+        return True, np.full((48, 64, 3), self.count % 256, dtype=np.uint8)
+
+    def release(self):
+        pass
+
+def test_latest_frame_only():
+    cap = FakeCapture()
+    grabber = LatestFrameGrabber(cap, size=(32, 24)).start()
+    try:
+        first = grabber.wait(timeout=1.0)
+        assert first is not None
+        assert first.frame.shape == (24, 32, 3) # 缩放在采集线程内完成
+
+        # 主循环“慢”了 5 帧：拿到的必须是最新一帧，而不是积压的下一帧
+        time.sleep(0.05)
+        latest = grabber.read(first.frame_id)
+        assert latest is not None
+        assert latest.frame_id >= first.frame_id + 3
+        assert latest.timestamp > first.timestamp
+
+        # 同一帧不会被重复交付
+        newer = grabber.read(latest.frame_id)
+        assert newer is None or newer.frame_id > latest.frame_id
+    finally:
+        grabber.stop()
+
+class FakeDevice:
+    """模拟一个支持 set/get 的摄像头：只有 MJPG 能给出 640x480，其余格式停留在 320x240"""
+    opened = []
+
+    def __init__(self, index, backend, delay=0.2):
+        self.index = index
+        self.props = {}
+        time.sleep(delay) # 打开设备的固定开销
+        FakeDevice.opened.append(index)
+
+    def isOpened(self):
+        return self.index in (1, 2)
+
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+
+    def get(self, prop):
+        return self.props.get(prop, 0)
+
+    def read(self):
+        mjpg = self.props.get(cv2.CAP_PROP_FOURCC) == cv2.VideoWriter_fourcc(*"MJPG")
+        w, h = (int(self.props.get(cv2.CAP_PROP_FRAME_WIDTH, 320)), int(self.props.get(cv2.CAP_PROP_FRAME_HEIGHT, 240))) if mjpg and self.index == 2 else (320, 240)
+        return True, np.zeros((h, w, 3), dtype=np.uint8)
+
+    def release(self):
+        pass
+
+def test_camera_negotiation_and_cache(tmp_path):
+    profile_path = str(tmp_path / "camera_profile.json")
+    start = time.perf_counter()
+    cap, profile = open_camera(size=(640, 480), fps=30, profile_path=profile_path, opener=FakeDevice)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.2 * 5 * 0.6 # 5 个设备并行打开，而非逐个相加
+    assert profile.index == 2 and (profile.width, profile.height) == (640, 480) # 优先选择能原生交付目标尺寸的设备
+    assert profile.fourcc == "MJPG"
+    assert load_profile(profile_path) == profile
+
+    # 第二次启动：按缓存档案直接打开，不再探测其他设备
+    FakeDevice.opened.clear()
+    cap, cached = open_camera(size=(640, 480), fps=30, profile_path=profile_path, opener=FakeDevice)
+    assert cached == profile and FakeDevice.opened == [2]
+
+@pytest.mark.skipif(not hasattr(os, "openpty"), reason="串口模拟器需要 pty")
+def test_synthetic_camera_and_emulator():
+    cam = SyntheticCamera(fps=0, trajectory=lambda t: (100.0, 50.0))
+    ret, frame = cam.read()
+    assert ret and frame.shape == (480, 640, 3)
+    assert frame[50, 100].mean() < frame[50, 300].mean() # 液滴渲染在真值位置
+    assert cam.truth[-1].x == 100.0
+
+    emulator = ArduinoEmulator().start()
+    try:
+        tx = SerialTransmitter(port=emulator.port, reset_delay=0)
+        tx.send_command(HardwareController().generate_instruction(-2.5))
+        deadline = time.time() + 1.0
+        while not emulator.commands and time.time() < deadline:
+            time.sleep(0.01)
+        assert emulator.commands[0][1:] == (0, 127)
+        tx.close()
+    finally:
+        emulator.stop()
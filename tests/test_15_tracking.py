@@ -0,0 +1,372 @@
+import numpy as np
+from src.drivers.synthetic import SyntheticCamera
+from src.vision.tracker import GalinstanTracker
+
+def lock_on(tracker, cam):
+    _, frame = cam.read()
+    g = cam.truth[-1]
+    assert tracker.calibrate(frame, (int(g.x) - 18, int(g.y) - 18, 36, 36))
+
+def test_search_window_tracking():
+    # 液滴沿椭圆轨迹运动：窗口内追踪的坐标必须正确映射回整帧
+    state = {"k": 0}
+    def trajectory(t):
+        state["k"] += 1
+        a = state["k"] * 0.05
+        return (320 + 120 * np.cos(a), 240 + 60 * np.sin(a))
+
+    cam = SyntheticCamera(fps=0, trajectory=trajectory)
+    tracker = GalinstanTracker(search_window=True)
+    lock_on(tracker, cam)
+
+    errors = []
+    for _ in range(120):
+        _, frame = cam.read()
+        g = cam.truth[-1]
+        pos = tracker.process_frame(frame)
+        assert pos is not None
+        errors.append(np.hypot(pos[0] - g.x, pos[1] - g.y))
+        x0, y0, x1, y1 = tracker.rect
+        assert (x1 - x0) * (y1 - y0) < 640 * 480 / 2 # 只搜索画面的一小块
+
+    assert np.median(errors) < 3.0
+    assert tracker.reinits < 20 # 滞回：不会每帧都重建追踪器
+
+class BlindTracker:
+    """模拟目标逃逸：追踪器报告失锁"""
+    stateful = True
+
+    def update(self, image):
+        return False, None
+
+def test_search_window_grows_on_lost_lock():
+    cam = SyntheticCamera(fps=0, trajectory=lambda t: (200.0, 240.0))
+    tracker = GalinstanTracker(search_window=True)
+    lock_on(tracker, cam)
+    for _ in range(5):
+        tracker.process_frame(cam.read()[1])
+    x0, y0, x1, y1 = tracker.rect
+    small = (x1 - x0) * (y1 - y0)
+
+    tracker.tracker = BlindTracker()
+    assert tracker.process_frame(cam.read()[1]) is None
+    x0, y0, x1, y1 = tracker.rect
+    assert tracker.lost_frames == 1
+    assert (x1 - x0) * (y1 - y0) > small # 失锁后以最后位置为中心扩大窗口
+
+    # 扩窗时用最后见到的模板重新训练：液滴仍在原处，应立即重新锁定
+    pos = tracker.process_frame(cam.read()[1])
+    assert pos is not None and abs(pos[0] - 200) < 4
+
+def test_backend_registry_and_classical_backend():
+    from src.vision.backends import available_backends, create_backend
+    from src.engine.config_service import ConfigError, validate_config, default_params
+    import pytest
+
+    assert {"csrt", "classical"} <= set(available_backends())
+    with pytest.raises(ValueError):
+        create_backend("nope")
+    with pytest.raises(ConfigError):
+        validate_config(dict(default_params(), tracker_backend="nope"))
+
+    # 经典分割后端：逐帧检测，窗口随液滴每帧移动
+    cam = SyntheticCamera(fps=0, trajectory=lambda t: (200 + 400 * t, 240))
+    tracker = GalinstanTracker(search_window=True, backend="classical")
+    lock_on(tracker, cam)
+    for _ in range(60):
+        _, frame = cam.read()
+        g = cam.truth[-1]
+        pos = tracker.process_frame(frame)
+        assert pos is not None
+        assert np.hypot(pos[0] - g.x, pos[1] - g.y) < 3.0
+
+    # 其他线程提交的快照只登记引用，追踪器状态在下一帧开头才切换
+    tracker.submit_params(dict(default_params(), tracker_backend="csrt", vis_subpixel=0))
+    assert tracker.backend == "classical" and tracker.subpixel
+    assert tracker.process_frame(cam.read()[1]) is not None
+    assert tracker.active_backend == "csrt" and not tracker.subpixel
+
+def test_classical_detector_reuses_buffers_and_rejects_clutter():
+    import cv2
+    from src.vision.classical import ClassicalDetector
+
+    cam = SyntheticCamera(fps=0, trajectory=lambda t: (200, 240))
+    _, frame = cam.read()
+    cv2.rectangle(frame, (400, 100), (600, 110), (60, 60, 70), -1) # 细长划痕：圆度不合格
+    cv2.circle(frame, (500, 380), 14, (60, 60, 70), -1)           # 另一颗液滴：运动连续性约束排除
+
+    for scale in (1.0, 0.5):
+        det = ClassicalDetector(scale=scale)
+        blob = det.detect(frame, near=(205, 235), max_jump=150)
+        assert abs(blob.cx - 200) < 1.5 and abs(blob.cy - 240) < 1.5
+        assert len(det.candidates(frame)) == 2
+        assert det.detect(frame, near=(100, 100), max_jump=50) is None
+
+        # 稳态下不再分配新的缓冲区，掩膜总是同一块内存
+        mask = det.segment(frame, scale)
+        n_buffers = len(det._buffers)
+        det.detect(frame, near=(205, 235))
+        assert det.segment(frame, scale) is mask
+        assert len(det._buffers) == n_buffers
+
+def test_auto_calibrate_confidence():
+    import cv2
+    cam = SyntheticCamera(fps=0, trajectory=lambda t: (250, 200))
+    frames = [cam.read()[1] for _ in range(5)]
+
+    tracker = GalinstanTracker()
+    ok, confidence = tracker.auto_calibrate(frames, manual_fallback=False)
+    assert ok and confidence > 0.9
+    x, y, w, h = tracker.bbox
+    assert abs(x + w / 2 - 250) < 2 and abs(y + h / 2 - 200) < 2
+
+    # 两颗一模一样的液滴：无法区分，置信度减半，不会自动锁定
+    for f in frames:
+        cv2.circle(f, (450, 300), 14, (60, 60, 70), -1)
+    ok, confidence = GalinstanTracker().auto_calibrate(frames, manual_fallback=False)
+    assert not ok and confidence < 0.6
+
+def test_reacquire_after_teleport():
+    import time
+    from src.vision.reacquire import Reacquirer
+
+    # 液滴第 20 帧瞬移到画面另一侧：追踪器必须报告失锁，后台检测找回后重新锁定
+    state = {"k": 0}
+    def trajectory(t):
+        state["k"] += 1
+        return (200, 240) if state["k"] < 20 else (480, 300)
+
+    cam = SyntheticCamera(fps=0, trajectory=trajectory)
+    tracker = GalinstanTracker(backend="kcf")
+    lock_on(tracker, cam)
+    reacquirer = Reacquirer().start()
+    try:
+        for _ in range(60):
+            _, frame = cam.read()
+            pos = reacquirer.step(tracker, frame, time.perf_counter(), tracker.process_frame(frame))
+            time.sleep(0.002) # 给后台线程留出检测时间
+    finally:
+        reacquirer.stop()
+
+    g = cam.truth[-1]
+    assert pos is not None and np.hypot(pos[0] - g.x, pos[1] - g.y) < 3.0
+    summary = reacquirer.summary()
+    assert summary["episodes"] == 1 and summary["reacquired"] == 1
+    assert summary["time_to_reacquire_max_ms"] > 0
+    # 找回之后历史照常保留：失锁记录仍在，锁定率反映整个运行期间
+    assert tracker.history.stats()["lock_rate"] < 1.0 and len(tracker.history) > 40
+    # 后台检测用的是背景模型的副本，追踪线程之后的学习不会写到它
+    model = reacquirer.bg_detector.model
+    assert model is not tracker.background and not np.shares_memory(model.mean, tracker.background.mean)
+
+def test_multi_droplet_tracking_and_merge():
+    import itertools
+    import cv2
+    from src.vision.multi_tracker import MultiDropletTracker, hungarian
+
+    # numpy 匈牙利算法与穷举结果一致（含矩形矩阵）
+    rng = np.random.default_rng(1)
+    for shape in [(4, 4), (3, 5), (5, 3)]:
+        cost = rng.random(shape)
+        rows, cols = hungarian(cost)
+        n = min(shape)
+        best = min(sum(cost[i, p[i]] for i in range(n)) for p in itertools.permutations(range(shape[1]), n)) \
+            if shape[0] <= shape[1] else \
+            min(sum(cost[p[j], j] for j in range(n)) for p in itertools.permutations(range(shape[0]), n))
+        assert len(rows) == n and np.isclose(cost[rows, cols].sum(), best)
+
+    # 三颗液滴：两颗相向运动并在中间融合成一颗更大的，第三颗静止
+    background = np.clip(rng.normal(180, 12, (480, 640, 1)), 0, 255).astype(np.uint8).repeat(3, axis=2)
+    tracker = MultiDropletTracker()
+    for k in range(80):
+        frame = background.copy()
+        ax, cx = 100 + 4 * k, 540 - 4 * k
+        if ax < cx - 10:
+            cv2.circle(frame, (ax, 140), 14, (60, 60, 70), -1)
+            cv2.circle(frame, (cx, 140), 14, (60, 60, 70), -1)
+        else:
+            cv2.circle(frame, (320, 140), 20, (60, 60, 70), -1)
+        cv2.circle(frame, (320, 360), 14, (60, 60, 70), -1)
+        tracks = tracker.update(frame, k / 30)
+        if k == 20:
+            assert sorted((round(t.x), round(t.y)) for t in tracks) == [(180, 140), (320, 360), (460, 140)]
+            ids = {round(t.x): t.id for t in tracks}
+
+    assert tracker.births == 3 and len(tracker.merges) == 1
+    assert set(tracker.merges[0]) == {ids[180], ids[460]}
+    final = {t.id: t for t in tracks}
+    assert set(final) == {tracker.merges[0][1], ids[320]} # 身份保持：静止液滴的 id 始终不变
+    assert final[ids[320]].area < final[tracker.merges[0][1]].area
+
+def test_subpixel_centroid():
+    import cv2
+    from src.vision.subpixel import refine_centroid
+
+    # 抗锯齿渲染的液滴（带镜面高光），以 0.25px/帧 的速度平移：坐标应当连续变化而不是 1px 台阶
+    rng = np.random.default_rng(2)
+    background = np.clip(rng.normal(180, 12, (480, 640, 1)), 0, 255).astype(np.uint8).repeat(3, axis=2)
+    def render(x, y):
+        frame = background.copy()
+        cv2.circle(frame, (int(x * 16), int(y * 16)), 14 * 16, (60, 60, 70), -1, cv2.LINE_AA, 4)
+        cv2.circle(frame, (int((x - 4) * 16), int((y - 4) * 16)), 3 * 16, (250, 250, 250), -1, cv2.LINE_AA, 4)
+        return frame
+
+    c = refine_centroid(render(300.3, 200.7), (281, 184, 36, 36)) # 框偏离液滴 1~2px
+    assert abs(c.x - 300.3) < 0.2 and abs(c.y - 200.7) < 0.2 and c.quality > 0.9
+    clipped = refine_centroid(render(300.3, 200.7), (300, 182, 36, 36), pad=0) # 框从液滴中间截断
+    assert clipped.quality < 0.3
+
+    tracker = GalinstanTracker(backend="kcf")
+    assert tracker.calibrate(render(300.0, 240.0), (282, 222, 36, 36))
+    xs = [tracker.process_frame(render(300.0 + 0.25 * k, 240.0))[0] for k in range(1, 41)]
+    truth = 300.0 + 0.25 * np.arange(1, 41)
+    assert np.max(np.abs(np.array(xs) - truth)) < 0.3
+    assert tracker.centroid_quality > 0.9
+
+def test_hybrid_flow_tracking_adapts_interval():
+    # 慢速运动：大部分帧由光流传播，精度与逐帧 CSRT 相当；快速运动时 N 自动收缩
+    def run(speed):
+        state = {"k": 0}
+        def trajectory(t):
+            state["k"] += 1
+            return (200 + speed * state["k"], 240 + 10 * np.sin(state["k"] / 15))
+        cam = SyntheticCamera(fps=0, trajectory=trajectory)
+        tracker = GalinstanTracker(search_window=False)
+        tracker.hybrid = True
+        lock_on(tracker, cam)
+        errors = []
+        for _ in range(60):
+            _, frame = cam.read()
+            g = cam.truth[-1]
+            pos = tracker.process_frame(frame)
+            assert pos is not None
+            errors.append(np.hypot(pos[0] - g.x, pos[1] - g.y))
+        return tracker.flow, np.percentile(errors, 95)
+
+    slow, err = run(0.5)
+    assert slow.flow_frames > 3 * slow.full_frames and err < 1.0
+    fast, err = run(6.0)
+    assert fast.interval <= 2 and fast.full_frames > slow.full_frames and err < 1.0
+
+def test_track_history_ring_buffer():
+    from src.vision.history import TrackHistory
+
+    h = TrackHistory(8)
+    for k in range(13): # 超出容量：只保留最近 8 条，且按时间从旧到新排列
+        if k == 10:
+            h.append_lost(k / 10)
+        else:
+            h.append(k / 10, 2.0 * k, 100.0 - k, 36, 36, 0.9)
+    v = h.view()
+    assert len(h) == 8 and list(v["seq"]) == list(range(5, 13))
+    assert np.shares_memory(v, h.view(3)) and list(h.view(3)["seq"]) == [10, 11, 12]
+
+    # 速度按帧序号计算，跨过失锁帧也不失真
+    assert np.allclose(h.velocity(3), (2.0, -1.0))
+    assert list(h.window(0.25)["seq"]) == [10, 11, 12]
+    s = h.stats()
+    assert s["lock_rate"] == 7 / 8 and np.isclose(s["mean"][0], 2.0 * np.mean([5, 6, 7, 8, 9, 11, 12]))
+
+    # 追踪器在历史里同时记下锁定帧与失锁帧
+    cam = SyntheticCamera(fps=0, trajectory=lambda t: (320, 240))
+    tracker = GalinstanTracker(backend="kcf")
+    lock_on(tracker, cam)
+    for _ in range(5):
+        tracker.process_frame(cam.read()[1], timestamp=1.0)
+    assert len(tracker.history) == 5 and not tracker.history.view()["lost"].any()
+    assert abs(tracker.history.last()["x"] - 320) < 1.0
+
+def test_background_backend_ignores_electrodes_and_shadow():
+    import cv2
+    from src.vision.background import BackgroundDetector
+    from src.vision.classical import ClassicalDetector
+
+    # 静态场景：纹理背景 + 暗色电极条 + 一个和液滴一样暗、一样圆的杂质；液滴带着影子移动
+    rng = np.random.default_rng(0)
+    scene = np.clip(rng.normal(180, 12, (480, 640, 1)), 0, 255).astype(np.uint8).repeat(3, axis=2)
+    cv2.rectangle(scene, (40, 0), (70, 479), (70, 70, 80), -1)
+    cv2.circle(scene, (500, 380), 15, (65, 65, 75), -1)
+    def render(k):
+        frame = scene.copy()
+        x, y = 200 + 1.5 * k, 240 + 30 * np.sin(k / 20)
+        shadow = np.zeros((480, 640), np.uint8)
+        cv2.circle(shadow, (int(x + 25), int(y + 20)), 22, 255, -1)
+        frame[shadow > 0] = (frame[shadow > 0] * 0.7).astype(np.uint8)
+        cv2.circle(frame, (int(round(x)), int(round(y))), 14, (60, 60, 70), -1)
+        return frame, (x, y)
+
+    tracker = GalinstanTracker(backend="background")
+    frame, (x, y) = render(0)
+    assert tracker.calibrate(frame, (int(x) - 18, int(y) - 18, 36, 36))
+    errors = []
+    for k in range(1, 100):
+        frame, (x, y) = render(k)
+        pos = tracker.process_frame(frame)
+        assert pos is not None
+        errors.append(np.hypot(pos[0] - x, pos[1] - y))
+    assert np.percentile(errors, 95) < 4.0
+
+    # 整帧检测：自适应阈值把杂质当成候选，背景模型只看到液滴
+    frame, (x, y) = render(100)
+    assert any(abs(b.cx - 500) < 3 and abs(b.cy - 380) < 3 for b in ClassicalDetector().candidates(frame))
+    blobs = BackgroundDetector(tracker.background).candidates(frame)
+    assert len(blobs) >= 1 and all(np.hypot(b.cx - x, b.cy - y) < 10 for b in blobs)
+
+def test_calibration_pixel_to_mm(tmp_path):
+    import cv2
+    import pytest
+    from src.vision.calibration import Calibration, board_points, from_checkerboard, from_correspondences
+
+    # 镜头：已知内参与桶形畸变，棋盘格以不同姿态拍 6 张，最后一张平放在培养皿上
+    K = np.array([[600.0, 0, 322], [0, 600.0, 238], [0, 0, 1]])
+    dist = np.array([-0.25, 0.08, 0, 0, 0])
+    obj = board_points((9, 6), 2.5)
+    rng = np.random.default_rng(1)
+    views = []
+    for _ in range(6):
+        rvec = rng.normal(0, 0.25, 3)
+        tvec = np.array([-10, -6, 60]) + rng.normal(0, 3, 3)
+        p, _ = cv2.projectPoints(np.hstack([obj, np.zeros((len(obj), 1))]), rvec, tvec, K, dist)
+        views.append(p.reshape(-1, 2))
+    cal, error = from_correspondences((640, 480), views, obj)
+    assert error < 0.05 and np.allclose(cal.dist_coeffs[:2], dist[:2], atol=0.01)
+    assert np.abs(cal.to_mm_points(views[-1]) - obj).max() < 0.01
+    x, y = views[-1][20]
+    assert np.allclose(cal.to_pixel(*cal.to_mm(x, y)), (x, y), atol=0.01)
+
+    # 查找表随标定一起存盘，读回后逐点换算结果一致；画面外的点退回解析公式
+    path = str(tmp_path / "calibration.npz")
+    cal.save(path)
+    loaded = Calibration.load(path)
+    assert np.allclose(loaded.to_mm(300.3, 200.7), cal.to_mm(300.3, 200.7))
+    assert np.allclose(cal.to_mm(-20, 10), cal._analytic_mm([(-20, 10)])[0], atol=1e-6)
+
+    # 只有一张棋盘格照片：不估计畸变，只求单应矩阵（俯视，5px/mm）
+    board = np.full((480, 640), 255, np.uint8)
+    for r in range(7):
+        for c in range(10):
+            if (r + c) % 2 == 0:
+                cv2.rectangle(board, (100 + 40 * c, 80 + 40 * r), (139 + 40 * c, 119 + 40 * r), 0, -1)
+    cal, error, used = from_checkerboard([board], pattern=(9, 6), square_mm=8.0)
+    assert used == 1 and not cal.dist_coeffs.any() and error < 0.1
+    assert np.allclose(cal.to_mm(140 + 40 * 3, 120 + 40 * 2), (24.0, 16.0), atol=0.1)
+    assert abs(cal.scale_at(320, 240) - 0.2) < 0.002
+
+    # 培养皿平面照片（最后一张）没有棋盘格：报错，而不是把单应矩阵落在别的照片上
+    blank = np.full_like(board, 255)
+    with pytest.raises(ValueError):
+        from_checkerboard([board, blank], pattern=(9, 6), square_mm=8.0)
+    # 命令行按参数顺序排列照片：文件名排在前面的 a_dish.png 作为最后一个参数仍是培养皿平面
+    from src.vision import calibration
+    cv2.imwrite(str(tmp_path / "a_dish.png"), board)
+    cv2.imwrite(str(tmp_path / "z_lens.png"), blank)
+    out = str(tmp_path / "cli.npz")
+    assert calibration.main([str(tmp_path / "z_*.png"), str(tmp_path / "a_dish.png"), "--square", "8", "--out", out]) == 0
+    assert np.allclose(Calibration.load(out).to_mm(260, 200), (24.0, 16.0), atol=0.1)
+    assert calibration.main([str(tmp_path / "a_dish.png"), "--plane", str(tmp_path / "z_lens.png"), "--out", out]) == 1
+
+    # 引擎：config.json 里的 TARGET_X 是像素，换入 brain 之前换算为毫米；未加载标定时原样透传
+    from src.main import brain_params
+    params = {"Kp": 0.4, "TARGET_X": 140.0 + 40 * 3}
+    assert np.isclose(brain_params(cal, params)["TARGET_X"], 24.0, atol=0.1) and params["TARGET_X"] == 260.0
+    assert brain_params(None, params) is params
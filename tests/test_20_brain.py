@@ -1,5 +1,9 @@
+import json
 import time
 import math # 用于处理符号函数 copysign
+
+import numpy as np
+
 # 假设你的 PhysicsBrain 类定义在 src/analysis/Brain.py 中
 from src.analysis.Brain import PhysicsBrain 
 
@@ -16,6 +20,7 @@ TARGET_X = 100.0
 MAX_VOLTAGE = 5.0           # 硬件最大输出电压，防止电解液沸腾
 STATIC_FRICTION_TH = 0.5    # 接触线钉扎阈值：克服静摩擦所需的最小力
 
+
 def test_virtual_droplet():
     # 1. 实例化“大脑”
     brain = PhysicsBrain(Kp=KP, Ki=KI, Kd=KD, target_x=TARGET_X)
@@ -85,5 +90,203 @@ def test_virtual_droplet():
             vel += acc * PHYSICS_DT
             pos += vel * PHYSICS_DT
 
+
+def test_estimator_latency_compensation_and_dropout():
+    from src.analysis.estimator import create_estimator
+
+    rng = np.random.default_rng(0)
+    for kind in ("kalman", "abg"):
+        est = create_estimator(kind)
+        # 液滴以 200 px/s 匀速运动，30FPS 采样，测量为带噪声的整数像素，控制回路滞后 30ms
+        errors, raw_errors, vel_errors = [], [], []
+        for k in range(90):
+            t = k / 30.0
+            z = (round(100 + 200 * t + rng.normal(0, 1.0)), 240)
+            state = est.step(t, z, t + 0.03)
+            if k > 15:
+                errors.append(state.pos[0] - (100 + 200 * (t + 0.03)))
+                raw_errors.append(z[0] - (100 + 200 * (t + 0.03)))
+                vel_errors.append(state.vel[0] - 200)
+        assert np.sqrt(np.mean(np.square(errors))) < 0.5 * np.sqrt(np.mean(np.square(raw_errors)))
+        assert np.sqrt(np.mean(np.square(vel_errors))) < 30 # 逐帧差分的噪声约 30·√2 ≈ 42 px/s
+
+        # 短时丢失：继续外推；超过 max_dropout 后放弃
+        t_last = 89 / 30.0
+        coast = est.predict(t_last + 0.2)
+        assert abs(coast.pos[0] - (100 + 200 * (t_last + 0.2))) < 10
+        assert est.predict(t_last + est.max_dropout + 0.01) is None
+
+    # 速度参数：微分项改用估计速度
+    brain = PhysicsBrain(Kp=0.0, Ki=0.0, Kd=1.0, target_x=0.0)
+    assert brain.think([0.0, 0], dt=0.01, velocity=50.0) < 0 # 向 +x 运动 -> 制动方向为负
+
+
+def test_batch_brain_matches_scalar():
+    from src.analysis.batch_brain import BatchPhysicsBrain
+
+    rng = np.random.default_rng(0)
+    n = 32
+    brains = [PhysicsBrain(Kp=rng.uniform(0, 2), Ki=rng.uniform(0, 0.5), Kd=rng.uniform(0, 1),
+                           target_x=rng.uniform(100, 500)) for _ in range(n)]
+    for b in brains[::4]:
+        b.voltage_threshold = rng.uniform(0.5, 2.0)
+    batch = BatchPhysicsBrain.from_brains(brains)
+
+    x = rng.uniform(0, 640, n)
+    for step in range(200):
+        x += rng.normal(0, 5, n)
+        pos = x.copy()
+        pos[rng.random(n) < 0.1] = np.nan           # 失锁：对应标量版本的 current_pos=None
+        dt = np.where(rng.random(n) < 0.05, 0.0, rng.uniform(0.01, 0.05, n))
+        vel = rng.normal(0, 50, n) if step % 3 == 0 else None
+        if step == 100:
+            mask = np.arange(n) % 2 == 0
+            batch.update_target(320.0, mask)
+            for i in np.nonzero(mask)[0]:
+                brains[i].update_target(320.0)
+
+        v = batch.think(pos, dt, velocity=vel)
+        expected = [b.think(None if np.isnan(pos[i]) else [pos[i], 0], dt=dt[i],
+                            velocity=None if vel is None else vel[i]) for i, b in enumerate(brains)]
+        assert np.allclose(v, expected, rtol=1e-12, atol=1e-12)
+
+    assert np.allclose(batch.integral_error, [b.integral_error for b in brains])
+    assert batch.brain(3).think([200.0, 0], 0.02) == brains[3].think([200.0, 0], 0.02)
+
+
+def test_batch_simulator_matches_virtual_droplet():
+    from src.analysis.batch_brain import BatchPhysicsBrain
+    from src.analysis.simulator import DropletPlant, simulate
+
+    def scalar_loop(viscous, static_th, frames=40):
+        # test_virtual_droplet 的双重循环（去掉打印），逐帧记录位置
+        brain = PhysicsBrain(Kp=KP, Ki=KI, Kd=KD, target_x=TARGET_X)
+        pos = vel = 0.0
+        trace = []
+        for _ in range(frames):
+            trace.append(pos)
+            voltage = max(min(brain.think([pos, 0], dt=VISION_DT), MAX_VOLTAGE), -MAX_VOLTAGE)
+            force = 0.0
+            if abs(voltage) > brain.voltage_threshold:
+                force = math.copysign((abs(voltage) - brain.voltage_threshold) ** 2 / brain.k_factor, voltage)
+            for _ in range(int(VISION_DT / PHYSICS_DT)):
+                if abs(vel) < 1e-4:
+                    net = force - math.copysign(static_th, force) if abs(force) > static_th else 0.0
+                else:
+                    net = force - viscous * vel - math.copysign(0.1, vel)
+                vel += net * PHYSICS_DT
+                pos += vel * PHYSICS_DT
+        return trace
+
+    viscous = np.array([0.3, 0.1, 0.6])
+    static_th = np.array([STATIC_FRICTION_TH, 0.2, 1.5])
+    brain = BatchPhysicsBrain(3, Kp=KP, Ki=KI, Kd=KD, target_x=TARGET_X)
+    result = simulate(brain, DropletPlant(3, viscous=viscous, static_threshold=static_th), 40 * VISION_DT)
+    for i in range(3):
+        assert np.allclose(result.position[:, i], scalar_loop(viscous[i], static_th[i]), atol=1e-9)
+
+    # 视觉延迟：控制器看到的是 latency 之前的位置；同一 seed 的测量噪声可复现
+    brain = BatchPhysicsBrain(2, Kp=KP, Ki=KI, Kd=KD, target_x=20.0)
+    delayed = simulate(brain, DropletPlant(2), 4.0, latency=[0.0, 0.1])
+    assert np.allclose(delayed.measured[2:, 1], delayed.position[:-2, 1])
+    assert delayed.position[:, 1].max() > delayed.position[:, 0].max() # 延迟加剧过冲
+    runs = [simulate(BatchPhysicsBrain(4, Kp=KP, target_x=TARGET_X), DropletPlant(4), 1.0, noise=2.0, seed=7)
+            for _ in range(2)]
+    assert np.array_equal(runs[0].measured, runs[1].measured)
+
+
+def test_monte_carlo_cache_and_metrics(tmp_path):
+    from src.analysis import monte_carlo as mc
+    from src.analysis.simulator import SimResult
+
+    cache = str(tmp_path / "mc.jsonl")
+    calls = []
+    kwargs = dict(scenarios=16, duration=6.0, cache_path=cache, progress=lambda done, total, cached: calls.append(cached))
+    gains = [(0.8, 0.0, 0.4), (0.4, 0.0, 0.4)]
+    first = mc.run(gains, workers=2, **kwargs)
+    assert all(0.0 <= r["settled_fraction"] <= 1.0 and r["gains"] == list(g) for r, g in zip(first, gains))
+    assert first[0]["saturation_time"]["p90"] > first[1]["saturation_time"]["p90"] # 增益越大越容易饱和
+
+    # 重跑：已算过的点直接取缓存，只计算新的点；结果与第一次完全一致
+    calls.clear()
+    second = mc.run(gains + [(0.8, 0.05, 0.4)], workers=1, **kwargs)
+    assert calls == [2] and second[:2] == json.loads(json.dumps(first))
+    assert sum(1 for _ in open(cache)) == 3
+
+    # 散布改变 -> 缓存键改变
+    spread = dict(mc.SPREAD, latency=0.2)
+    assert mc.task_key({"gains": [0.8, 0, 0.4], "spread": spread}) != mc.task_key({"gains": [0.8, 0, 0.4], "spread": mc.SPREAD})
+
+    # 指标：一条先冲过目标 20% 再回到目标的轨迹
+    t = np.arange(100) * 0.05
+    x = np.minimum(t / 2.0, 1.0) * 120.0
+    x[60:] = 100.0
+    result = SimResult(t, x[:, None], x[:, None], np.zeros((100, 1)), np.zeros((100, 1), bool), None)
+    m = mc.step_metrics(result, 0.0, 100.0)
+    assert np.isclose(m["overshoot"][0], 20.0) and np.isclose(m["settling_time"][0], 3.0)
+    assert m["steady_state_error"][0] == 0.0 and m["saturation_time"][0] == 0.0
+
+
+def test_autotune_gain_table_and_relay(tmp_path):
+    from src.analysis import autotune
+    from src.analysis.simulator import DropletPlant
+    from src.vision.history import TrackHistory
+
+    # 搜索：增益表按验证代价排序，且都在仪表盘滑动条的范围内；第一名优于名义增益
+    with autotune.CandidateEvaluator(scenarios=8, duration=6.0, workers=1) as evaluator:
+        table = autotune.optimize(evaluator, population=8, generations=3, table_size=3, validate=16)
+        nominal = evaluator([(0.8, 0.05, 0.2)], seed=evaluator.settings["seed"] + 1000, scenarios=16)["cost"][0]
+    assert len(table) == 3 and [r["cost"] for r in table] == sorted(r["cost"] for r in table)
+    assert all(autotune.GAIN_BOUNDS[g][0] <= round(r[g], 3) <= autotune.GAIN_BOUNDS[g][1] for r in table for g in autotune.GAINS)
+    assert table[0]["cost"] < nominal
+
+    # 继电反馈：仿真液滴形成持续振荡；纯比例 Kp = Ku 恰好落在临界点上，确认不通过并排到表尾
+    sense, actuate = autotune.simulated_rig(DropletPlant(1, viscous=0.6))
+    relay = autotune.relay_feedback(sense, actuate, 20.0)
+    assert relay is not None and relay.cycles >= 2 and 2.0 < relay.tu < 8.0
+    rows = [{"Kp": relay.ku, "Ki": 0.0, "Kd": 0.0}, dict(table[0])]
+    autotune.confirm(rows, relay)
+    assert rows[0]["relay_ok"] and not rows[1]["relay_ok"] and rows[1]["relay_distance"] < 1e-6
+
+    # 真实装置一直追踪不到液滴：第一次测量有上限，不会无限等待
+    polls = []
+    assert autotune.first_measurement(lambda: polls.append(1), max_missing=5) is None and len(polls) == 6
+    assert autotune.first_measurement(iter([None, None, (0.5, 12.0)]).__next__) == (0.5, 12.0)
+
+    # 录制日志：20Hz、σ=0.5px 的追踪历史 -> 视觉周期与噪声
+    history = TrackHistory(400)
+    rng = np.random.default_rng(0)
+    for i in range(400):
+        history.append(i * 0.05, 100.0 + 2.0 * i * 0.05 + rng.normal(0.0, 0.5), 240.0)
+    history.save(str(tmp_path / "history.npy"))
+    profile = autotune.profile_from_logs(str(tmp_path / "history.npy"))
+    assert np.isclose(profile["vision_dt"], 0.05) and 0.4 < profile["noise"] < 0.6
+
+    # 命令行：增益表写入 config.json，其余键保留，--apply 切换当前增益
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"Kp": 0.4, "Ki": 0.01, "Kd": 0.1, "TARGET_X": 320.0}))
+    assert autotune.main(["--generations", "2", "--population", "4", "--scenarios", "4", "--duration", "4",
+                          "--workers", "1", "--config", str(config), "--apply"]) == 0
+    cfg = json.loads(config.read_text())
+    assert cfg["TARGET_X"] == 320.0 and len(cfg["gain_table"]) == autotune.TABLE_SIZE
+    assert all(cfg[g] == cfg["gain_table"][0][g] for g in autotune.GAINS)
+
+
+def test_apply_params_keeps_toggled_target():
+    brain = PhysicsBrain(Kp=KP, Ki=KI, Kd=KD, target_x=320.0)
+    brain.apply_params({"Kp": KP, "TARGET_X": 320.0})
+    brain.update_target(150.0) # [t] 键切换目标
+    brain.think([100.0, 0], dt=0.05)
+    integral = brain.integral_error
+
+    # 只改增益：目标与积分器保持不变
+    brain.apply_params({"Kp": 0.5, "TARGET_X": 320.0})
+    assert brain.Kp == 0.5 and brain.target_x == 150.0 and brain.integral_error == integral
+
+    # 配置里的目标真的变了才换入
+    brain.apply_params({"Kp": 0.5, "TARGET_X": 400.0})
+    assert brain.target_x == 400.0 and brain.integral_error == 0.0
+
+
 if __name__ == "__main__":
-    test_virtual_droplet()
\ No newline at end of file
+    test_virtual_droplet()
@@ -0,0 +1,218 @@
+import time
+import socket
+import threading
+import numpy as np
+import pytest
+from src.engine.pipeline import PipelineEngine, DropOldestQueue, Message
+from src.engine.scheduler import FixedRateScheduler
+from src.engine.config_service import ConfigService, ConfigError, write_config_atomic
+from src.engine.bus import EngineBus, BusClient
+from src.engine.metrics import LatencyRecorder, MetricsExporter
+
+def test_drop_oldest_queue():
+    q = DropOldestQueue(maxsize=2)
+    for i in range(5):
+        q.put(i)
+    assert q.dropped == 3
+    assert q.get(timeout=0) == 3
+    assert q.get_latest() == 4
+    assert q.get(timeout=0) is None
+
+def test_pipeline_overlaps_stages():
+    # 两个各耗时 10ms 的阶段：串行需要 20ms/帧，流水线应当接近 10ms/帧
+    counter = {"n": 0}
+
+    def source(timeout):
+        time.sleep(0.002)
+        counter["n"] += 1
+        return Message(counter["n"], time.perf_counter(), counter["n"])
+
+    done = []
+    def slow_a(msg):
+        time.sleep(0.01)
+        return msg.payload
+
+    def slow_b(msg):
+        time.sleep(0.01)
+        done.append(msg.frame_id)
+        return None
+
+    engine = PipelineEngine()
+    engine.set_source(source)
+    engine.add_stage("a", slow_a)
+    engine.add_stage("b", slow_b)
+    engine.start()
+    time.sleep(0.5)
+    engine.stop()
+
+    stats = engine.stats()
+    assert len(done) > 0.5 / 0.02 * 1.3 # 明显快于串行吞吐
+    assert done == sorted(done)          # frame_id 透传且保持顺序
+    assert stats["a"]["dropped"] > 0     # 源头快于第一级，旧帧被丢弃而非积压
+    assert stats["a"]["occupancy"] > 0.5
+
+def test_fixed_rate_scheduler():
+    sched = FixedRateScheduler(rate_hz=100)
+    dts = []
+
+    def tick(dt):
+        dts.append(dt)
+        if len(dts) == 10:
+            time.sleep(0.035) # 人为制造一次超时：应记为错过 3 个期限
+        return len(dts) < 30
+
+    sched.run(tick)
+    stats = sched.stats()
+    assert stats["ticks"] == 30
+    assert stats["missed"] >= 2
+    assert stats["lateness_max_ms"] >= 20
+    # 超时之后保持相位对齐，其余节拍的 dt 仍贴近 10ms
+    median_dt = sorted(dts)[len(dts) // 2]
+    assert abs(median_dt - 0.01) < 0.002
+    assert max(dts) >= 0.035 # dt 如实反映了真实流逝的时间
+
+def test_fixed_rate_derivative_uses_measurement_interval():
+    from types import SimpleNamespace
+    from src.main import measured_velocity
+    from src.analysis.Brain import PhysicsBrain
+
+    # 30FPS 的测量被 120Hz 的 tick 采样保持：每帧重复用 4 次，液滴匀速 30px/s
+    ctx = SimpleNamespace(calibration=None)
+    brain = PhysicsBrain(Kp=0.0, Ki=0.0, Kd=1.0, target_x=500.0)
+    prev, velocity, volts = None, None, []
+    for tick in range(40):
+        k = tick // 4
+        msg = Message(k, k / 30.0, {"pos": [100.0 + k, 240.0]})
+        if tick % 4 == 0:
+            velocity, prev = measured_velocity(ctx, prev, msg), msg
+        volts.append(brain.think(msg.payload["pos"], dt=1 / 120.0, velocity=velocity))
+    # 第一帧之后微分项恒定，不再在重复帧上归零、新帧上放大 4 倍
+    assert np.allclose(volts[4:], volts[4]) and volts[4] < 0
+    assert np.isclose(measured_velocity(ctx, prev, Message(99, prev.timestamp + 0.1, {"pos": None})), 0.0)
+
+def test_config_service_change_detection(tmp_path):
+    path = str(tmp_path / "config.json")
+    write_config_atomic(path, {"Kp": 0.5, "Critical_V": 2.0})
+
+    service = ConfigService(path, min_interval=0.0)
+    assert service.poll() is True
+    first = service.snapshot
+    assert first.params["Kp"] == 0.5 and first.params["Ki"] == 0.01 # 缺省键以默认值补齐
+    with pytest.raises(TypeError):
+        first.params["Kp"] = 9.9 # 快照只读
+
+    # 文件未变化：不重新解析
+    assert service.poll() is False
+    assert service.snapshot is first
+
+    # 半截文件与越界数值都被整体拒收，沿用上一份快照
+    with open(path, "w") as f:
+        f.write('{"Kp": 0.')
+    assert service.poll() is False
+    assert service.rejections == 1 and service.snapshot is first
+    write_config_atomic(path, {"Kp": 99.0})
+    assert service.poll() is False
+    assert service.rejections == 2 and service.snapshot is first
+
+    write_config_atomic(path, {"Kp": 0.8, "Critical_V": 2.0})
+    assert service.poll() is True
+    assert service.snapshot.version == first.version + 1
+    assert service.snapshot.params["Kp"] == 0.8
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 域套接字")
+def test_bus_roundtrip(tmp_path):
+    address = "unix:" + str(tmp_path / "bus.sock")
+    bus = EngineBus(address, telemetry_hz=1000).start()
+    try:
+        client = BusClient(address)
+        config = ConfigService(str(tmp_path / "missing.json"))
+
+        # 引擎侧：模拟一个控制 tick 处理下发的参数，并以当前帧号回执
+        def engine_tick(frame_id):
+            for client_id, msg in bus.drain():
+                try:
+                    config.push(msg["params"])
+                    bus.reply(client_id, {"type": "ack", "seq": msg["seq"], "frame_id": frame_id, "version": config.snapshot.version})
+                except ConfigError as e:
+                    bus.reply(client_id, {"type": "nack", "seq": msg["seq"], "error": str(e)})
+            bus.publish_telemetry({"frame_id": frame_id, "voltage": 1.5})
+
+        stop = threading.Event()
+        def engine_loop():
+            frame_id = 0
+            while not stop.is_set():
+                frame_id += 1
+                engine_tick(frame_id)
+                time.sleep(0.005)
+        t = threading.Thread(target=engine_loop)
+        t.start()
+        try:
+            ack = client.set_params({"Kp": 1.5}, wait=1.0)
+            assert ack["type"] == "ack" and ack["frame_id"] > 0
+            assert config.snapshot.params["Kp"] == 1.5
+
+            nack = client.set_params({"Kp": -3}, wait=1.0)
+            assert nack["type"] == "nack"
+            assert config.snapshot.params["Kp"] == 1.5
+
+            deadline = time.time() + 1.0
+            while client.telemetry is None and time.time() < deadline:
+                time.sleep(0.01)
+            assert client.telemetry["voltage"] == 1.5
+        finally:
+            stop.set()
+            t.join()
+            client.close()
+    finally:
+        bus.stop()
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 域套接字")
+def test_bus_drops_malformed_messages(tmp_path):
+    path = str(tmp_path / "bus.sock")
+    bus = EngineBus("unix:" + path, telemetry_hz=10).start()
+    try:
+        raw = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        raw.connect(path)
+        # 合法 JSON 但不是对象、非法的订阅频率、非 UTF-8 字节：都不能让 I/O 线程退出
+        raw.sendall(b'3\n[1, 2]\n"set"\n{"type": "subscribe", "rate_hz": "abc"}\n'
+                    b'{"type": "subscribe", "rate_hz": null}\n\xff\xfe\n'
+                    b'{"type": "set", "seq": 1, "params": 3}\n{"type": "set", "seq": 2, "params": {"Kp": 1.0}}\n')
+        deadline = time.time() + 1.0
+        msgs = []
+        while len(msgs) < 2 and time.time() < deadline:
+            msgs += [m for _, m in bus.drain()]
+            time.sleep(0.01)
+        assert [m["seq"] for m in msgs] == [1, 2] and bus.telemetry_hz == 10
+
+        # 非对象的 params 以 ConfigError 拒收（引擎回 nack），而不是 TypeError 打断控制线程
+        config = ConfigService(str(tmp_path / "missing.json"))
+        for bad in (3, [1, 2], "Kp"):
+            with pytest.raises(ConfigError):
+                config.push(bad)
+        assert config.push(msgs[1]["params"]) and config.snapshot.params["Kp"] == 1.0
+
+        # 限频：到点之前 telemetry_due 为 False，调用者不必构建遥测
+        assert bus.telemetry_due() and bus.publish_telemetry({"frame_id": 1})
+        assert not bus.telemetry_due() and not bus.publish_telemetry({"frame_id": 2})
+        raw.close()
+    finally:
+        bus.stop()
+
+def test_latency_histogram(tmp_path):
+    rng = np.random.default_rng(0)
+    samples = rng.lognormal(np.log(0.005), 0.5, 20000) # 典型的右偏耗时分布，中位数 5ms
+
+    recorder = LatencyRecorder()
+    for sec in samples:
+        recorder.record("track", sec)
+    hist = recorder.histograms["track"]
+    assert len(hist.counts) < 512 # 1µs ~ 60s 量程的固定内存
+    for q in (0.5, 0.9, 0.99):
+        assert abs(hist.percentile(q) - np.quantile(samples, q)) / np.quantile(samples, q) < 0.04
+    assert abs(recorder.summary()["track"]["max_ms"] - samples.max() * 1000) < 0.01
+
+    path = str(tmp_path / "metrics.prom")
+    MetricsExporter(recorder, path).export()
+    text = open(path).read()
+    assert 'galinstan_stage_latency_seconds{stage="track",quantile="0.99"}' in text
+    assert 'galinstan_stage_latency_seconds_count{stage="track"} 20000' in text